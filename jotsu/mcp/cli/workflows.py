@@ -9,6 +9,7 @@ from dotenv import load_dotenv
 
 from jotsu.mcp.local import LocalMCPClient, LocalCredentialsManager
 from jotsu.mcp.types import Workflow, slug, WorkflowResultNode, WorkflowMCPNode
+from jotsu.mcp.workflow.checkpoint import FileCheckpointStore
 from jotsu.mcp.workflow.engine import WorkflowEngine
 from jotsu.mcp.workflow.sessions import WorkflowSessionManager
 
@@ -54,8 +55,10 @@ async def init(path: str, id_: str, name: str, description: str, force: bool):
 @click.argument('path')
 @click.option('--data', default=None, help='Initial data specified as JSON or as a path to a JSON file.')
 @click.option('--no-format', is_flag=True, default=False)
+@click.option('--checkpoints', default=None, help='Directory to record the run in, so that it can be resumed.')
+@click.option('--run-id', default=None)
 @utils.async_cmd
-async def run(path: str, no_format: bool, data: str):
+async def run(path: str, no_format: bool, data: str, checkpoints: str, run_id: str):
     """Run a given workflow. """
     indent = None if no_format else 4
 
@@ -72,8 +75,29 @@ async def run(path: str, no_format: bool, data: str):
 
     w = Workflow(**jsonc.loads(content))
 
-    engine = WorkflowEngine(w, client=LocalMCPClient())
-    async for msg in engine.run_workflow(w.id, data):
+    store = FileCheckpointStore(checkpoints) if checkpoints else None
+    engine = WorkflowEngine(w, client=LocalMCPClient(), checkpoints=store)
+    async for msg in engine.run_workflow(w.id, data, run_id=run_id):
+        click.echo(json.dumps(msg, indent=indent))
+
+
+@workflow.command()
+@click.argument('path')
+@click.argument('run_id')
+@click.option('--checkpoints', required=True, help='Directory the run was recorded in.')
+@click.option('--no-format', is_flag=True, default=False)
+@utils.async_cmd
+async def resume(path: str, run_id: str, checkpoints: str, no_format: bool):
+    """Resume a run of a given workflow from its checkpoint. """
+    indent = None if no_format else 4
+
+    async with aiofiles.open(path) as f:
+        content = await f.read()
+
+    w = Workflow(**jsonc.loads(content))
+
+    engine = WorkflowEngine(w, client=LocalMCPClient(), checkpoints=FileCheckpointStore(checkpoints))
+    async for msg in engine.resume_workflow(run_id):
         click.echo(json.dumps(msg, indent=indent))
 
 
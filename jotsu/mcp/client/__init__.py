@@ -1,4 +1,4 @@
-from .oauth import OAuth2AuthorizationCodeClient
+from .oauth import OAuth2AuthorizationCodeClient, create_http_client
 from .client import MCPClient
 
-__all__ = (OAuth2AuthorizationCodeClient, MCPClient)
+__all__ = (OAuth2AuthorizationCodeClient, MCPClient, create_http_client)
@@ -1,14 +1,18 @@
+import asyncio
 import logging
 import re
+import time
 import typing
 from contextlib import asynccontextmanager
 from datetime import timedelta
 
 import httpx
 
-from mcp import ClientSession, McpError
+from mcp import ClientSession, McpError, types
+from mcp.types import Tool, Resource, Prompt
 from mcp.client.streamable_http import streamablehttp_client
 from mcp.server.auth.provider import RefreshToken
+from mcp.shared.auth import OAuthToken
 
 from jotsu.mcp.types import WorkflowServer
 from jotsu.mcp.types.models import WorkflowServerFull
@@ -19,15 +23,30 @@ from .oauth import OAuth2AuthorizationCodeClient
 
 logger = logging.getLogger(__name__)
 
+# Replaced by a refresh, the credentials of a caller are stale when the stored ones differ.
+REFRESH_KEYS = ('access_token', 'refresh_token')
+
 
 def split_scopes(scope: str) -> typing.List[str]:
     return [s.strip() for s in re.split(r'\s+', scope) if s]
 
 
+def token_credentials(token: OAuthToken) -> dict:
+    """ Credentials to store for the token, with the time it expires. """
+    # Unset values, e.g. a refresh token which isn't rotated, keep what was stored.
+    credentials = token.model_dump(mode='json', exclude_none=True)
+    credentials['expires_at'] = int(time.time()) + token.expires_in if token.expires_in else None
+    return credentials
+
+
 class MCPClientSession(ClientSession):
+    CATALOGS = ('tools', 'resources', 'prompts')
+
     def __init__(self, *args, client: 'MCPClient', server: WorkflowServer, **kwargs):
         self._client = client
         self._server = WorkflowServerFull(**server.model_dump(), tools=[], resources=[], prompts=[])
+        # Tools and prompts by name, resources by URI.  Dropped on list_changed notifications.
+        self._catalogs: typing.Dict[str, dict] = {}
         super().__init__(*args, **kwargs)
 
     @property
@@ -35,36 +54,82 @@ class MCPClientSession(ClientSession):
         return self._server
 
     async def load(self) -> WorkflowServerFull:
-        # Some MCP servers will throw an error for list actions when they don't have any.
-        try:
-            result = await self.list_tools()
-            self._server.tools.extend(result.tools)
-        except McpError as e:
-            logger.debug(f'[list_tools] MCP error: {e}')
+        for kind in self.CATALOGS:
+            await self._load(kind)
+        return self._server
 
-        try:
-            result = await self.list_resources()
-            self._server.resources.extend(result.resources)
-        except McpError as e:
-            logger.debug(f'[list_resources] MCP error: {e}')
+    async def find_tool(self, name: str) -> Tool | None:
+        return (await self._catalog('tools')).get(name)
+
+    async def find_resource(self, uri: str) -> Resource | None:
+        return (await self._catalog('resources')).get(uri)
+
+    async def find_prompt(self, name: str) -> Prompt | None:
+        return (await self._catalog('prompts')).get(name)
+
+    def invalidate(self, kind: str | None = None):
+        """ Drop a catalog (or all) so that it is listed again on next use. """
+        for name in [kind] if kind else self.CATALOGS:
+            self._catalogs.pop(name, None)
+
+    async def _received_notification(self, notification: types.ServerNotification) -> None:
+        match notification.root:
+            case types.ToolListChangedNotification():
+                self.invalidate('tools')
+            case types.ResourceListChangedNotification():
+                self.invalidate('resources')
+            case types.PromptListChangedNotification():
+                self.invalidate('prompts')
+        await super()._received_notification(notification)
+
+    async def _catalog(self, kind: str) -> dict:
+        catalog = self._catalogs.get(kind)
+        if catalog is None:
+            catalog = await self._load(kind)
+        return catalog
+
+    async def _load(self, kind: str) -> dict:
+        items = getattr(self._server, kind)
+        items.clear()
 
+        # Some MCP servers will throw an error for list actions when they don't have any.
         try:
-            result = await self.list_prompts()
-            self._server.prompts.extend(result.prompts)
+            result = await getattr(self, f'list_{kind}')()
+            items.extend(getattr(result, kind))
         except McpError as e:
-            logger.debug(f'[list_prompts] MCP error: {e}')
+            logger.debug(f'[list_{kind}] MCP error: {e}')
 
-        return self._server
+        key = 'uri' if kind == 'resources' else 'name'
+        catalog = {str(getattr(item, key)): item for item in items}
+        self._catalogs[kind] = catalog
+        return catalog
 
 
 class MCPClient:
-    def __init__(self, *, credentials_manager: CredentialsManager | None = None):
+    def __init__(
+            self, *, credentials_manager: CredentialsManager | None = None,
+            http_client: httpx.AsyncClient | None = None, refresh_margin: float = 60, refresh_backoff: float = 30
+    ):
         self._credentials = credentials_manager if credentials_manager else MemoryCredentialsManager()
+        # Shared by OAuth requests, e.g. token refresh, see oauth.create_http_client().
+        self._http_client = http_client
+        # Tokens which expire within this many seconds are refreshed before connecting.
+        self._refresh_margin = refresh_margin
+        # After a refresh before connecting failed, the next one is tried this many seconds later.
+        self._refresh_backoff = refresh_backoff
+        self._refresh_failures: typing.Dict[str, float] = {}
+        # In-flight refreshes and authentications by server id, concurrent callers share them.
+        self._refreshes: typing.Dict[str, asyncio.Task] = {}
+        self._authentications: typing.Dict[str, asyncio.Task] = {}
 
     @property
     def credentials(self):
         return self._credentials
 
+    @property
+    def http_client(self) -> httpx.AsyncClient | None:
+        return self._http_client
+
     @asynccontextmanager
     async def _connect(
             self, server: WorkflowServer, headers: httpx.Headers, timeout: timedelta = timedelta(seconds=30)
@@ -94,9 +159,9 @@ class MCPClient:
     ):
         headers = self.headers(server, headers)
         if 'Authorization' not in headers:
-            access_token = await self.credentials.get_access_token(server.id)
+            access_token = await self._access_token(server)
             if not access_token and authenticate:
-                access_token = await self.authenticate(server)
+                access_token = await self._single_flight(self._authentications, server, self.authenticate)
             if access_token:
                 headers['Authorization'] = f'Bearer {access_token}'
 
@@ -107,16 +172,66 @@ class MCPClient:
             if not utils.is_httpx_401_exception(e):
                 raise e
 
-            access_token = await self.authenticate(server)
+            # Another run may have replaced the token already.
+            access_token = await self.credentials.get_access_token(server.id)
+            if not access_token or headers.get('Authorization') == f'Bearer {access_token}':
+                access_token = await self._single_flight(self._authentications, server, self.authenticate)
             if access_token:
                 headers['Authorization'] = f'Bearer {access_token}'
 
-            async with self._connect(server, headers) as session:
+            async with self._connect(server, headers, timeout=timeout) as session:
                 yield session
 
+    async def _access_token(self, server: WorkflowServer) -> str | None:
+        credentials = await self.credentials.load(server.id)
+        if not credentials:
+            return None
+
+        access_token = credentials.get('access_token')
+        expires_at = credentials.get('expires_at')
+        if access_token and expires_at and expires_at - time.time() < self._refresh_margin:
+            failed = self._refresh_failures.get(server.id)
+            if failed is None or time.monotonic() - failed >= self._refresh_backoff:
+                # Refresh now instead of reconnecting after the server rejects the token.
+                try:
+                    refreshed = await self.token_refresh(server, credentials)
+                except Exception as e:  # noqa
+                    # The current token may still be valid.
+                    logger.warning("Token refresh for server '%s' failed: %s", server.id, str(e))
+                    refreshed = None
+                if refreshed:
+                    self._refresh_failures.pop(server.id, None)
+                    access_token = refreshed
+                else:
+                    self._refresh_failures[server.id] = time.monotonic()
+        return access_token
+
+    @staticmethod
+    async def _single_flight(
+            tasks: typing.Dict[str, asyncio.Task], server: WorkflowServer,
+            func: typing.Callable[[WorkflowServer], typing.Awaitable[str | None]]
+    ) -> str | None:
+        task = tasks.get(server.id)
+        if task is None:
+            task = asyncio.create_task(func(server))
+            tasks[server.id] = task
+            task.add_done_callback(lambda _: tasks.pop(server.id, None))
+        # One caller being cancelled doesn't cancel the others.
+        return await asyncio.shield(task)
+
     async def token_refresh(self, server: WorkflowServer, credentials: dict) -> str | None:
-        """ Try to use our refresh token to get a new access token. """
-        oauth = OAuth2AuthorizationCodeClient(**credentials)
+        """ Try to use our refresh token to get a new access token.
+        Concurrent refreshes for the same server share one request, so a rotated refresh token is only used once.
+        """
+        return await self._single_flight(self._refreshes, server, lambda _: self._token_refresh(server, credentials))
+
+    async def _token_refresh(self, server: WorkflowServer, credentials: dict) -> str | None:
+        # The credentials of the caller may be stale: another refresh may have finished since they were loaded.
+        stored = await self.credentials.load(server.id)
+        if stored and any(credentials.get(key) and stored.get(key) != credentials[key] for key in REFRESH_KEYS):
+            return stored.get('access_token')
+
+        oauth = OAuth2AuthorizationCodeClient(**credentials, http_client=self._http_client)
         token = credentials.get('refresh_token')
         if token:
             scopes = []
@@ -124,11 +239,12 @@ class MCPClient:
             if scope:
                 scopes = split_scopes(scope)  # multiple scopes are delimited by spaces.
 
-            refresh_token = RefreshToken(**credentials, token=token, scopes=scopes)
+            # expires_at is when the access token expires.
+            refresh_token = RefreshToken(client_id=credentials['client_id'], token=token, scopes=scopes)
             oauth_token = await oauth.exchange_refresh_token(refresh_token=refresh_token, scopes=[])
             if oauth_token:
                 # Keep values not included in the token response, like the endpoints.
-                credentials = {**credentials, **oauth_token.model_dump(mode='json')}
+                credentials = {**credentials, **token_credentials(oauth_token)}
                 await self.credentials.store(server.id, credentials)
                 return oauth_token.access_token
         return None
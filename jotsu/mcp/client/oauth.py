@@ -1,3 +1,5 @@
+import contextlib
+import importlib.util
 import logging
 import secrets
 import typing
@@ -47,6 +49,36 @@ async def log_request(request: httpx.Request):
         logging.info(f'Body: {request.content.decode()}')
 
 
+def create_http_client(
+        *, max_connections: int = 100, max_keepalive_connections: int = 20, keepalive_expiry: float = 30,
+        http2: bool | None = None, **kwargs
+) -> httpx.AsyncClient:
+    """
+    Long-lived client with keep-alive connections to share between OAuth operations, e.g. token refreshes,
+    so they don't each pay for a TCP/TLS handshake.  HTTP/2 is used if the 'h2' package is installed,
+    i.e. httpx[http2].
+    The caller is responsible for closing it.
+    """
+    if http2 is None:
+        http2 = importlib.util.find_spec('h2') is not None
+    kwargs.setdefault('event_hooks', {'request': [log_request]})
+    limits = httpx.Limits(
+        max_connections=max_connections, max_keepalive_connections=max_keepalive_connections,
+        keepalive_expiry=keepalive_expiry
+    )
+    return httpx.AsyncClient(http2=http2, limits=limits, **kwargs)
+
+
+@contextlib.asynccontextmanager
+async def _http_client(http_client: httpx.AsyncClient | None, **kwargs) -> typing.AsyncIterator[httpx.AsyncClient]:
+    # The shared client if there is one, otherwise a client for this request only.
+    if http_client is not None:
+        yield http_client
+    else:
+        async with httpx.AsyncClient(**kwargs) as client:
+            yield client
+
+
 class OAuth2AuthorizationCodeClient:
     """Client for the OAuth2.1 flow required by MCP."""
 
@@ -55,6 +87,7 @@ class OAuth2AuthorizationCodeClient:
             authorization_endpoint: str, token_endpoint: str,
             scope: str | None,
             client_id: str, client_secret: str | None = None,
+            http_client: httpx.AsyncClient | None = None,
             **_kwargs  # ignored
     ):
         self.authorization_endpoint = authorization_endpoint
@@ -62,6 +95,8 @@ class OAuth2AuthorizationCodeClient:
         self.scope = scope
         self.client_id = client_id
         self.client_secret = client_secret
+        # Shared client, see create_http_client(), a new client is used for each request if None.
+        self.http_client = http_client
 
     @classmethod
     def generate_state(cls):
@@ -86,7 +121,7 @@ class OAuth2AuthorizationCodeClient:
     ) -> OAuthToken:
         """Call the authorization endpoint to obtain an access token."""
 
-        async with (httpx.AsyncClient(event_hooks={'request': [log_request]}) as httpx_client):
+        async with _http_client(self.http_client, event_hooks={'request': [log_request]}) as httpx_client:
             req = AuthorizationCodeRequest(
                 grant_type='authorization_code',
                 code=code,
@@ -124,7 +159,7 @@ class OAuth2AuthorizationCodeClient:
             refresh_token: RefreshToken,
             scopes: list[str],
     ) -> OAuthToken | None:
-        async with httpx.AsyncClient(event_hooks={'request': [log_request]}) as httpx_client:
+        async with _http_client(self.http_client, event_hooks={'request': [log_request]}) as httpx_client:
             req = RefreshTokenRequest(
                 grant_type='refresh_token',
                 refresh_token=refresh_token.token,
@@ -141,19 +176,22 @@ class OAuth2AuthorizationCodeClient:
             return OAuthToken(**res.json())
 
     @classmethod
-    async def server_metadata_discovery(cls, base_url: str) -> ServerMeta:
+    async def server_metadata_discovery(
+            cls, base_url: str, *, http_client: httpx.AsyncClient | None = None
+    ) -> ServerMeta:
         """
         Server Metadata Discovery
         https://modelcontextprotocol.io/specification/2025-03-26/basic/authorization#2-3-server-metadata-discovery
         Try to get server endpoints automatically or fallback to defaults.
         :param base_url:
+        :param http_client: optional shared client
         :return:
         """
         # Server Metadata Discovery (SHOULD)
         url = utils.server_url('/.well-known/oauth-authorization-server', url=base_url)
         logger.info('Trying server metadata discovery at %s', url)
         try:
-            async with httpx.AsyncClient(event_hooks={'request': [log_request]}) as httpx_client:
+            async with _http_client(http_client, event_hooks={'request': [log_request]}) as httpx_client:
                 res = await httpx_client.get(url)
                 res.raise_for_status()
                 logger.info('Server metadata found: %s', res.text)
@@ -174,17 +212,19 @@ class OAuth2AuthorizationCodeClient:
 
     @classmethod
     async def dynamic_client_registration(
-            cls, registration_endpoint: str, redirect_uris: typing.List[str]
+            cls, registration_endpoint: str, redirect_uris: typing.List[str], *,
+            http_client: httpx.AsyncClient | None = None
     ) -> OAuthClientInformationFullWithBasicAuth:
         """
         Dynamic Client Registration
         :param registration_endpoint:
         :param redirect_uris:
+        :param http_client: optional shared client
         :return:
         """
         logger.info('Trying dynamic client registration at %s', registration_endpoint)
 
-        async with httpx.AsyncClient() as httpx_client:
+        async with _http_client(http_client) as httpx_client:
             req = {'redirect_uris': redirect_uris}
             logger.debug(req)
 
@@ -16,6 +16,7 @@ import pkce
 from jotsu.mcp.types import WorkflowServer
 from jotsu.mcp.types.shared import OAuthClientInformationFullWithBasicAuth
 from jotsu.mcp.client import MCPClient, OAuth2AuthorizationCodeClient, utils
+from jotsu.mcp.client.client import token_credentials
 
 from . import localserver
 
@@ -53,7 +54,9 @@ class LocalMCPClient(MCPClient):
         base_url = utils.server_url('', url=str(server.url))
 
         # Server Metadata Discovery (SHOULD)
-        server_metadata = await OAuth2AuthorizationCodeClient.server_metadata_discovery(base_url=base_url)
+        server_metadata = await OAuth2AuthorizationCodeClient.server_metadata_discovery(
+            base_url=base_url, http_client=self.http_client
+        )
 
         # Dynamic Client Registration (SHOULD)
         client_info = _client_info(server)
@@ -61,7 +64,8 @@ class LocalMCPClient(MCPClient):
             if server_metadata.registration_endpoint:
                 client_info = await OAuth2AuthorizationCodeClient.dynamic_client_registration(
                     registration_endpoint=server_metadata.registration_endpoint,
-                    redirect_uris=['http://localhost:8001/']
+                    redirect_uris=['http://localhost:8001/'],
+                    http_client=self.http_client
                 )
             else:
                 raise RuntimeError(f'No registration endpoint for server: {server.name or server.id}')
@@ -94,7 +98,8 @@ class LocalMCPClient(MCPClient):
         client = OAuth2AuthorizationCodeClient(
             **client_info.model_dump(mode='json'),
             authorization_endpoint=server_metadata.authorization_endpoint,
-            token_endpoint=server_metadata.token_endpoint
+            token_endpoint=server_metadata.token_endpoint,
+            http_client=self.http_client
         )
 
         token = await client.exchange_authorization_code(
@@ -104,7 +109,7 @@ class LocalMCPClient(MCPClient):
         )
 
         credentials = {
-            **token.model_dump(mode='json'),
+            **token_credentials(token),
             'client_id': client_info.client_id,
             'client_secret': client_info.client_secret,
             'authorization_endpoint': server_metadata.authorization_endpoint,
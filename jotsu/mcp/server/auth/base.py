@@ -25,11 +25,14 @@ class BaseAuthServerProvider(OAuthAuthorizationServerProvider):
             cache: AsyncCache,
             client_manager: AsyncClientManager,
             secret_key: str,
+            http_client: httpx.AsyncClient | None = None
     ):
         self.issuer_url = issuer_url  # only needed for the intermediate redirect.
         self.cache = cache
         self.client_manager = client_manager
         self.secret_key = secret_key
+        # Shared by the OAuth clients of this provider, see jotsu.mcp.client.create_http_client().
+        self.http_client = http_client
         super().__init__()
 
     async def get_client(self, client_id: str) -> OAuthClientInformationFull | None:
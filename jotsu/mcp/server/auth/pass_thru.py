@@ -1,5 +1,6 @@
 import logging
 
+import httpx
 from mcp.shared.auth import OAuthClientInformationFull, OAuthToken
 from mcp.server.auth.provider import (
     AuthorizationParams, AuthorizationCode,
@@ -24,12 +25,16 @@ class PassThruAuthServerProvider(BaseAuthServerProvider):
             client_manager: AsyncClientManager,
             secret_key: str,
             authorization_endpoint: str, token_endpoint: str,
-            scope: str | None = None
+            scope: str | None = None,
+            http_client: httpx.AsyncClient | None = None
     ):
         self.authorization_endpoint = authorization_endpoint
         self.token_endpoint = token_endpoint
         self.scope = scope
-        super().__init__(issuer_url=issuer_url, cache=cache, secret_key=secret_key, client_manager=client_manager)
+        super().__init__(
+            issuer_url=issuer_url, cache=cache, secret_key=secret_key, client_manager=client_manager,
+            http_client=http_client
+        )
 
     async def register_client(self, client_info: OAuthClientInformationFull) -> None:
         raise NotImplementedError()
@@ -75,5 +80,6 @@ class PassThruAuthServerProvider(BaseAuthServerProvider):
             token_endpoint=self.token_endpoint,
             scope=client.scope,
             client_id=client.client_id,
-            client_secret=client.client_secret
+            client_secret=client.client_secret,
+            http_client=self.http_client
         )
@@ -27,7 +27,10 @@ class ThirdPartyAuthServerProvider(BaseAuthServerProvider):
     ):
         self.client_manager = client_manager
         self.oauth = oauth
-        super().__init__(issuer_url=issuer_url, cache=cache, secret_key=secret_key, client_manager=client_manager)
+        super().__init__(
+            issuer_url=issuer_url, cache=cache, secret_key=secret_key, client_manager=client_manager,
+            http_client=oauth.http_client
+        )
 
     async def register_client(self, client_info: OAuthClientInformationFull) -> None:
         logger.info('Registering client ... %s', client_info.model_dump_json())
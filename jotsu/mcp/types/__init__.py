@@ -1,6 +1,6 @@
 from .exceptions import JotsuException
 from .models import (
-    Workflow, WorkflowServer, WorkflowEvent,
+    Workflow, WorkflowServer, WorkflowEvent, WorkflowConcurrency, WorkflowRetry, WorkflowCircuitBreaker,
     WorkflowNode, WorkflowMCPNode, WorkflowPromptNode, WorkflowResourceNode, WorkflowToolNode,
     WorkflowSwitchNode, WorkflowFunctionNode, WorkflowLoopNode,
     WorkflowResultNode, WorkflowCompleteNode,
@@ -13,7 +13,7 @@ from .rules import (
 
 __all__ = [
     JotsuException,
-    Workflow, WorkflowNode, WorkflowServer, WorkflowEvent,
+    Workflow, WorkflowNode, WorkflowServer, WorkflowEvent, WorkflowConcurrency, WorkflowRetry, WorkflowCircuitBreaker,
     WorkflowNode, WorkflowMCPNode, WorkflowPromptNode, WorkflowResourceNode, WorkflowToolNode,
     WorkflowSwitchNode, WorkflowFunctionNode, WorkflowLoopNode, WorkflowResultNode, WorkflowCompleteNode,
     WorkflowModelUsage,
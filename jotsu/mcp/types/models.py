@@ -33,6 +33,56 @@ class WorkflowEvent(pydantic.BaseModel):
     metadata: WorkflowMetadata = None
 
 
+class WorkflowConcurrency(pydantic.BaseModel):
+    """ Run the branches of a node, i.e. the nodes its results go to, as concurrent tasks.
+    Each branch gets its own copy of the data.  Only the iterative executor of the engine runs
+    branches concurrently, the recursive one runs them one after another and ignores this setting.
+    """
+    # The maximum number of branches running at the same time.
+    max_tasks: int = pydantic.Field(default=4, ge=1)
+    # 'branch' emits the actions of each branch in edge order, the same as running them one after
+    # another; 'completion' emits actions as soon as they happen.
+    order: typing.Literal['branch', 'completion'] = 'branch'
+    # The data the node ends with: 'last' is the data of the last branch, 'update' merges the data
+    # of every branch, in edge order, into the node's data and 'collect' puts a list in 'member' with
+    # the members each branch added or changed, not the data it started with.
+    merge: typing.Literal['last', 'update', 'collect'] = 'last'
+    member: str = 'results'
+
+
+# Errors which are usually transient: connection problems and timeouts of MCP servers (httpx), and
+# rate limits and server errors of model providers.  Matched against the names of the error's classes.
+RETRY_ON = (
+    'TimeoutError', 'ConnectionError', 'httpx.TransportError',
+    'APIConnectionError', 'RateLimitError', 'InternalServerError', 'ResponseFailedError',
+)
+
+
+class WorkflowRetry(pydantic.BaseModel):
+    """ Call an MCP server or model provider again when the call fails with a transient error.
+    The delay before each retry grows exponentially, a random part of it is waited (full jitter).
+    """
+    # Attempts in total, including the first.
+    max_attempts: int = pydantic.Field(default=3, ge=1)
+    # Seconds before the first retry, multiplied by 'multiplier' for each one after it.
+    backoff: float = pydantic.Field(default=0.5, ge=0)
+    multiplier: float = pydantic.Field(default=2.0, ge=1)
+    max_backoff: float = pydantic.Field(default=30.0, ge=0)
+    jitter: bool = True
+    # Class names, with or without the module, of the errors to retry.
+    retry_on: typing.List[str] = pydantic.Field(default_factory=lambda: list(RETRY_ON))
+
+
+class WorkflowCircuitBreaker(pydantic.BaseModel):
+    """ Fail calls to a server at once after it failed repeatedly, instead of every run waiting on it.
+    Only transient errors count as failures.
+    """
+    # Failures in a row which open the circuit.
+    failure_threshold: int = pydantic.Field(default=5, ge=1)
+    # Seconds the circuit stays open, after that one call is let through to test the server.
+    reset_timeout: float = pydantic.Field(default=30.0, gt=0)
+
+
 class WorkflowNode(pydantic.BaseModel):
     """ Nodes are any action taken on data including but not limited to MCP tools,
     resources and prompts.
@@ -44,6 +94,10 @@ class WorkflowNode(pydantic.BaseModel):
     type: str
     metadata: WorkflowMetadata = None
     edges: typing.List[Slug | None] = pydantic.Field(default_factory=list)
+    # Run the branches of this node concurrently, overrides the workflow setting.
+    concurrency: WorkflowConcurrency | None = None
+    # Seconds the handler of this node may take, not counting the nodes its results go to.
+    timeout: float | None = pydantic.Field(default=None, gt=0)
 
     @classmethod
     def model_create(cls, **kwargs):
@@ -86,6 +140,14 @@ class WorkflowToolNode(WorkflowMCPNode):
     type: typing.Literal['tool'] = 'tool'
     tool_name: str | None = None
     structured_output: bool = False
+    # Use the tool cache of the engine, if any.  By default only tools annotated as read-only
+    # or idempotent are cached.
+    cache: bool | None = None
+    # Seconds to keep the result in the cache, None for the default of the cache.
+    cache_ttl: int | None = None
+    # Retry failed calls of the tool, overrides the setting of the server.  Only set this for tools
+    # which are safe to call again.
+    retry: WorkflowRetry | None = None
 
 
 class WorkflowResourceNode(WorkflowMCPNode):
@@ -132,6 +194,22 @@ class WorkflowLoopNode(WorkflowRulesNode):
     # What member will hold the 'each' value.
     member: str | None = None
     end_node_id: Slug | None = None   # The node to go to after the loop completes.
+    # Run iterations concurrently, each with its own copy of the data (iterative executor only).
+    parallel: bool = False
+    max_concurrency: int = pydantic.Field(default=4, ge=1)
+    # Where the members each iteration produced go, in order, when running in parallel.
+    results_member: str | None = None
+
+    @pydantic.model_validator(mode='after')
+    def validate_parallel(self):
+        # parallel is shorthand for the equivalent concurrency setting.
+        if self.parallel and self.concurrency is None:
+            self.concurrency = WorkflowConcurrency(
+                max_tasks=self.max_concurrency,
+                merge='collect' if self.results_member else 'last',
+                member=self.results_member or 'results'
+            )
+        return self
 
 
 class WorkflowFunctionNode(WorkflowRulesNode):
@@ -181,6 +259,15 @@ class WorkflowModelNode(WorkflowNode):
     temperature: float | None = 0
     # Where the output goes in the result.
     member: str | None = None
+    # Emit the output as it arrives, as node-delta actions, the node still ends with the complete output.
+    stream: bool = False
+    # Use the model cache of the engine, if any, for identical requests.  Opt-in, since the output
+    # of a model differs between identical requests unless it is sampled deterministically.
+    cache: bool = False
+    # Seconds to keep the response in the cache, None for the default of the cache.
+    cache_ttl: int | None = None
+    # Retry failed requests to the provider, streamed output is only retried before any of it arrived.
+    retry: WorkflowRetry | None = None
 
 
 class WorkflowAnthropicNode(WorkflowModelNode):
@@ -206,6 +293,10 @@ class WorkflowServer(pydantic.BaseModel):
     headers: typing.Dict[str, str] = pydantic.Field(default_factory=dict)
     client_info: OAuthClientInformationFullWithBasicAuth | None = None
     metadata: WorkflowMetadata = None
+    # Retry failed tool calls, for every tool node using this server.
+    retry: WorkflowRetry | None = None
+    # Overrides the circuit breaker of the engine for this server.
+    circuit_breaker: WorkflowCircuitBreaker | None = None
 
     @pydantic.field_validator('headers', mode='before')
     def lowercase_headers(cls, value):  # noqa
@@ -243,6 +334,10 @@ class Workflow(pydantic.BaseModel):
     servers: typing.List[WorkflowServer] = pydantic.Field(default_factory=list)
     # Initial data for this workflow that can be overridden when run.
     data: WorkflowData = None
+    # Default concurrency for nodes with more than one edge.
+    concurrency: WorkflowConcurrency | None = None
+    # Seconds a run may take, the node running when it expires fails.
+    timeout: float | None = pydantic.Field(default=None, gt=0)
     # General metadata for application use (NOT used by the workflow)
     metadata: WorkflowMetadata = None
 
@@ -258,3 +353,5 @@ class WorkflowModelUsage(pydantic.BaseModel):
     model: str
     input_tokens: int = 0
     output_tokens: int = 0
+    # The response came from the model cache, no tokens were used.
+    cached: bool = False
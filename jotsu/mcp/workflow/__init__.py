@@ -1,3 +1,13 @@
+from .cache import AsyncCache, MemoryCache, FileCache
+from .checkpoint import (
+    WorkflowCheckpoint, WorkflowCheckpointStore, MemoryCheckpointStore, FileCheckpointStore, SQLiteCheckpointStore
+)
 from .engine import WorkflowEngine
+from .pool import WorkflowSessionPool
+from .store import WorkflowStore, WorkflowInfo, MemoryWorkflowStore, DirectoryWorkflowStore, SQLiteWorkflowStore
 
-__all__ = (WorkflowEngine,)
+__all__ = (
+    WorkflowEngine, WorkflowSessionPool, AsyncCache, MemoryCache, FileCache,
+    WorkflowStore, WorkflowInfo, MemoryWorkflowStore, DirectoryWorkflowStore, SQLiteWorkflowStore,
+    WorkflowCheckpoint, WorkflowCheckpointStore, MemoryCheckpointStore, FileCheckpointStore, SQLiteCheckpointStore
+)
@@ -0,0 +1,162 @@
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import time
+import typing
+from collections import OrderedDict
+
+from jotsu.mcp.server.cache import AsyncCache
+
+
+class CacheInfo(typing.NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+class LRUCache:
+    """ Bounded mapping which evicts the least-recently-used entry when full.
+    A maxsize of 0 disables caching entirely.
+    """
+    def __init__(self, maxsize: int = 128):
+        self._maxsize = maxsize
+        self._data: OrderedDict[typing.Hashable, typing.Any] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def maxsize(self) -> int:
+        return self._maxsize
+
+    def get(self, key: typing.Hashable, default=None):
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: typing.Hashable, value) -> None:
+        self._data[key] = value
+        self._data.move_to_end(key)
+        self._evict()
+
+    def delete(self, key: typing.Hashable) -> None:
+        self._data.pop(key, None)
+
+    def resize(self, maxsize: int) -> None:
+        self._maxsize = maxsize
+        self._evict()
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(hits=self.hits, misses=self.misses, maxsize=self._maxsize, currsize=len(self._data))
+
+    def _evict(self):
+        while len(self._data) > self._maxsize:
+            self._data.popitem(last=False)
+
+    def __contains__(self, key: typing.Hashable) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class MemoryCache(AsyncCache):
+    """ In-memory AsyncCache for the model and tool caches of the engine, bounded like LRUCache. """
+
+    def __init__(self, maxsize: int = 1024, *, expires_in: int | None = None):
+        self._cache = LRUCache(maxsize=maxsize)
+        self._expires_in = expires_in
+
+    async def get(self, key: str) -> str | None:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires is not None and expires <= time.monotonic():
+            self._cache.delete(key)
+            return None
+        return value
+
+    async def set(self, key: str, value: str, expires_in: int | None = None) -> None:
+        expires_in = expires_in if expires_in is not None else self._expires_in
+        self._cache.set(key, (time.monotonic() + expires_in if expires_in is not None else None, value))
+
+    async def delete(self, key: str) -> None:
+        self._cache.delete(key)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def info(self) -> CacheInfo:
+        return self._cache.info()
+
+
+class FileCache(AsyncCache):
+    """ AsyncCache with one file per key in a directory, which survives restarts
+    and can be shared by the processes on a machine.
+    """
+
+    def __init__(self, directory: str | os.PathLike, *, expires_in: int | None = None):
+        self._directory = os.fspath(directory)
+        self._expires_in = expires_in
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._directory, hashlib.sha256(key.encode()).hexdigest() + '.json')
+
+    async def get(self, key: str) -> str | None:
+        return await asyncio.to_thread(self._read, self._path(key))
+
+    async def set(self, key: str, value: str, expires_in: int | None = None) -> None:
+        expires_in = expires_in if expires_in is not None else self._expires_in
+        # Wall clock time, the file outlives the process.
+        entry = {'expires': time.time() + expires_in if expires_in is not None else None, 'value': value}
+        await asyncio.to_thread(self._write, self._path(key), json.dumps(entry))
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread(self._remove, self._path(key))
+
+    @staticmethod
+    def _read(path: str) -> str | None:
+        try:
+            with open(path) as fp:
+                entry = json.load(fp)
+        except (OSError, ValueError):
+            return None
+        if entry['expires'] is not None and entry['expires'] <= time.time():
+            FileCache._remove(path)
+            return None
+        return entry['value']
+
+    def _write(self, path: str, text: str) -> None:
+        os.makedirs(self._directory, exist_ok=True)
+        # Readers never see a partial file.
+        fd, tmp = tempfile.mkstemp(dir=self._directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as fp:
+            fp.write(text)
+        os.replace(tmp, path)
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def cache_key(prefix: str, value: typing.Any) -> str:
+    """ Key from the canonical JSON of the value, i.e. with sorted keys. """
+    text = json.dumps(value, sort_keys=True, separators=(',', ':'), default=str)
+    return f'{prefix}:{hashlib.sha256(text.encode()).hexdigest()}'
@@ -0,0 +1,251 @@
+import asyncio
+import json
+import os
+import typing
+import urllib.parse
+from abc import ABC, abstractmethod
+
+import pydantic_core
+
+from jotsu.mcp.types.models import WorkflowModelUsage
+
+from .cache import cache_key
+from .handler.types import WorkflowHandlerResult
+from .store import _SQLiteDatabase
+
+
+class WorkflowCheckpoint(typing.NamedTuple):
+    run_id: str
+    workflow_id: str
+    # The data the run was started with, before the workflow data is merged in.
+    data: dict | None
+    # (key, entry) pairs in the order they were recorded.
+    entries: typing.List[typing.Tuple[str, dict]]
+
+
+class WorkflowCheckpointStore(ABC):
+    """ Durable journal of workflow runs, so that a run can be resumed after the process stops.
+    Entries are appended as handlers produce results, a store must keep them in order.
+    """
+
+    @abstractmethod
+    async def begin(self, run_id: str, workflow_id: str, data: dict | None) -> None:
+        """ Start or restart a run, keeping any entries it already has. """
+
+    @abstractmethod
+    async def append(self, run_id: str, key: str, entry: dict) -> None:
+        ...
+
+    @abstractmethod
+    async def load(self, run_id: str) -> WorkflowCheckpoint | None:
+        ...
+
+    @abstractmethod
+    async def delete(self, run_id: str) -> None:
+        ...
+
+
+class MemoryCheckpointStore(WorkflowCheckpointStore):
+    """ WorkflowCheckpointStore in memory, which doesn't survive the process but allows retrying a failed run. """
+
+    def __init__(self):
+        self._runs: typing.Dict[str, WorkflowCheckpoint] = {}
+
+    async def begin(self, run_id: str, workflow_id: str, data: dict | None) -> None:
+        previous = self._runs.get(run_id)
+        entries = previous.entries if previous else []
+        self._runs[run_id] = WorkflowCheckpoint(run_id, workflow_id, json.loads(json.dumps(data)), entries)
+
+    async def append(self, run_id: str, key: str, entry: dict) -> None:
+        self._runs[run_id].entries.append((key, json.loads(json.dumps(entry))))
+
+    async def load(self, run_id: str) -> WorkflowCheckpoint | None:
+        checkpoint = self._runs.get(run_id)
+        return checkpoint._replace(entries=list(checkpoint.entries)) if checkpoint else None
+
+    async def delete(self, run_id: str) -> None:
+        self._runs.pop(run_id, None)
+
+
+class FileCheckpointStore(WorkflowCheckpointStore):
+    """ WorkflowCheckpointStore with one JSON lines file per run in a directory, named after the run id
+    with characters like '/' escaped.  The first line is the run, each entry is a line appended to it.
+    """
+
+    def __init__(self, directory: str | os.PathLike):
+        self._directory = os.fspath(directory)
+
+    def _path(self, run_id: str) -> str:
+        return os.path.join(self._directory, urllib.parse.quote(run_id, safe='') + '.jsonl')
+
+    async def begin(self, run_id: str, workflow_id: str, data: dict | None) -> None:
+        line = json.dumps({'run_id': run_id, 'workflow_id': workflow_id, 'data': data})
+        await asyncio.to_thread(self._begin, self._path(run_id), line)
+
+    async def append(self, run_id: str, key: str, entry: dict) -> None:
+        await asyncio.to_thread(self._append, self._path(run_id), json.dumps({'key': key, 'entry': entry}))
+
+    async def load(self, run_id: str) -> WorkflowCheckpoint | None:
+        return await asyncio.to_thread(self._load, self._path(run_id))
+
+    async def delete(self, run_id: str) -> None:
+        try:
+            await asyncio.to_thread(os.remove, self._path(run_id))
+        except FileNotFoundError:
+            pass
+
+    def _begin(self, path: str, line: str) -> None:
+        os.makedirs(self._directory, exist_ok=True)
+        try:
+            with open(path) as fp:
+                entries = fp.readlines()[1:]
+        except FileNotFoundError:
+            entries = []
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as fp:
+            fp.write(line + '\n')
+            fp.writelines(entries)
+        os.replace(tmp, path)
+
+    @staticmethod
+    def _append(path: str, line: str) -> None:
+        with open(path, 'a') as fp:
+            fp.write(line + '\n')
+            fp.flush()
+            os.fsync(fp.fileno())
+
+    @staticmethod
+    def _load(path: str) -> WorkflowCheckpoint | None:
+        try:
+            with open(path) as fp:
+                lines = fp.readlines()
+        except FileNotFoundError:
+            return None
+
+        try:
+            run = json.loads(lines[0])
+            run_id, workflow_id, data = run['run_id'], run['workflow_id'], run['data']
+        except (IndexError, ValueError, KeyError, TypeError):
+            # Empty or truncated, the run never got as far as its first checkpoint.
+            return None
+
+        entries = []
+        for line in lines[1:]:
+            try:
+                value = json.loads(line)
+            except ValueError:
+                # The process stopped while writing the line.
+                break
+            entries.append((value['key'], value['entry']))
+        return WorkflowCheckpoint(run_id, workflow_id, data, entries)
+
+
+class SQLiteCheckpointStore(WorkflowCheckpointStore):
+    """ WorkflowCheckpointStore in a SQLite database. """
+
+    def __init__(self, path: str | os.PathLike = ':memory:'):
+        self._db = _SQLiteDatabase(path, (
+            'CREATE TABLE IF NOT EXISTS workflow_runs (run_id TEXT PRIMARY KEY, workflow_id TEXT NOT NULL, data TEXT)',
+            'CREATE TABLE IF NOT EXISTS workflow_run_entries '
+            '(id INTEGER PRIMARY KEY AUTOINCREMENT, run_id TEXT NOT NULL, key TEXT NOT NULL, entry TEXT NOT NULL)',
+            'CREATE INDEX IF NOT EXISTS workflow_run_entries_run_id ON workflow_run_entries (run_id)',
+        ))
+
+    async def begin(self, run_id: str, workflow_id: str, data: dict | None) -> None:
+        await self._db.execute(
+            'INSERT INTO workflow_runs (run_id, workflow_id, data) VALUES (?, ?, ?) '
+            'ON CONFLICT (run_id) DO UPDATE SET workflow_id = excluded.workflow_id, data = excluded.data',
+            (run_id, workflow_id, json.dumps(data))
+        )
+
+    async def append(self, run_id: str, key: str, entry: dict) -> None:
+        await self._db.execute(
+            'INSERT INTO workflow_run_entries (run_id, key, entry) VALUES (?, ?, ?)', (run_id, key, json.dumps(entry))
+        )
+
+    async def load(self, run_id: str) -> WorkflowCheckpoint | None:
+        rows = await self._db.execute('SELECT workflow_id, data FROM workflow_runs WHERE run_id = ?', (run_id,))
+        if not rows:
+            return None
+        workflow_id, data = rows[0]
+        entries = await self._db.execute(
+            'SELECT key, entry FROM workflow_run_entries WHERE run_id = ? ORDER BY id', (run_id,)
+        )
+        return WorkflowCheckpoint(run_id, workflow_id, json.loads(data), [(key, json.loads(x)) for key, x in entries])
+
+    async def delete(self, run_id: str) -> None:
+        await self._db.execute('DELETE FROM workflow_run_entries WHERE run_id = ?', (run_id,))
+        await self._db.execute('DELETE FROM workflow_runs WHERE run_id = ?', (run_id,))
+
+    def close(self) -> None:
+        self._db.close()
+
+
+class _HandlerRecord:
+    __slots__ = ('results', 'usage', 'done')
+
+    def __init__(self):
+        self.results: typing.List[dict] = []
+        self.usage: typing.List[dict] = []
+        # Set once the handler produced all of its results.
+        self.done = False
+
+
+class WorkflowRunCheckpoint:
+    """ The journal of one run.  Each handler call is identified by the node, a hash of its input data
+    and how many calls with the same node and input came before it, which doesn't depend on the order
+    that concurrent branches run in.
+    """
+
+    def __init__(self, store: WorkflowCheckpointStore, run_id: str, entries: typing.Iterable[typing.Tuple[str, dict]]):
+        self._store = store
+        self._run_id = run_id
+        self._records: typing.Dict[str, _HandlerRecord] = {}
+        for key, entry in entries:
+            record = self._records.setdefault(key, _HandlerRecord())
+            if 'result' in entry:
+                record.results.append(entry['result'])
+            record.usage.extend(entry.get('usage', []))
+            record.done = record.done or entry.get('done', False)
+        self._calls: typing.Dict[str, int] = {}
+
+    @classmethod
+    async def begin(
+            cls, store: WorkflowCheckpointStore, run_id: str, workflow_id: str, data: dict | None, *,
+            resume: bool = False
+    ) -> 'WorkflowRunCheckpoint':
+        """ Journal for the run, with the entries already recorded if the run is being resumed.
+        Otherwise any entries left by an earlier run with the same id are dropped.
+        """
+        if resume:
+            checkpoint = await store.load(run_id)
+            entries = checkpoint.entries if checkpoint else []
+        else:
+            await store.delete(run_id)
+            entries = []
+        await store.begin(run_id, workflow_id, data)
+        return cls(store, run_id, entries)
+
+    def key(self, node_id: str, data: dict) -> str:
+        key = cache_key(node_id, data)
+        count = self._calls.get(key, 0)
+        self._calls[key] = count + 1
+        return f'{key}:{count}'
+
+    def replay(self, key: str) -> _HandlerRecord | None:
+        return self._records.get(key)
+
+    async def record(
+            self, key: str, *, result: WorkflowHandlerResult | None = None,
+            usage: typing.Sequence[WorkflowModelUsage] = (), done: bool = False
+    ) -> None:
+        entry: typing.Dict[str, typing.Any] = {}
+        if result is not None:
+            entry['result'] = {
+                'edge': result.edge, 'data': pydantic_core.to_jsonable_python(result.data, fallback=str)
+            }
+        if usage:
+            entry['usage'] = [x.model_dump(mode='json') for x in usage]
+        if done:
+            entry['done'] = True
+        await self._store.append(self._run_id, key, entry)
@@ -0,0 +1,251 @@
+import copy
+import typing
+from collections.abc import ItemsView, ValuesView
+
+
+def _cow(value):
+    """ Shallow copy of a nested dict or list, sharing its own values in turn. """
+    return CowDict(dict.items(value)) if isinstance(value, dict) else CowList(list.__iter__(value))
+
+
+class CowDict(dict):
+    """ Workflow data which shares nested values with its snapshots.
+
+    Nested dicts and lists are copied, one level at a time, the first time they are accessed
+    through the container, so changes made in place never reach a snapshot and vice versa.
+    Only the path that is accessed is copied, everything else is shared.
+
+    Every read goes through data[key], including items(), values(), dict(data) and {**data},
+    so the values they return are the container's own as well.
+    """
+    __slots__ = ('_owned',)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Keys whose (container) value was already copied into this dict.
+        self._owned: typing.Set[typing.Hashable] = set()
+
+    def snapshot(self) -> 'CowDict':
+        """ Version of the data that won't change, in O(number of keys). """
+        # Everything is shared with the snapshot from here on.
+        self._owned.clear()
+        return CowDict(dict.items(self))
+
+    def _own(self, key, value):
+        if key in self._owned or not isinstance(value, (dict, list)):
+            return value
+        value = _cow(value)
+        dict.__setitem__(self, key, value)
+        self._owned.add(key)
+        return value
+
+    def __getitem__(self, key):
+        return self._own(key, dict.__getitem__(self, key))
+
+    def __iter__(self):
+        # Not dict's own iterator, which makes dict(data), {**data}, etc. read the values with
+        # data[key] instead of copying them directly.
+        return dict.__iter__(self)
+
+    def items(self):
+        return ItemsView(self)
+
+    def values(self):
+        return ValuesView(self)
+
+    def get(self, key, default=None):
+        if dict.__contains__(self, key):
+            return self[key]
+        return default
+
+    def setdefault(self, key, default=None):
+        if dict.__contains__(self, key):
+            return self[key]
+        dict.__setitem__(self, key, default)
+        return default
+
+    def __setitem__(self, key, value):
+        self._owned.discard(key)
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        self._owned.discard(key)
+        dict.__delitem__(self, key)
+
+    def pop(self, key, *args):
+        if dict.__contains__(self, key):
+            value = self[key]
+            self._owned.discard(key)
+            dict.__delitem__(self, key)
+            return value
+        return dict.pop(self, key, *args)
+
+    def popitem(self):
+        key, value = dict.popitem(self)
+        value = _cow(value) if key not in self._owned else value
+        self._owned.discard(key)
+        return key, value
+
+    def update(self, *args, **kwargs):
+        if args and isinstance(args[0], CowDict):
+            # Shared from now on.
+            args[0]._owned.clear()
+            args = (dict.items(args[0]),)
+        other = dict(*args, **kwargs)
+        self._owned.difference_update(other)
+        dict.update(self, other)
+
+    def clear(self):
+        self._owned.clear()
+        dict.clear(self)
+
+    def copy(self) -> 'CowDict':
+        return self.snapshot()
+
+    def __copy__(self):
+        return self.snapshot()
+
+    def __deepcopy__(self, memo):
+        return CowDict(copy.deepcopy(dict(dict.items(self)), memo))
+
+    def __reduce__(self):
+        return CowDict, (dict(dict.items(self)),)
+
+    def __or__(self, other):
+        if not isinstance(other, dict):
+            return NotImplemented
+        result = self.snapshot()
+        result.update(other)
+        return result
+
+    def __ror__(self, other):
+        if not isinstance(other, dict):
+            return NotImplemented
+        result = CowDict(other)
+        result.update(self.snapshot())
+        return result
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+
+class CowList(list):
+    """ List counterpart of CowDict, items are copied the first time they are accessed. """
+    __slots__ = ('_owned',)
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self._owned: typing.Set[int] = set()
+
+    def _own(self, index: int, value):
+        if index in self._owned or not isinstance(value, (dict, list)):
+            return value
+        value = _cow(value)
+        list.__setitem__(self, index, value)
+        self._owned.add(index)
+        return value
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            self._owned.clear()
+            return CowList(list.__getitem__(self, index))
+        value = list.__getitem__(self, index)
+        return self._own(index + len(self) if index < 0 else index, value)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __reversed__(self):
+        for i in range(len(self) - 1, -1, -1):
+            yield self[i]
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            self._owned.clear()
+        else:
+            self._owned.discard(index + len(self) if index < 0 else index)
+        list.__setitem__(self, index, value)
+
+    # Like list's, with the items read through self[index].
+    def __add__(self, other):
+        return list(self) + other
+
+    def __mul__(self, n):
+        return list(self) * n
+
+    __rmul__ = __mul__
+
+    def pop(self, index: int = -1):
+        value = self[index]
+        # The indices of the following items change.
+        self._owned.clear()
+        list.pop(self, index)
+        return value
+
+    def copy(self) -> 'CowList':
+        self._owned.clear()
+        return CowList(list.__iter__(self))
+
+    def __copy__(self):
+        return self.copy()
+
+    def __deepcopy__(self, memo):
+        return CowList(copy.deepcopy(list(list.__iter__(self)), memo))
+
+    def __reduce__(self):
+        return CowList, (list(list.__iter__(self)),)
+
+
+# Operations that move items around, the copies are remade on the next access.
+def _reorders(name: str):
+    method = getattr(list, name)
+
+    def wrapper(self, *args, **kwargs):
+        self._owned.clear()
+        return method(self, *args, **kwargs)
+
+    wrapper.__name__ = name
+    return wrapper
+
+
+for _name in ('__delitem__', 'insert', 'remove', 'sort', 'reverse', 'clear', '__imul__'):
+    setattr(CowList, _name, _reorders(_name))
+
+
+def _pointer(path: str, key) -> str:
+    return path + '/' + str(key).replace('~', '~0').replace('/', '~1')
+
+
+def json_patch(old, new, path: str = '') -> typing.List[dict]:
+    """ JSON patch (RFC 6902) from old to new.
+    Values shared between snapshots are skipped without comparing them, so the cost depends on
+    what changed rather than on the size of the data.
+    """
+    if old is new:
+        return []
+
+    if isinstance(old, dict) and isinstance(new, dict):
+        patch = []
+        for key in dict.keys(old):
+            if not dict.__contains__(new, key):
+                patch.append({'op': 'remove', 'path': _pointer(path, key)})
+        for key, value in dict.items(new):
+            if dict.__contains__(old, key):
+                patch.extend(json_patch(dict.__getitem__(old, key), value, _pointer(path, key)))
+            else:
+                patch.append({'op': 'add', 'path': _pointer(path, key), 'value': value})
+        return patch
+
+    if isinstance(old, list) and isinstance(new, list) and len(old) <= len(new):
+        patch = []
+        for i in range(len(old)):
+            patch.extend(json_patch(list.__getitem__(old, i), list.__getitem__(new, i), _pointer(path, i)))
+        for i in range(len(old), len(new)):
+            patch.append({'op': 'add', 'path': _pointer(path, '-'), 'value': list.__getitem__(new, i)})
+        return patch
+
+    if type(old) is type(new) and old == new:
+        return []
+    return [{'op': 'replace', 'path': path, 'value': new}]
@@ -1,4 +1,5 @@
 import asyncio
+import contextlib
 import logging
 import sys
 import time
@@ -6,21 +7,36 @@ import typing
 import traceback
 
 import pydantic
+import pydantic_core
 import jsonschema
 from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp.exceptions import ResourceError
+from mcp.server.lowlevel.helper_types import ReadResourceContents
 from mcp.types import Resource
 
-from jotsu.mcp.types import Workflow
+from jotsu.mcp.types import Workflow, WorkflowConcurrency, WorkflowCircuitBreaker
 from jotsu.mcp.local import LocalMCPClient
 from jotsu.mcp.client.client import MCPClient
 from jotsu.mcp.types.models import WorkflowNode, WorkflowModelUsage, WorkflowData, slug, WorkflowEvent
 
-from .handler import WorkflowHandler, WorkflowHandlerResult
-from .handler.utils import is_async_generator, is_result_or_complete_node
-from .sessions import WorkflowSessionManager
+from .cache import AsyncCache, LRUCache
+from .checkpoint import WorkflowCheckpointStore, WorkflowRunCheckpoint
+from .data import CowDict, json_patch
+from .handler import WorkflowHandler, WorkflowHandlerResult, WorkflowHandlerDelta
+from .plan import CompiledWorkflow, CompiledNode
+from .pool import WorkflowSessionPool
+from .retry import CircuitBreakers
+from .sessions import WorkflowSessionManager, WorkflowSessionRelay
+from .store import WorkflowStore
+from .utils import json_schema_validate
 
 logger = logging.getLogger(__name__)
 
+# How much of the data the actions of a run include:
+#   'full': the data of every action, 'diff': a JSON patch against the data of the previous action,
+#   'summary': no data, only the workflow result and 'none': only the action which ends the workflow.
+WorkflowTrace = typing.Literal['none', 'summary', 'diff', 'full']
+
 
 class _WorkflowCompleteException(Exception):
     ...
@@ -74,6 +90,15 @@ class WorkflowActionSchemaError(WorkflowAction):
     traceback: typing.List[_WorkflowTracebackFrame]
 
 
+class WorkflowActionError(WorkflowAction):
+    """ The workflow itself is invalid, e.g. a template which doesn't compile. """
+    action: typing.Literal['workflow-error'] = 'workflow-error'
+    workflow: _WorkflowRef
+    message: str
+    exc_type: str
+    traceback: typing.List[_WorkflowTracebackFrame]
+
+
 class WorkflowActionEnd(WorkflowAction):
     action: typing.Literal['workflow-end'] = 'workflow-end'
     workflow: _WorkflowRef
@@ -106,6 +131,15 @@ class WorkflowActionNode(WorkflowAction):
 WorkflowActionNodeEnd = WorkflowActionNode
 
 
+class WorkflowActionNodeDelta(WorkflowAction):
+    """ Output of a streaming node as it arrives, see WorkflowHandlerDelta. """
+    action: typing.Literal['node-delta'] = 'node-delta'
+    node: _WorkflowNodeRef
+    start_id: str | None = None
+    text: str | None = None
+    partial_json: str | None = None
+
+
 class WorkflowActionNodeError(WorkflowAction):
     action: typing.Literal['node-error'] = 'node-error'
     node: _WorkflowNodeRef
@@ -121,65 +155,276 @@ class WorkflowActionDefault(WorkflowAction):
     data: dict
 
 
+def _node_ref(compiled: CompiledNode) -> _WorkflowNodeRef:
+    if compiled.ref is None:
+        compiled.ref = _WorkflowNodeRef.from_node(compiled.node)
+    return compiled.ref
+
+
+def _snapshot(data):
+    """ Version of the data that doesn't change, shares everything with the original. """
+    if isinstance(data, CowDict):
+        return data.snapshot()
+    return CowDict(data) if isinstance(data, dict) else data
+
+
+def _produced(start: dict, data):
+    """ The members of data which aren't in start or have changed, i.e. what a branch added to its data. """
+    if not isinstance(data, dict):
+        return data
+    produced = {}
+    # Without copying shared values, see CowDict.
+    for key, value in dict.items(data):
+        if dict.__contains__(start, key):
+            old = dict.__getitem__(start, key)
+            if old is value or old == value:
+                continue
+        produced[key] = value
+    return produced
+
+
+class WorkflowActionEvent:
+    """ An action as emitted by stream_workflow().  The pydantic model is only built and dumped
+    when the event is serialized, the data is a copy-on-write snapshot either way.
+    Supports read access by key, the same as the dicts emitted by run_workflow().
+    """
+    __slots__ = ('model', 'values', 'snapshots', 'patch', '_dict')
+
+    # Fields which hold workflow data.
+    SNAPSHOTS = ('data', 'result')
+
+    def __init__(self, model: typing.Type[WorkflowAction], **values):
+        self.model = model
+        self.snapshots = {key: _snapshot(values.pop(key)) for key in self.SNAPSHOTS if key in values}
+        values.setdefault('timestamp', time.time())
+        self.values = values
+        # JSON patch sent instead of the data, see without_data().
+        self.patch: typing.List[dict] | None = None
+        self._dict: dict | None = None
+
+    def without_data(self, patch: typing.List[dict] | None = None) -> 'WorkflowActionEvent':
+        """ Copy of the event which leaves out the data, or has a JSON patch of the data instead. """
+        event = object.__new__(type(self))
+        event.model = self.model
+        event.snapshots = {key: value for key, value in self.snapshots.items() if key != 'data'}
+        event.values = self.values
+        event.patch = patch
+        event._dict = None
+        return event
+
+    @property
+    def action(self) -> str:
+        return self.model.model_fields['action'].default
+
+    @property
+    def data(self) -> dict | None:
+        return self.snapshots.get('data')
+
+    @property
+    def node(self) -> _WorkflowNodeRef | None:
+        return self.values.get('node')
+
+    def to_dict(self) -> dict:
+        if self._dict is None:
+            fields = [key for key in self.SNAPSHOTS if key in self.model.model_fields and key not in self.values]
+            result = self.model(**self.values, **dict.fromkeys(fields)).model_dump()
+            for key in fields:
+                if key in self.snapshots:
+                    result[key] = self.snapshots[key]
+                elif key == 'data':
+                    del result[key]
+            if self.patch is not None:
+                result['patch'] = self.patch
+            self._dict = result
+        return self._dict
+
+    def to_json_bytes(self) -> bytes:
+        return pydantic_core.to_json(self.to_dict())
+
+    def __getitem__(self, key: str):
+        if key in self.snapshots:
+            return self.snapshots[key]
+        if key == 'action':
+            return self.action
+        return self.to_dict()[key]
+
+    def __contains__(self, key: str) -> bool:
+        # The same keys as to_dict(), without building it.
+        if key in self.snapshots or key == 'action':
+            return True
+        if key == 'patch':
+            return self.patch is not None
+        if key == 'data':
+            return key in self.values and key in self.model.model_fields
+        return key in self.model.model_fields
+
+    def get(self, key: str, default=None):
+        return self[key] if key in self else default
+
+    def __repr__(self):
+        return f'<{type(self).__name__} {self.action}>'
+
+
+class _HandlerFrame:
+    """ Executor state for a node with a handler. """
+    __slots__ = (
+        'compiled', 'ref', 'data', 'results', 'fan_out', 'usage', 'start', 'start_action_id', 'end_action_id',
+        'mark', 'ended'
+    )
+
+    def __init__(self, compiled: CompiledNode, data: dict):
+        self.compiled = compiled
+        self.ref = _node_ref(compiled)
+        self.data = data
+        self.results: typing.AsyncIterator[WorkflowHandlerResult] | None = None
+        self.fan_out: _FanOutFrame | None = None
+        self.usage: typing.List[WorkflowModelUsage] = []
+        self.start = time.time()
+        self.start_action_id = slug()
+        self.end_action_id = slug()
+        # Number of data actions emitted before any descendant ran.
+        self.mark = 0
+        # Set once the node-end action is emitted, i.e. while running the end node.
+        self.ended = False
+
+
+class _EdgesFrame:
+    """ Executor state for a node without a handler, all edges get the same data. """
+    __slots__ = ('targets', 'data')
+
+    def __init__(self, compiled: CompiledNode, data: dict):
+        self.targets = compiled.targets()
+        self.data = data
+
+
+class _FanOutFrame:
+    """ Executor state for branches running as concurrent tasks. """
+    __slots__ = ('concurrency', 'actions', 'queue', 'relay', 'inputs', 'results')
+
+    def __init__(self, concurrency: WorkflowConcurrency, *, sessions: WorkflowSessionManager):
+        self.concurrency = concurrency
+        self.actions: typing.AsyncIterator[WorkflowActionEvent] | None = None
+        # Actions and session requests from the branches.
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.relay = WorkflowSessionRelay(
+            sessions, request=lambda session_id, future: self.queue.put_nowait(('session', session_id, future))
+        )
+        # The data each branch started with, and the data of its last action, by branch index.
+        self.inputs: typing.Dict[int, dict] = {}
+        self.results: typing.Dict[int, dict] = {}
+
+    def merged(self, data: dict) -> dict:
+        if self.concurrency.merge == 'collect':
+            merged = _snapshot(data) if data else {}
+            merged[self.concurrency.member] = [
+                _produced(self.inputs[index], self.results[index]) for index in sorted(self.results)
+            ]
+            return merged
+        if not self.results:
+            return data
+        if self.concurrency.merge == 'update':
+            merged = _snapshot(data) if data else {}
+            for index in sorted(self.results):
+                merged.update(self.results[index] or {})
+            return merged
+        return self.results[max(self.results)]
+
+
 class WorkflowEngine(FastMCP):
     MOCKS = '__mocks__'
     MOCK_TYPE = '__type__'
 
     def __init__(
-            self, workflows: Workflow | typing.List[Workflow], *args,
+            self, workflows: Workflow | typing.List[Workflow] | None = None, *args,
             client: typing.Optional[MCPClient] = None, handler_cls: typing.Type[WorkflowHandler] = None,
+            executor: typing.Literal['iterative', 'recursive'] = 'iterative',
+            session_pool: WorkflowSessionPool | None = None, precompile_templates: bool = False,
+            trace: WorkflowTrace = 'full', model_cache: AsyncCache | None = None,
+            tool_cache: AsyncCache | None = None, prefetch_sessions: bool = False,
+            store: WorkflowStore | None = None, plan_cache_size: int = 1024,
+            checkpoints: WorkflowCheckpointStore | None = None,
+            circuit_breaker: WorkflowCircuitBreaker | None = None,
             **kwargs
     ):
-        self._workflows = [workflows] if isinstance(workflows, Workflow) else workflows
+        # Registered workflows by id, and the ids registered under each name in registration order.
+        self._workflows: typing.Dict[str, Workflow] = {}
+        self._workflow_names: typing.Dict[str, typing.List[str]] = {}
         self._client = client if client else LocalMCPClient()
+        # Share MCP sessions between runs, the caller is responsible for closing the pool.
+        self._session_pool = session_pool
         self._handler = handler_cls(self) if handler_cls is not None else WorkflowHandler(engine=self)
+        self._plans: typing.Dict[str, CompiledWorkflow] = {}
+        # Workflows which aren't registered are loaded from the store when first used.
+        self._store = store
+        # Plans of the workflows which aren't registered by id, and the id of each name they were requested with.
+        self._loaded = LRUCache(maxsize=plan_cache_size)
+        self._loaded_names = LRUCache(maxsize=plan_cache_size)
+        # Handler results are recorded as the run goes, so that it can be resumed with resume_workflow().
+        self._checkpoints = checkpoints
+        # Compile model node templates when a workflow is registered, so that errors are raised there.
+        self._precompile_templates = precompile_templates
+        # Responses of model nodes, keyed by the rendered request.
+        self._model_cache = model_cache
+        # Results of tool nodes, keyed by server, tool and arguments.
+        self._tool_cache = tool_cache
+        # Circuit breakers of MCP servers and model providers, shared by all runs.  The default applies
+        # to the servers without settings of their own, and the providers.
+        self._circuit_breakers = CircuitBreakers(circuit_breaker)
+        # Connect to all servers of a workflow concurrently when it starts, instead of on first use.
+        self._prefetch_sessions = prefetch_sessions
+
+        if executor not in ('iterative', 'recursive'):
+            raise ValueError(f'Invalid executor: {executor}')
+        self._executor = executor
+
+        if trace not in typing.get_args(WorkflowTrace):
+            raise ValueError(f'Invalid trace: {trace}')
+        # Default for runs which don't specify it.
+        self._trace = trace
 
         super().__init__(*args, **kwargs)
         self.add_tool(self.run_workflow, name='workflow')
 
-        for workflow in self._workflows:
-            self._preprocess_workflow(workflow)
-            resource = Resource(
-                name=workflow.name,
-                description=workflow.description,
-                uri=pydantic.AnyUrl(f'workflow://{workflow.id}/'),
-                mimeType='application/json'
-            )
-            self.add_resource(resource)
+        for workflow in [workflows] if isinstance(workflows, Workflow) else workflows or []:
+            self.add_workflow(workflow)
 
     @property
     def handler(self) -> WorkflowHandler:
         return self._handler
 
     async def _run_workflow_node(
-            self, workflow: Workflow, node: WorkflowNode, data: dict, *,
-            nodes: typing.Dict[str, WorkflowNode], sessions: WorkflowSessionManager,
-            run_id: str, mocks: typing.Dict[str, dict]
+            self, plan: CompiledWorkflow, compiled: CompiledNode, data: dict, *,
+            sessions: WorkflowSessionManager, run_id: str, mocks: typing.Dict[str, dict],
+            checkpoint: WorkflowRunCheckpoint | None = None, deadline: float | None = None
     ):
-        ref = _WorkflowNodeRef.from_node(node)
+        node = compiled.node
+        ref = _node_ref(compiled)
 
         start_action_id = slug()
         end_action_id = slug()
 
-        handler = getattr(self._handler, f'handle_{node.type}', None)
-        if handler:
+        if compiled.handler:
             start = time.time()
-            yield WorkflowActionNodeStart(
-                id=start_action_id, node=ref, data=data, run_id=run_id, timestamp=start
-            ).model_dump()
+            yield WorkflowActionEvent(
+                WorkflowActionNodeStart, id=start_action_id, node=ref, run_id=run_id, timestamp=start, data=data
+            )
 
             usage: typing.List[WorkflowModelUsage] = []
             try:
                 complete_exception = None
                 try:
                     async for handler_result in self._iterate_handler(
-                            node, handler, data,
-                            mocks=mocks, action_id=end_action_id, workflow=workflow, sessions=sessions, usage=usage,
+                            compiled, data, mocks=mocks, checkpoint=checkpoint, deadline=deadline, usage=usage,
+                            action_id=end_action_id, workflow=plan.workflow, servers=plan.servers, sessions=sessions,
                     ):
-                        next_node = nodes[handler_result.edge]
+                        if isinstance(handler_result, WorkflowHandlerDelta):
+                            yield self._node_delta(ref, handler_result, run_id=run_id, start_id=start_action_id)
+                            continue
+
+                        next_node = plan.get_node(handler_result.edge)
                         async for child_result in self._run_workflow_node(
-                                workflow, next_node, handler_result.data, nodes=nodes,
-                                sessions=sessions, run_id=run_id, mocks=mocks
+                                plan, next_node, handler_result.data,
+                                sessions=sessions, run_id=run_id, mocks=mocks, checkpoint=checkpoint, deadline=deadline
                         ):
                             yield child_result
                             data = child_result['data'] if 'data' in child_result else data
@@ -189,21 +434,21 @@ class WorkflowEngine(FastMCP):
                     complete_exception = e
 
                 end = time.time()
-                yield WorkflowActionNode(
-                    id=end_action_id, node=ref, data=data, run_id=run_id,
+                yield WorkflowActionEvent(
+                    WorkflowActionNode, id=end_action_id, node=ref, run_id=run_id,
                     timestamp=end, duration=end - start, start_id=start_action_id,
-                    usage=usage
-                ).model_dump()
+                    usage=usage, data=data
+                )
                 # FIXME: add usage here!
 
                 if complete_exception:
                     raise complete_exception
 
-                end_node_id = getattr(node, 'end_node_id', None)
-                if end_node_id:
+                end_node = compiled.end_target()
+                if end_node:
                     async for child_result in self._run_workflow_node(
-                            workflow, nodes[end_node_id], data, nodes=nodes,
-                            sessions=sessions, run_id=run_id, mocks=mocks
+                            plan, end_node, _snapshot(data),
+                            sessions=sessions, run_id=run_id, mocks=mocks, checkpoint=checkpoint, deadline=deadline
                     ):
                         yield child_result
                         data = child_result['data'] if 'data' in child_result else data
@@ -213,111 +458,590 @@ class WorkflowEngine(FastMCP):
             except Exception as e:  # noqa
                 logger.exception('handler exception')
 
-                # If there is only one exception in the group, return that instead.
-                if isinstance(e, ExceptionGroup):
-                    if len(e.exceptions) == 1:
-                        e = e.exceptions[0]
-
-                exc_type = type(e)
-                tb = e.__traceback__
-
-                yield WorkflowActionNodeError(
-                    node=ref, message=str(e), run_id=run_id, usage=usage,
-                    exc_type=exc_type.__name__, traceback=list(self._get_tb(tb))
-                ).model_dump()
+                e = self._unwrap_exception(e)
+                yield self._node_error(ref, e, run_id=run_id, usage=usage)
 
                 raise e
         else:
             # result and complete don't have handlers.
-            yield WorkflowActionNode(
-                id=end_action_id, node=ref, data=data, run_id=run_id,
-                timestamp=time.time(), duration=0, usage=[]
-            ).model_dump()
+            yield WorkflowActionEvent(
+                WorkflowActionNode, id=end_action_id, node=ref, run_id=run_id,
+                timestamp=time.time(), duration=0, usage=[], data=data
+            )
 
             if node.type == 'complete':
                 raise _WorkflowCompleteException(data)
 
-            for node_id in node.edges:
-                next_node = nodes[node_id]
+            for next_node in compiled.targets():
                 async for child_data in self._run_workflow_node(
-                        workflow, next_node, data, nodes=nodes,
-                        sessions=sessions, run_id=run_id, mocks=mocks
+                        plan, next_node, _snapshot(data),
+                        sessions=sessions, run_id=run_id, mocks=mocks, checkpoint=checkpoint, deadline=deadline
                 ):
                     yield child_data
 
+    async def _execute_workflow_node(
+            self, plan: CompiledWorkflow, compiled: CompiledNode, data: dict, *,
+            sessions: WorkflowSessionManager, run_id: str, mocks: typing.Dict[str, dict],
+            checkpoint: WorkflowRunCheckpoint | None = None, deadline: float | None = None
+    ):
+        """ Same actions as _run_workflow_node() but walks the workflow with an explicit stack,
+        so the cost per action doesn't grow with the depth of the workflow.
+        """
+        stack: typing.List[_HandlerFrame | _EdgesFrame] = []
+        pending: typing.Tuple[CompiledNode, dict] | None = (compiled, data)
+
+        # A handler node ends with the data of the last action from its descendants (if any),
+        # tracked by counting the actions which carry data.
+        last_data = data
+        count = 0
+
+        try:
+            while pending or stack:
+                try:
+                    if pending:
+                        compiled, data = pending
+                        pending = None
+
+                        if compiled.handler:
+                            frame = _HandlerFrame(compiled, data)
+                            action = WorkflowActionEvent(
+                                WorkflowActionNodeStart, id=frame.start_action_id, node=frame.ref, run_id=run_id,
+                                timestamp=frame.start, data=data
+                            )
+                            yield action
+                            last_data, count = action['data'], count + 1
+
+                            frame.mark = count
+                            stack.append(frame)
+                            if compiled.concurrency:
+                                frame.fan_out = _FanOutFrame(compiled.concurrency, sessions=sessions)
+                                frame.fan_out.actions = self._fan_out(
+                                    plan, frame.fan_out,
+                                    self._handler_branches(
+                                        plan, frame, sessions=frame.fan_out.relay, run_id=run_id, mocks=mocks,
+                                        checkpoint=checkpoint, deadline=deadline
+                                    ),
+                                    sessions=sessions, run_id=run_id, mocks=mocks,
+                                    checkpoint=checkpoint, deadline=deadline
+                                )
+                                stack.append(frame.fan_out)
+                            else:
+                                frame.results = self._iterate_handler(
+                                    compiled, data, mocks=mocks, usage=frame.usage,
+                                    checkpoint=checkpoint, deadline=deadline,
+                                    action_id=frame.end_action_id, workflow=plan.workflow, servers=plan.servers,
+                                    sessions=sessions,
+                                )
+                        else:
+                            # result and complete don't have handlers.
+                            action = WorkflowActionEvent(
+                                WorkflowActionNode, node=_node_ref(compiled), run_id=run_id,
+                                timestamp=time.time(), duration=0, usage=[], data=data
+                            )
+                            yield action
+                            last_data, count = action['data'], count + 1
+
+                            if compiled.node.type == 'complete':
+                                raise _WorkflowCompleteException(data)
+                            if compiled.concurrency:
+                                fan_out = _FanOutFrame(compiled.concurrency, sessions=sessions)
+                                fan_out.actions = self._fan_out(
+                                    plan, fan_out, self._edge_branches(compiled, data),
+                                    sessions=sessions, run_id=run_id, mocks=mocks,
+                                    checkpoint=checkpoint, deadline=deadline
+                                )
+                                stack.append(fan_out)
+                            else:
+                                stack.append(_EdgesFrame(compiled, data))
+                        continue
+
+                    frame = stack[-1]
+                    if isinstance(frame, _EdgesFrame):
+                        next_node = next(frame.targets, None)
+                        if next_node:
+                            pending = (next_node, _snapshot(frame.data))
+                        else:
+                            stack.pop()
+                    elif isinstance(frame, _FanOutFrame):
+                        try:
+                            action = await anext(frame.actions)
+                        except StopAsyncIteration:
+                            stack.pop()
+                        else:
+                            yield action
+                            if 'data' in action:
+                                last_data, count = action['data'], count + 1
+                    elif frame.ended:
+                        stack.pop()
+                    else:
+                        if frame.fan_out is None:
+                            try:
+                                handler_result = await anext(frame.results)
+                            except StopAsyncIteration:
+                                frame.data = last_data if count > frame.mark else frame.data
+                            else:
+                                if isinstance(handler_result, WorkflowHandlerDelta):
+                                    yield self._node_delta(
+                                        frame.ref, handler_result, run_id=run_id, start_id=frame.start_action_id
+                                    )
+                                else:
+                                    pending = (plan.get_node(handler_result.edge), handler_result.data)
+                                continue
+                        else:
+                            frame.data = frame.fan_out.merged(frame.data)
+
+                        frame.ended = True
+                        action = self._node_end(frame, run_id=run_id)
+                        yield action
+                        last_data, count = action['data'], count + 1
+
+                        end_node = frame.compiled.end_target()
+                        if end_node:
+                            pending = (end_node, _snapshot(frame.data))
+
+                except Exception as e:  # noqa
+                    # Unwind the stack the same way the exception propagates through _run_workflow_node().
+                    while stack:
+                        frame = stack.pop()
+                        if not isinstance(frame, _HandlerFrame):
+                            continue
+
+                        if isinstance(e, _WorkflowCompleteException):
+                            # Ensures the end node is output.
+                            if not frame.ended:
+                                frame.data = last_data if count > frame.mark else frame.data
+                                action = self._node_end(frame, run_id=run_id)
+                                yield action
+                                last_data, count = action['data'], count + 1
+                            continue
+
+                        logger.error('handler exception', exc_info=e)
+                        e = self._unwrap_exception(e)
+                        yield self._node_error(frame.ref, e, run_id=run_id, usage=frame.usage)
+                    raise e
+        finally:
+            # Stops branches still running, e.g. when the caller stops early.
+            for frame in stack:
+                if isinstance(frame, _FanOutFrame):
+                    await frame.actions.aclose()
+
+    async def _fan_out(
+            self, plan: CompiledWorkflow, fan_out: _FanOutFrame,
+            branches: typing.AsyncIterator[typing.Tuple[CompiledNode, dict]], *,
+            sessions: WorkflowSessionManager, run_id: str, mocks: typing.Dict[str, dict],
+            checkpoint: WorkflowRunCheckpoint | None = None, deadline: float | None = None
+    ):
+        """ Run each branch as a task and emit their actions.  Only the calling task uses the
+        sessions directly, branches request new sessions through the queue.
+        """
+        concurrency = fan_out.concurrency
+        queue = fan_out.queue
+        semaphore = asyncio.Semaphore(concurrency.max_tasks)
+        tasks: typing.List[asyncio.Task] = []
+
+        async def run_branch(index: int, node: CompiledNode, data: dict):
+            try:
+                async for branch_action in self._execute_workflow_node(
+                        plan, node, data, sessions=fan_out.relay, run_id=run_id, mocks=mocks,
+                        checkpoint=checkpoint, deadline=deadline
+                ):
+                    queue.put_nowait(('action', index, branch_action))
+                queue.put_nowait(('done', index, None))
+            except Exception as e:  # noqa
+                queue.put_nowait(('done', index, e))
+            finally:
+                semaphore.release()
+
+        async def feed():
+            total = 0
+            try:
+                async for node, data in branches:
+                    await semaphore.acquire()
+                    data = _snapshot(data)
+                    # Kept apart from the branch's copy, which may be changed in place.
+                    fan_out.inputs[total] = _snapshot(data)
+                    tasks.append(asyncio.create_task(run_branch(total, node, data)))
+                    total += 1
+                queue.put_nowait(('fed', total, None))
+            except Exception as e:  # noqa
+                queue.put_nowait(('fed', total, e))
+
+        feeder = asyncio.create_task(feed())
+
+        ordered = concurrency.order == 'branch'
+        buffers: typing.Dict[int, typing.List[WorkflowActionEvent]] = {}
+        done: typing.Set[int] = set()
+        current = 0
+        total: int | None = None
+        error: Exception | None = None
+        try:
+            while total is None or len(done) < total:
+                kind, key, value = await queue.get()
+                if kind == 'session':
+                    await self._relay_session(sessions, key, value)
+                elif kind == 'delta':
+                    # From the handler of the node itself, not a branch.
+                    yield value
+                elif kind == 'action':
+                    if 'data' in value:
+                        fan_out.results[key] = value['data']
+                    if not ordered or key == current:
+                        yield value
+                    else:
+                        buffers.setdefault(key, []).append(value)
+                elif value is not None:
+                    error = value
+                    break
+                elif kind == 'fed':
+                    total = key
+                else:
+                    done.add(key)
+                    while ordered and current in done:
+                        current += 1
+                        for action in buffers.pop(current, ()):
+                            yield action
+        finally:
+            feeder.cancel()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(feeder, *tasks, return_exceptions=True)
+
+        if error:
+            # Emit what the other branches did before they were stopped.
+            for index in sorted(buffers):
+                for action in buffers[index]:
+                    yield action
+            raise error
+
+    async def _handler_branches(
+            self, plan: CompiledWorkflow, frame: _HandlerFrame, *,
+            sessions: WorkflowSessionRelay, run_id: str, mocks: typing.Dict[str, dict],
+            checkpoint: WorkflowRunCheckpoint | None = None, deadline: float | None = None
+    ) -> typing.AsyncIterator[typing.Tuple[CompiledNode, dict]]:
+        async for handler_result in self._iterate_handler(
+                frame.compiled, frame.data, mocks=mocks, checkpoint=checkpoint, deadline=deadline, usage=frame.usage,
+                action_id=frame.end_action_id, workflow=plan.workflow, servers=plan.servers, sessions=sessions,
+        ):
+            if isinstance(handler_result, WorkflowHandlerDelta):
+                frame.fan_out.queue.put_nowait(('delta', None, self._node_delta(
+                    frame.ref, handler_result, run_id=run_id, start_id=frame.start_action_id
+                )))
+            else:
+                yield plan.get_node(handler_result.edge), handler_result.data
+
+    @staticmethod
+    async def _edge_branches(
+            compiled: CompiledNode, data: dict
+    ) -> typing.AsyncIterator[typing.Tuple[CompiledNode, dict]]:
+        for node in compiled.targets():
+            yield node, data
+
+    @staticmethod
+    async def _relay_session(
+            sessions: WorkflowSessionManager | WorkflowSessionRelay, session_id: str, future: asyncio.Future
+    ):
+        try:
+            session = await sessions.get_session(session_id)
+        except Exception as e:  # noqa
+            if not future.done():
+                future.set_exception(e)
+        else:
+            if not future.done():
+                future.set_result(session)
+
+    @staticmethod
+    def _node_end(frame: _HandlerFrame, *, run_id: str) -> WorkflowActionEvent:
+        end = time.time()
+        return WorkflowActionEvent(
+            WorkflowActionNode, id=frame.end_action_id, node=frame.ref, run_id=run_id,
+            timestamp=end, duration=end - frame.start, start_id=frame.start_action_id,
+            usage=frame.usage, data=frame.data
+        )
+
+    @staticmethod
+    def _node_delta(
+            ref: _WorkflowNodeRef, delta: WorkflowHandlerDelta, *, run_id: str, start_id: str
+    ) -> WorkflowActionEvent:
+        return WorkflowActionEvent(
+            WorkflowActionNodeDelta, node=ref, run_id=run_id, start_id=start_id,
+            text=delta.text, partial_json=delta.partial_json
+        )
+
+    def _node_error(
+            self, ref: _WorkflowNodeRef, e: Exception, *, run_id: str, usage: typing.List[WorkflowModelUsage]
+    ) -> WorkflowActionEvent:
+        return WorkflowActionEvent(
+            WorkflowActionNodeError, node=ref, message=str(e), run_id=run_id, usage=usage,
+            exc_type=type(e).__name__, traceback=list(self._get_tb(e.__traceback__))
+        )
+
+    @staticmethod
+    def _unwrap_exception(e: Exception) -> Exception:
+        # If there is only one exception in the group, return that instead.
+        if isinstance(e, ExceptionGroup):
+            if len(e.exceptions) == 1:
+                return e.exceptions[0]
+        return e
+
     async def get_workflow(self, name: str):
-        return self._get_workflow(name)
+        workflow = self._get_workflow(name)
+        if workflow is None and self._store is not None:
+            workflow = await self._load_workflow(name)
+        return workflow
+
+    def add_workflow(self, workflow: Workflow) -> None:
+        """ Register a workflow, the id must not already be registered. """
+        if workflow.id in self._workflows:
+            raise ValueError(f'Workflow already exists: {workflow.id}')
+
+        self._register(workflow, self._compile(workflow))
+
+    def remove_workflow(self, workflow_id: str) -> Workflow:
+        """ Unregister a workflow, runs already in progress are not affected. """
+        workflow = self._workflows.pop(workflow_id, None)
+        if workflow is None:
+            raise ValueError(f'Workflow not found: {workflow_id}')
+
+        self._plans.pop(workflow_id, None)
+        # Another workflow with the same name takes over, in registration order.
+        workflow_ids = self._workflow_names[workflow.name]
+        workflow_ids.remove(workflow_id)
+        if not workflow_ids:
+            del self._workflow_names[workflow.name]
+        return workflow
+
+    def replace_workflow(self, workflow: Workflow) -> Workflow | None:
+        """ Register a workflow in place of the one with the same id, if any, which is returned.
+        The workflow is compiled first, if that fails the one registered is kept.
+        """
+        plan = self._compile(workflow)
+        previous = self.remove_workflow(workflow.id) if workflow.id in self._workflows else None
+        self._register(workflow, plan)
+        return previous
+
+    def _register(self, workflow: Workflow, plan: CompiledWorkflow) -> None:
+        self._plans[workflow.id] = plan
+        self._workflows[workflow.id] = workflow
+        self._workflow_names.setdefault(workflow.name, []).append(workflow.id)
+
+    async def list_resources(self) -> typing.List[Resource]:
+        """ The resources of the server followed by one per workflow, registered or in the store. """
+        resources = await super().list_resources()
+        for workflow in self._workflows.values():
+            resources.append(self._workflow_resource(workflow.id, workflow.name, workflow.description))
+        if self._store is not None:
+            for info in await self._store.list():
+                if info.id not in self._workflows:
+                    resources.append(self._workflow_resource(info.id, info.name, info.description))
+        return resources
+
+    async def read_resource(self, uri: str | pydantic.AnyUrl) -> typing.Iterable[ReadResourceContents]:
+        """ The definition of a workflow as JSON, for workflow:// URIs. """
+        uri = str(uri)
+        if not (uri.startswith('workflow://') and uri.endswith('/')):
+            return await super().read_resource(uri)
+
+        workflow_id = uri[len('workflow://'):-1]
+        workflow = self._workflows.get(workflow_id)
+        if workflow is None and self._store is not None:
+            workflow = await self._load_workflow(workflow_id)
+        if workflow is None or workflow.id != workflow_id:
+            raise ResourceError(f'Unknown resource: {uri}')
+        return [ReadResourceContents(content=workflow.model_dump_json(), mime_type='application/json')]
+
+    @staticmethod
+    def _workflow_resource(workflow_id: str, name: str, description: str | None) -> Resource:
+        return Resource(
+            name=name, description=description,
+            uri=pydantic.AnyUrl(f'workflow://{workflow_id}/'), mimeType='application/json'
+        )
+
+    def invalidate_workflow(self, workflow_id: str) -> None:
+        """ Forget the plan of a workflow loaded from the store, so that the next run loads it again.
+        Call this after changing or deleting the workflow in the store, runs already in progress are not affected.
+        """
+        self._loaded.delete(workflow_id)
+
+    async def _load_workflow(self, name: str) -> Workflow | None:
+        plan = self._loaded.get(name) or self._loaded.get(self._loaded_names.get(name))
+        if plan is not None and name not in (plan.workflow.id, plan.workflow.name):
+            # Renamed since.
+            plan = None
+        if plan is None:
+            workflow = await self._store.get(name)
+            if workflow is None:
+                return None
+            try:
+                plan = self._compile(workflow)
+            except Exception as e:  # noqa
+                # Reported by the run, see _stream_workflow().
+                logger.warning("Could not compile workflow '%s': %s", workflow.id, str(e))
+                return workflow
+            self._loaded.set(workflow.id, plan)
+            if name != workflow.id:
+                self._loaded_names.set(name, workflow.id)
+        return plan.workflow
 
-    async def run_workflow(self, name: str, data: dict = None, *, run_id: str = None):
+    async def run_workflow(
+            self, name: str, data: dict = None, *, run_id: str = None, trace: WorkflowTrace | None = None
+    ):
+        async with contextlib.aclosing(self.stream_workflow(name, data, run_id=run_id, trace=trace)) as events:
+            async for event in events:
+                yield event.to_dict()
+
+    async def resume_workflow(self, run_id: str, *, trace: WorkflowTrace | None = None):
+        """ Run a workflow again from its checkpoint, the nodes which already completed aren't run again
+        but their actions are emitted as before.
+        """
+        if self._checkpoints is None:
+            raise ValueError('The engine has no checkpoint store.')
+        checkpoint = await self._checkpoints.load(run_id)
+        if checkpoint is None:
+            raise ValueError(f'Checkpoint not found: {run_id}')
+
+        events = self._stream_workflow(checkpoint.workflow_id, checkpoint.data, run_id=run_id, resume=True)
+        async with contextlib.aclosing(self._trace_events(events, trace)) as events:
+            async for event in events:
+                yield event.to_dict()
+
+    def stream_workflow(
+            self, name: str, data: dict = None, *, run_id: str = None, trace: WorkflowTrace | None = None
+    ) -> typing.AsyncIterator[WorkflowActionEvent]:
+        """ Same as run_workflow() but emits WorkflowActionEvent objects, which are only serialized
+        when needed, i.e. to_dict() or to_json_bytes().
+        A checkpoint left by an earlier run with the same run_id is discarded, see resume_workflow().
+        """
+        return self._trace_events(self._stream_workflow(name, data, run_id=run_id), trace)
+
+    async def _trace_events(
+            self, events: typing.AsyncGenerator[WorkflowActionEvent, None], trace: WorkflowTrace | None
+    ) -> typing.AsyncIterator[WorkflowActionEvent]:
+        trace = trace or self._trace
+        previous = None
+
+        async with contextlib.aclosing(events) as events:
+            async for event in events:
+                match trace:
+                    case 'full':
+                        yield event
+                    case 'none':
+                        if event.action in (
+                                'workflow-end', 'workflow-failed', 'workflow-schema-error', 'workflow-error'
+                        ):
+                            yield event
+                    case 'summary':
+                        yield event.without_data() if 'data' in event.snapshots else event
+                    case _:
+                        if 'data' not in event.snapshots:
+                            yield event
+                        elif previous is None:
+                            # The first action, i.e. workflow-start, has all the data.
+                            previous = event.data
+                            yield event
+                        else:
+                            patch = json_patch(previous, event.data)
+                            previous = event.data
+                            yield event.without_data(patch)
+
+    async def _stream_workflow(
+            self, name: str, data: dict = None, *, run_id: str = None, resume: bool = False
+    ) -> typing.AsyncIterator[WorkflowActionEvent]:
         start = time.time()
         workflow_result_data: dict | None = None
 
         workflow = await self._workflow(name)
 
         run_id = run_id if run_id else slug()
+        # Every handler of the run must finish before the deadline.
+        deadline = asyncio.get_running_loop().time() + workflow.timeout if workflow.timeout else None
         workflow_name = f'{workflow.name} [{workflow.id}]' if workflow.name != workflow.id else workflow.name
         logger.info("Running workflow '%s'.", workflow_name)
 
-        payload = workflow.data.copy() if workflow.data else {}
+        # Copy-on-write, so that every action can reference the data instead of copying it.
+        payload = CowDict(workflow.data) if workflow.data else CowDict()
         if data:
             payload.update(data)
 
         mocks = payload.pop(self.MOCKS, {})
 
         ref = _WorkflowRef(id=workflow.id, name=workflow.name or workflow.id)
-        yield WorkflowActionStart(workflow=ref, timestamp=start, data=payload, run_id=run_id).model_dump()
+        yield WorkflowActionEvent(WorkflowActionStart, workflow=ref, timestamp=start, run_id=run_id, data=payload)
 
         if workflow.event and workflow.event.json_schema:
             try:
-                jsonschema.validate(instance=payload, schema=workflow.event.json_schema)
+                json_schema_validate(payload, workflow.event.json_schema)
             except jsonschema.ValidationError as e:
                 exc_type, _, tb = sys.exc_info()
-                yield WorkflowActionSchemaError(
-                    workflow=ref, message=str(e), run_id=run_id,
+                yield WorkflowActionEvent(
+                    WorkflowActionSchemaError, workflow=ref, message=str(e), run_id=run_id,
                     exc_type=exc_type.__name__, traceback=list(self._get_tb(tb)),
-                ).model_dump()
+                )
 
                 end = time.time()
                 duration = end - start
-                yield WorkflowActionFailed(
-                    workflow=ref, timestamp=end, duration=duration, run_id=run_id
-                ).model_dump()
+                yield WorkflowActionEvent(
+                    WorkflowActionFailed, workflow=ref, timestamp=end, duration=duration, run_id=run_id
+                )
                 logger.info(
                     "Workflow '%s' failed due to invalid schema in %s seconds.",
                     workflow_name, f'{duration:.4f}'
                 )
                 return
 
-        nodes = {node.id: node for node in workflow.nodes}
+        try:
+            # Workflows which aren't registered are compiled on first use.
+            plan = self._plan(workflow)
+        except Exception as e:  # noqa
+            yield WorkflowActionEvent(
+                WorkflowActionError, workflow=ref, message=str(e), run_id=run_id,
+                exc_type=type(e).__name__, traceback=list(self._get_tb(e.__traceback__)),
+            )
 
-        start_node_id = workflow.start_node_id
-        if not start_node_id:
-            start_node_id = workflow.nodes[0].id if len(workflow.nodes) else None
-        node = nodes.get(start_node_id) if start_node_id else None
+            end = time.time()
+            duration = end - start
+            yield WorkflowActionEvent(
+                WorkflowActionFailed, workflow=ref, timestamp=end, duration=duration, run_id=run_id
+            )
+            logger.info("Workflow '%s' failed to compile in %s seconds.", workflow_name, f'{duration:.4f}')
+            return
+        node = plan.start_node
 
         if not node:
             end = time.time()
             duration = end - start
 
-            yield WorkflowActionEnd(workflow=ref, timestamp=end, duration=duration, run_id=run_id).model_dump()
+            yield WorkflowActionEvent(WorkflowActionEnd, workflow=ref, timestamp=end, duration=duration, run_id=run_id)
             logger.info(
                 "Empty workflow '%s' completed successfully in %s seconds.",
                 workflow_name, f'{end - start:.4f}'
             )
             return
 
-        sessions = WorkflowSessionManager(workflow, client=self._client)
+        checkpoint = None
+        if self._checkpoints is not None:
+            checkpoint = await WorkflowRunCheckpoint.begin(
+                self._checkpoints, run_id, workflow.id, data, resume=resume
+            )
+
+        sessions = WorkflowSessionManager(
+            workflow, client=self._client, servers=plan.servers, pool=self._session_pool
+        )
+        run_workflow_node = (
+            self._execute_workflow_node if self._executor == 'iterative' else self._run_workflow_node
+        )
         try:
             success = True
             try:
-                async for result in self._run_workflow_node(
-                        workflow, node, data=payload, nodes=nodes,
-                        sessions=sessions, run_id=run_id, mocks=mocks,
+                if self._prefetch_sessions:
+                    sessions.prefetch()
+                async for result in run_workflow_node(
+                        plan, node, data=payload,
+                        sessions=sessions, run_id=run_id, mocks=mocks, checkpoint=checkpoint, deadline=deadline,
                 ):
                     # check for result
                     yield result
-                    if is_result_or_complete_node(result):
-                        workflow_result_data = result.get('data')
+                    if result.node is not None and result.node.type in ('result', 'complete'):
+                        workflow_result_data = result.data
             except _WorkflowCompleteException:
                 # This works since the yield happens before the exception.
                 pass
@@ -328,16 +1052,20 @@ class WorkflowEngine(FastMCP):
             duration = end - start
 
             if success:
-                yield WorkflowActionEnd(
-                    result=workflow_result_data, workflow=ref,
-                    timestamp=end, duration=duration, run_id=run_id
-                ).model_dump()
+                if checkpoint is not None:
+                    await self._checkpoints.delete(run_id)
+                yield WorkflowActionEvent(
+                    WorkflowActionEnd, workflow=ref, timestamp=end, duration=duration, run_id=run_id,
+                    result=workflow_result_data
+                )
                 logger.info(
                     "Workflow '%s' completed successfully in %s seconds.",
                     workflow_name, f'{duration:.4f}'
                 )
             else:
-                yield WorkflowActionFailed(workflow=ref, timestamp=end, duration=duration, run_id=run_id).model_dump()
+                yield WorkflowActionEvent(
+                    WorkflowActionFailed, workflow=ref, timestamp=end, duration=duration, run_id=run_id
+                )
                 logger.info(
                     "Workflow '%s' failed in %s seconds.",
                     workflow_name, f'{duration:.4f}'
@@ -366,15 +1094,36 @@ class WorkflowEngine(FastMCP):
         for node in workflow.nodes:
             node.name = node.name or node.id
 
+    def _compile(self, workflow: Workflow) -> CompiledWorkflow:
+        self._preprocess_workflow(workflow)
+        plan = CompiledWorkflow(workflow, handler=self._handler, precompile_templates=self._precompile_templates)
+        # The recursive executor runs the branches of a node one after another, in order.
+        if self._executor == 'recursive':
+            concurrent = [node.id for node in plan.nodes.values() if node.concurrency]
+            if concurrent:
+                raise ValueError(
+                    f"Workflow '{workflow.id}' runs nodes concurrently ({', '.join(concurrent)}), "
+                    'which needs the iterative executor.'
+                )
+        return plan
+
+    def _plan(self, workflow: Workflow) -> CompiledWorkflow:
+        # Workflows returned by an overridden get_workflow() are compiled on first use.
+        plan = self._plans.get(workflow.id) or self._loaded.get(workflow.id)
+        if plan is None or plan.workflow is not workflow:
+            plan = self._compile(workflow)
+            if workflow.id in self._workflows:
+                self._plans[workflow.id] = plan
+            else:
+                self._loaded.set(workflow.id, plan)
+        return plan
+
     # Helper for get_workflow()
     def _get_workflow(self, name: str) -> Workflow | None:
-        for workflow in self._workflows:
-            if workflow.id == name:
-                return workflow
-        for workflow in self._workflows:
-            if workflow.name == name:
-                return workflow
-        return None
+        workflow = self._workflows.get(name)
+        if workflow is None and name in self._workflow_names:
+            workflow = self._workflows[self._workflow_names[name][0]]
+        return workflow
 
     async def _workflow(self, name: str) -> Workflow:
         workflow = await self.get_workflow(name)
@@ -390,20 +1139,142 @@ class WorkflowEngine(FastMCP):
                 filename=frame.filename, lineno=frame.lineno, func_name=frame.name, text=frame.line
             )
 
+    async def _stream_handler(
+            self, method: typing.Callable, data: dict, *,
+            sessions: WorkflowSessionManager | WorkflowSessionRelay, **kwargs
+    ) -> typing.AsyncIterator:
+        """ Run a handler as a task which calls delta() as output arrives, yields the deltas and then
+        the data the handler returns.  Like fan-out branches, the task requests sessions through the queue.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        relay = WorkflowSessionRelay(
+            sessions, request=lambda session_id, future: queue.put_nowait(('session', session_id, future))
+        )
+        task = asyncio.create_task(method(
+            data, sessions=relay, delta=lambda **fields: queue.put_nowait(WorkflowHandlerDelta(**fields)), **kwargs
+        ))
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        try:
+            while (item := await queue.get()) is not None:
+                if isinstance(item, WorkflowHandlerDelta):
+                    yield item
+                else:
+                    _, session_id, future = item
+                    await self._relay_session(sessions, session_id, future)
+            yield task.result()
+        finally:
+            task.cancel()
+
     async def _iterate_handler(
-            self, node: WorkflowNode, method, data, *,
+            self, compiled: CompiledNode, data, *, deadline: float | None = None, **kwargs
+    ) -> typing.AsyncIterator[WorkflowHandlerResult]:
+        """ The results of the handler, which may take up to node.timeout seconds, not counting the time
+        its results take to run, and must finish before the deadline of the run (event loop time).
+        """
+        timeout = compiled.node.timeout
+        if timeout is None and deadline is None:
+            async for result in self._replay_handler(compiled, data, **kwargs):
+                yield result
+            return
+
+        loop = asyncio.get_running_loop()
+        spent = 0.0
+        limit = None
+        # Each call of the handler gets the limit of the current step, e.g. to limit requests to the model.
+        results = self._replay_handler(compiled, data, deadline=lambda: limit, **kwargs)
+        async with contextlib.aclosing(results):
+            while True:
+                start = loop.time()
+                node_limit = start + timeout - spent if timeout else None
+                limit = min(x for x in (deadline, node_limit) if x is not None)
+                try:
+                    async with asyncio.timeout_at(limit) as cm:
+                        result = await anext(results)
+                except StopAsyncIteration:
+                    return
+                except TimeoutError:
+                    if not cm.expired():
+                        raise
+                    if limit == node_limit:
+                        raise TimeoutError(f"Node '{compiled.id}' timed out after {timeout} seconds.") from None
+                    raise TimeoutError('The workflow timed out.') from None
+                spent += loop.time() - start
+                yield result
+
+    async def _replay_handler(
+            self, compiled: CompiledNode, data, *,
             mocks: typing.Dict[str, dict], usage: typing.List[WorkflowModelUsage],
-            **kwargs
+            checkpoint: WorkflowRunCheckpoint | None = None, **kwargs
+    ) -> typing.AsyncIterator[WorkflowHandlerResult]:
+        if checkpoint is None or compiled.node.id in mocks:
+            async for result in self._call_handler(compiled, data, mocks=mocks, usage=usage, **kwargs):
+                yield result
+            return
+
+        key = checkpoint.key(compiled.node.id, data)
+        record = checkpoint.replay(key)
+        skip = 0
+        if record:
+            # Recorded by an earlier attempt of the run, the handler isn't called again.
+            usage.extend(WorkflowModelUsage(**{**x, 'cached': True}) for x in record.usage)
+            for result in record.results:
+                yield WorkflowHandlerResult(**result)
+            if record.done:
+                return
+            skip = len(record.results)
+
+        start = 0
+        if skip and not compiled.is_async_generator:
+            # One call per edge, continue with the next edge.
+            start, data, skip = skip, record.results[-1]['data'], 0
+
+        recorded = len(usage)
+        async for result in self._call_handler(compiled, data, mocks=mocks, usage=usage, start=start, **kwargs):
+            if isinstance(result, WorkflowHandlerResult):
+                if skip:
+                    # Generator handlers run again from the start, e.g. loops.
+                    skip -= 1
+                    continue
+                # Before the descendants of the result run.
+                await checkpoint.record(key, result=result, usage=usage[recorded:])
+                recorded = len(usage)
+            yield result
+        await checkpoint.record(key, usage=usage[recorded:], done=True)
+
+    async def _call_handler(
+            self, compiled: CompiledNode, data, *,
+            mocks: typing.Dict[str, dict], usage: typing.List[WorkflowModelUsage], start: int = 0,
+            deadline: typing.Callable[[], float] | None = None, **kwargs
     ) -> typing.AsyncIterator[WorkflowHandlerResult]:
         # A handler returns either a simple dict or an async iterator of WorkflowHandlerResults.
         # Any model usage is stored in the usages list.
+        node = compiled.node
+        method = compiled.handler
+        kwargs['model_cache'] = self._model_cache
+        kwargs['tool_cache'] = self._tool_cache
+        kwargs['circuit_breakers'] = self._circuit_breakers
+        kwargs['artifacts'] = compiled.artifacts
         if node.id not in mocks:
-            if is_async_generator(method):
+            if compiled.is_async_generator:
                 # Test for a generator which returns an iterator...
+                if deadline:
+                    kwargs['deadline'] = deadline()
                 async for result in method(data, node=node, **kwargs):
                     yield result
+            elif getattr(node, 'stream', False):
+                for node_id in node.edges[start:]:
+                    if deadline:
+                        kwargs['deadline'] = deadline()
+                    async for result in self._stream_handler(method, data, node=node, usage=usage, **kwargs):
+                        if isinstance(result, WorkflowHandlerDelta):
+                            yield result
+                        else:
+                            data = result
+                    yield WorkflowHandlerResult(edge=node_id, data=data)
             else:
-                for node_id in node.edges:
+                for node_id in node.edges[start:]:
+                    if deadline:
+                        kwargs['deadline'] = deadline()
                     data = await method(data, node=node, usage=usage, **kwargs)
                     yield WorkflowHandlerResult(edge=node_id, data=data)
         else:
@@ -1,4 +1,4 @@
 from .handler import WorkflowHandler
-from .types import WorkflowHandlerResult
+from .types import WorkflowHandlerResult, WorkflowHandlerDelta
 
-__all__ = (WorkflowHandler, WorkflowHandlerResult)
+__all__ = (WorkflowHandler, WorkflowHandlerResult, WorkflowHandlerDelta)
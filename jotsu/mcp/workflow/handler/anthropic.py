@@ -1,10 +1,14 @@
 import logging
 import typing
 
-from jotsu.mcp.types import WorkflowModelUsage, Workflow
+from jotsu.mcp.types import WorkflowModelUsage, Workflow, WorkflowServer
 from jotsu.mcp.types.models import WorkflowAnthropicNode
 from jotsu.mcp.workflow import utils
-from .utils import get_messages, update_data_from_text, update_data_from_json
+from jotsu.mcp.workflow.cache import AsyncCache
+from jotsu.mcp.workflow.retry import CircuitBreakers, call_with_retry
+from .utils import (
+    get_messages, update_data_from_text, update_data_from_json, model_cache_key, deadline_kwargs, DeltaCounter
+)
 
 logger = logging.getLogger(__name__)
 
@@ -27,7 +31,10 @@ class AnthropicMixin:
 
     async def handle_anthropic(
             self, data: dict, *, action_id: str, workflow: Workflow, node: WorkflowAnthropicNode,
-            usage: typing.List[WorkflowModelUsage], **_kwargs
+            usage: typing.List[WorkflowModelUsage], servers: typing.Dict[str, WorkflowServer] | None = None,
+            delta: typing.Callable[..., None] | None = None, model_cache: AsyncCache | None = None,
+            circuit_breakers: CircuitBreakers | None = None, deadline: float | None = None,
+            artifacts: dict | None = None, **_kwargs
     ):
         from anthropic.types.beta.beta_message import BetaMessage
         from anthropic.types.beta.beta_tool_use_block import BetaToolUseBlock
@@ -36,12 +43,12 @@ class AnthropicMixin:
 
         client = self.anthropic_client
 
-        messages = get_messages(data, node.prompt)
+        messages = get_messages(data, node.prompt, artifacts)
 
         kwargs = {}
         system = data.get('system', node.system)
         if system:
-            content = utils.pybars_render(system, data)
+            content = utils.pybars_render(system, data, artifacts)
             kwargs['system'] = content
             data['system'] = content
         if node.use_json_schema or (node.use_json_schema is None and node.json_schema):
@@ -51,7 +58,8 @@ class AnthropicMixin:
             }
             kwargs['tools'] = [tool]
         if node.servers:
-            servers = {server.id: server for server in workflow.servers}
+            if servers is None:
+                servers = {server.id: server for server in workflow.servers}
 
             kwargs['mcp_servers'] = []
             kwargs['betas'] = ['mcp-client-2025-04-04']
@@ -68,15 +76,38 @@ class AnthropicMixin:
                 else:
                     logger.warning('MCP server not found: %s', server_id)
 
-        message: BetaMessage = await client.beta.messages.create(
-            max_tokens=node.max_tokens,
-            model=node.model,
-            messages=messages,
-            temperature=node.temperature,
-            **kwargs
-        )
-
-        usage.append(WorkflowModelUsage(ref_id=action_id, model=node.model, **message.usage.model_dump(mode='json')))
+        kwargs.update(max_tokens=node.max_tokens, model=node.model, messages=messages, temperature=node.temperature)
+        cache_key = model_cache_key(node, kwargs) if model_cache and node.cache else None
+        cached = await model_cache.get(cache_key) if cache_key else None
+        if cached is not None:
+            # Not streamed, the node ends with the output as usual.
+            message = BetaMessage.model_validate_json(cached)
+            usage.append(WorkflowModelUsage(ref_id=action_id, model=node.model, cached=True))
+        else:
+            streamed = DeltaCounter(delta) if node.stream and delta else None
+
+            async def request() -> BetaMessage:
+                if streamed:
+                    async with client.beta.messages.stream(**kwargs, **deadline_kwargs(deadline)) as stream:
+                        async for event in stream:
+                            if event.type == 'text':
+                                streamed(text=event.text)
+                            elif event.type == 'input_json':
+                                streamed(partial_json=event.partial_json)
+                        return await stream.get_final_message()
+                return await client.beta.messages.create(**kwargs, **deadline_kwargs(deadline))
+
+            message = await call_with_retry(
+                request, name='anthropic', retry=node.retry, deadline=deadline,
+                breaker=circuit_breakers.get('anthropic') if circuit_breakers else None,
+                retryable=lambda: not streamed or not streamed.count
+            )
+
+            usage.append(
+                WorkflowModelUsage(ref_id=action_id, model=node.model, **message.usage.model_dump(mode='json'))
+            )
+            if cache_key:
+                await model_cache.set(cache_key, message.model_dump_json(), expires_in=node.cache_ttl)
 
         if node.include_message_in_output:
             data.update(message.model_dump(mode='json'))
@@ -1,3 +1,4 @@
+import json
 import logging
 import os
 import typing
@@ -5,7 +6,11 @@ import typing
 from jotsu.mcp.types import WorkflowModelUsage
 from jotsu.mcp.types.models import WorkflowCloudflareNode
 from jotsu.mcp.workflow import utils
-from .utils import get_messages, update_data_from_json, update_data_from_text
+from jotsu.mcp.workflow.cache import AsyncCache
+from jotsu.mcp.workflow.retry import CircuitBreakers, call_with_retry
+from .utils import (
+    get_messages, update_data_from_json, update_data_from_text, model_cache_key, deadline_kwargs, DeltaCounter
+)
 
 logger = logging.getLogger(__name__)
 
@@ -28,18 +33,20 @@ class CloudflareMixin:
 
     async def handle_cloudflare(
             self, data: dict, *, action_id: str, node: WorkflowCloudflareNode,
-            usage: typing.List[WorkflowModelUsage], **_kwargs
+            usage: typing.List[WorkflowModelUsage], delta: typing.Callable[..., None] | None = None,
+            model_cache: AsyncCache | None = None, circuit_breakers: CircuitBreakers | None = None,
+            deadline: float | None = None, artifacts: dict | None = None, **_kwargs
     ):
         from cloudflare import AsyncCloudflare
 
         client: AsyncCloudflare = self.cloudflare_client
 
-        messages = get_messages(data, node.prompt)
+        messages = get_messages(data, node.prompt, artifacts)
 
         kwargs: dict = {}
         system = data.get('system', node.system)
         if system:
-            content = utils.pybars_render(system, data)
+            content = utils.pybars_render(system, data, artifacts)
             messages.insert(0, {
                 'role': 'system',
                 'content': content
@@ -52,21 +59,48 @@ class CloudflareMixin:
             }
             kwargs['response_format'] = response_format
 
-        res = await client.ai.run(
-            node.model,
-            account_id=os.environ.get('CLOUDFLARE_ACCOUNT_ID'),
-            max_tokens=node.max_tokens,
-            messages=messages,
-            temperature=node.temperature,
-        )
+        cache_key = model_cache_key(node, {
+            'model': node.model, 'max_tokens': node.max_tokens, 'messages': messages, 'temperature': node.temperature,
+            **kwargs
+        }) if model_cache and node.cache else None
+        cached = await model_cache.get(cache_key) if cache_key else None
+        if cached is not None:
+            # Not streamed, the node ends with the output as usual.
+            res = json.loads(cached)
+            usage.append(WorkflowModelUsage(ref_id=action_id, model=node.model, cached=True))
+        else:
+            streamed = DeltaCounter(delta) if node.stream and delta else None
+
+            async def request() -> dict:
+                if streamed:
+                    return await self._stream_cloudflare(
+                        client, node, messages=messages, delta=streamed, json_output='response_format' in kwargs,
+                        deadline=deadline
+                    )
+                return await client.ai.run(
+                    node.model,
+                    account_id=os.environ.get('CLOUDFLARE_ACCOUNT_ID'),
+                    max_tokens=node.max_tokens,
+                    messages=messages,
+                    temperature=node.temperature,
+                    **deadline_kwargs(deadline)
+                )
+
+            res = await call_with_retry(
+                request, name='cloudflare', retry=node.retry, deadline=deadline,
+                breaker=circuit_breakers.get('cloudflare') if circuit_breakers else None,
+                retryable=lambda: not streamed or not streamed.count
+            )
 
-        usage.append(
-            WorkflowModelUsage(
-                ref_id=action_id,
-                model=node.model,
-                **(typing.cast(dict, res.get('usage')))
+            usage.append(
+                WorkflowModelUsage(
+                    ref_id=action_id,
+                    model=node.model,
+                    **(typing.cast(dict, res.get('usage')))
+                )
             )
-        )
+            if cache_key:
+                await model_cache.set(cache_key, json.dumps(res), expires_in=node.cache_ttl)
 
         # Optionally include the whole response
         if node.include_message_in_output:
@@ -79,3 +113,38 @@ class CloudflareMixin:
             update_data_from_text(data, res.get('response'), node=node)
 
         return data
+
+    @staticmethod
+    async def _stream_cloudflare(
+            client, node: WorkflowCloudflareNode, *, messages: list, delta: typing.Callable[..., None],
+            json_output: bool, deadline: float | None = None
+    ) -> dict:
+        """ Run the model with server-sent events, returns the same dict as a complete response. """
+        field = 'partial_json' if json_output else 'text'
+        chunks: typing.List[str] = []
+        res: dict = {'usage': {}}
+
+        async with client.ai.with_streaming_response.run(
+            node.model,
+            account_id=os.environ.get('CLOUDFLARE_ACCOUNT_ID'),
+            max_tokens=node.max_tokens,
+            messages=messages,
+            temperature=node.temperature,
+            stream=True,
+            **deadline_kwargs(deadline)
+        ) as response:
+            async for line in response.iter_lines():
+                if not line.startswith('data:'):
+                    continue
+                line = line[5:].strip()
+                if line == '[DONE]':
+                    break
+                event = json.loads(line)
+                if event.get('response'):
+                    chunks.append(event['response'])
+                    delta(**{field: event['response']})
+                if event.get('usage'):
+                    res['usage'] = event['usage']
+
+        res['response'] = ''.join(chunks)
+        return res
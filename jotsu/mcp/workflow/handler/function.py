@@ -5,7 +5,11 @@ from .types import WorkflowHandlerResult
 
 class FunctionMixin:
 
-    # FIXME: add a time limit.
+    @staticmethod
+    def prepare_function(node: WorkflowFunctionNode) -> None:
+        utils.function_pool.compile(node.function)
+
+    # Functions run with the time limit of utils.function_pool.
     @staticmethod
     async def handle_function(
             data: dict, *, node: WorkflowFunctionNode, **_kwargs
@@ -1,10 +1,12 @@
 import logging
 import typing
+from contextlib import asynccontextmanager
 
 from jotsu.mcp.types.rules import Rule
-from jotsu.mcp.types.models import WorkflowRulesNode
+from jotsu.mcp.types.models import WorkflowRulesNode, RETRY_ON
 from jotsu.mcp.client.client import MCPClientSession
 
+from jotsu.mcp.workflow.retry import is_transient
 from jotsu.mcp.workflow.sessions import WorkflowSessionManager
 from .loop import LoopMixin
 from .script import ScriptMixin
@@ -39,8 +41,10 @@ class WorkflowHandler(
     def __init__(self, engine: 'WorkflowEngine'):
         self._engine = engine
 
-    async def _handle_rules(self, node: WorkflowRulesNode, data: dict) -> typing.AsyncIterator[WorkflowHandlerResult]:
-        value = jsonata_value(data, node.expr) if node.expr else data
+    async def _handle_rules(
+            self, node: WorkflowRulesNode, data: dict, artifacts: dict | None = None
+    ) -> typing.AsyncIterator[WorkflowHandlerResult]:
+        value = jsonata_value(data, node.expr, artifacts) if node.expr else data
         for i, edge in enumerate(node.edges):
             rule = self._get_rule(node.rules, i)
             if rule:
@@ -63,6 +67,21 @@ class WorkflowHandler(
             raise JotsuException(f'Session not found: {session_id}')
         return session
 
+    @asynccontextmanager
+    async def _session(
+            self, node: WorkflowMCPNode, *, sessions: WorkflowSessionManager,
+            retry_on: typing.Sequence[str] = RETRY_ON
+    ) -> typing.AsyncIterator[MCPClientSession]:
+        """ The session of the node, which isn't used again after a call fails with a transient error. """
+        session = await self._get_session(node, sessions=sessions)
+        try:
+            yield session
+        except Exception as e:
+            if is_transient(e, retry_on):
+                # The connection is likely broken, a retry (or the next run of a pool) gets a new session.
+                await sessions.discard(node.server_id if node.server_id else node.id)
+            raise
+
     @staticmethod
     def _update_json(data: dict, *, update: dict, member: str | None):
         if member:
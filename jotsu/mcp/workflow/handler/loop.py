@@ -3,7 +3,7 @@ from abc import ABC, abstractmethod
 
 from jotsu.mcp.types import WorkflowLoopNode, Rule
 from jotsu.mcp.workflow.handler.types import WorkflowHandlerResult
-from jotsu.mcp.workflow.handler.utils import jsonata_value
+from jotsu.mcp.workflow.handler.utils import jsonata_value, jsonata_artifacts
 
 
 class LoopMixin(ABC):
@@ -13,14 +13,18 @@ class LoopMixin(ABC):
     def _get_rule(rules: typing.List[Rule] | None, index: int):
         ...
 
+    @staticmethod
+    def prepare_loop(node: WorkflowLoopNode):
+        return jsonata_artifacts(node.expr)
+
     async def handle_loop(
-            self, data: dict, *, node: WorkflowLoopNode, **_kwargs
+            self, data: dict, *, node: WorkflowLoopNode, artifacts: dict | None = None, **_kwargs
     ) -> typing.AsyncIterator[WorkflowHandlerResult]:
 
         for i, edge in enumerate(node.edges):
             rule = self._get_rule(node.rules, i)
 
-            values = jsonata_value(data, node.expr)
+            values = jsonata_value(data, node.expr, artifacts)
             for value in values:
                 result = None
 
@@ -1,10 +1,14 @@
 import logging
 import typing
 
-from jotsu.mcp.types import WorkflowModelUsage
+from jotsu.mcp.types import JotsuException, WorkflowModelUsage
 from jotsu.mcp.types.models import WorkflowOpenAINode
 from jotsu.mcp.workflow import utils
-from .utils import get_messages, update_data_from_text, update_data_from_json
+from jotsu.mcp.workflow.cache import AsyncCache
+from jotsu.mcp.workflow.retry import CircuitBreakers, call_with_retry
+from .utils import (
+    get_messages, update_data_from_text, update_data_from_json, model_cache_key, deadline_kwargs, DeltaCounter
+)
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +20,19 @@ JSON_SCHEMA = {
 }
 
 
+class ResponseFailedError(JotsuException):
+    """ OpenAI reported the response as failed, e.g. with a server error.  Transient by default. """
+
+
+def _check_response(response):
+    if response.status == 'failed':
+        error = response.error
+        raise ResponseFailedError(
+            f'The response failed: {error.code}: {error.message}' if error else 'The response failed.'
+        )
+    return response
+
+
 class OpenAIMixin:
 
     @property
@@ -27,19 +44,21 @@ class OpenAIMixin:
 
     async def handle_openai(
             self, data: dict, *, action_id: str, node: WorkflowOpenAINode,
-            usage: typing.List[WorkflowModelUsage], **_kwargs
+            usage: typing.List[WorkflowModelUsage], delta: typing.Callable[..., None] | None = None,
+            model_cache: AsyncCache | None = None, circuit_breakers: CircuitBreakers | None = None,
+            deadline: float | None = None, artifacts: dict | None = None, **_kwargs
     ):
         from openai import AsyncOpenAI
         from openai.types.responses import ResponseUsage, Response
 
         client: AsyncOpenAI = self.openai_client
 
-        messages = get_messages(data, node.prompt)
+        messages = get_messages(data, node.prompt, artifacts)
 
         kwargs: dict = {}
         system = data.get('system', node.system)
         if system:
-            content = utils.pybars_render(system, data)
+            content = utils.pybars_render(system, data, artifacts)
             # Responses API uses system messages instead of explicit kwarg
             messages.insert(0, {
                 'role': 'system',
@@ -58,22 +77,54 @@ class OpenAIMixin:
                 }
                 kwargs['text'] = text
 
-        response: Response = await client.responses.create(
+        kwargs.update(
             model=node.model,
             input=messages,  # Responses API uses 'input' instead of 'messages'
             max_output_tokens=node.max_tokens,
             temperature=node.temperature,
-            **kwargs
         )
+        cache_key = model_cache_key(node, kwargs) if model_cache and node.cache else None
+        cached = await model_cache.get(cache_key) if cache_key else None
+        if cached is not None:
+            # Not streamed, the node ends with the output as usual.
+            response = Response.model_validate_json(cached)
+            usage.append(WorkflowModelUsage(ref_id=action_id, model=node.model, cached=True))
+        else:
+            streamed = DeltaCounter(delta) if node.stream and delta else None
+
+            async def request() -> Response:
+                if not streamed:
+                    return _check_response(await client.responses.create(**kwargs, **deadline_kwargs(deadline)))
+
+                # The output is JSON text when there is a schema.
+                field = 'partial_json' if 'text' in kwargs else 'text'
+                result: Response | None = None
+                async for event in await client.responses.create(stream=True, **kwargs, **deadline_kwargs(deadline)):
+                    if event.type == 'response.output_text.delta':
+                        streamed(**{field: event.delta})
+                    elif event.type in ('response.completed', 'response.incomplete', 'response.failed'):
+                        result = event.response
+                if result is None:
+                    raise JotsuException('The response stream ended without a response.')
+                return _check_response(result)
+
+            response = await call_with_retry(
+                request, name='openai', retry=node.retry, deadline=deadline,
+                breaker=circuit_breakers.get('openai') if circuit_breakers else None,
+                retryable=lambda: not streamed or not streamed.count
+            )
 
-        if response.usage:
-            usage.append(
-                WorkflowModelUsage(
-                    ref_id=action_id,
-                    model=node.model,
-                    **typing.cast(ResponseUsage, response.usage).model_dump(mode='json')
+            if response.usage:
+                usage.append(
+                    WorkflowModelUsage(
+                        ref_id=action_id,
+                        model=node.model,
+                        **typing.cast(ResponseUsage, response.usage).model_dump(mode='json')
+                    )
                 )
-            )
+            # Not a response which ran out of tokens or was cut short otherwise.
+            if cache_key and response.status == 'completed':
+                await model_cache.set(cache_key, response.model_dump_json(), expires_in=node.cache_ttl)
 
         # Optionally include the whole response
         if node.include_message_in_output:
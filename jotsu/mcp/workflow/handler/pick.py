@@ -5,9 +5,13 @@ from . import utils
 class PickMixin:
 
     @staticmethod
-    async def handle_pick(data: dict, *, node: WorkflowPickNode, **_kwargs):
+    def prepare_pick(node: WorkflowPickNode):
+        return utils.jsonata_artifacts(*node.expressions.values())
+
+    @staticmethod
+    async def handle_pick(data: dict, *, node: WorkflowPickNode, artifacts: dict | None = None, **_kwargs):
         result = {}
         for key, expr in node.expressions.items():
-            value = utils.jsonata_value(data, expr)
+            value = utils.jsonata_value(data, expr, artifacts)
             result[key] = value
         return result
@@ -1,4 +1,5 @@
 import logging
+import typing
 from abc import ABC, abstractmethod
 
 from mcp.types import GetPromptResult
@@ -12,7 +13,7 @@ logger = logging.getLogger(__name__)
 
 class PromptMixin(ABC):
     @abstractmethod
-    async def _get_session(self, *args, **kwargs) -> MCPClientSession:
+    def _session(self, *args, **kwargs) -> typing.AsyncContextManager[MCPClientSession]:
         ...
 
     @abstractmethod
@@ -23,10 +24,8 @@ class PromptMixin(ABC):
             self, data: dict, *,
             node: WorkflowMCPNode, sessions: WorkflowSessionManager, **_kwargs
     ):
-
-        session = await self._get_session(node, sessions=sessions)
-
-        result: GetPromptResult = await session.get_prompt(node.name, arguments=data)
+        async with self._session(node, sessions=sessions) as session:
+            result: GetPromptResult = await session.get_prompt(node.name, arguments=data)
         for message in result.messages:
             message_type = message.content.type
             if message_type == 'text':
@@ -1,5 +1,6 @@
 import json
 import logging
+import typing
 from abc import ABC, abstractmethod
 
 from mcp.types import ReadResourceResult
@@ -13,7 +14,7 @@ logger = logging.getLogger(__name__)
 
 class ResourceMixin(ABC):
     @abstractmethod
-    async def _get_session(self, *args, **kwargs) -> MCPClientSession:
+    def _session(self, *args, **kwargs) -> typing.AsyncContextManager[MCPClientSession]:
         ...
 
     @abstractmethod
@@ -28,10 +29,9 @@ class ResourceMixin(ABC):
             self, data: dict, *,
             node: WorkflowMCPNode, sessions: WorkflowSessionManager, **_kwargs
     ):
-        session = await self._get_session(node, sessions=sessions)
         uri = str(node.uri)
-
-        result: ReadResourceResult = await session.read_resource(node.uri)
+        async with self._session(node, sessions=sessions) as session:
+            result: ReadResourceResult = await session.read_resource(node.uri)
         for contents in result.contents:
             mime_type = contents.mimeType or ''
             match mime_type:
@@ -5,7 +5,11 @@ from .types import WorkflowHandlerResult
 
 class ScriptMixin:
 
-    # FIXME: add a time limit.
+    @staticmethod
+    def prepare_script(node: WorkflowScriptNode) -> None:
+        utils.script_pool.compile(node.script)
+
+    # Scripts run with the time and memory limits of utils.script_pool.
     @staticmethod
     async def handle_script(
             data: dict, *, node: WorkflowScriptNode, **_kwargs
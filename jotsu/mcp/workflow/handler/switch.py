@@ -3,16 +3,23 @@ from abc import ABC, abstractmethod
 
 from jotsu.mcp.types.models import WorkflowRulesNode, WorkflowSwitchNode
 from jotsu.mcp.workflow.handler.types import WorkflowHandlerResult
+from jotsu.mcp.workflow.handler.utils import jsonata_artifacts
 
 
 class SwitchMixin(ABC):
 
     @abstractmethod
-    async def _handle_rules(self, node: WorkflowRulesNode, data: dict) -> typing.AsyncIterator[WorkflowHandlerResult]:
+    async def _handle_rules(
+            self, node: WorkflowRulesNode, data: dict, artifacts: dict | None = None
+    ) -> typing.AsyncIterator[WorkflowHandlerResult]:
         yield WorkflowHandlerResult(edge='', data=None)  # pragma: no cover
 
+    @staticmethod
+    def prepare_switch(node: WorkflowSwitchNode):
+        return jsonata_artifacts(node.expr)
+
     async def handle_switch(
-            self, data: dict, *, node: WorkflowSwitchNode, **_kwargs
+            self, data: dict, *, node: WorkflowSwitchNode, artifacts: dict | None = None, **_kwargs
     ) -> typing.AsyncIterator[WorkflowHandlerResult]:
-        async for result in self._handle_rules(node, data):
+        async for result in self._handle_rules(node, data, artifacts):
             yield result
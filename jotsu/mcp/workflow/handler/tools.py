@@ -1,4 +1,4 @@
-import copy
+import datetime
 import json
 import logging
 import typing
@@ -8,8 +8,13 @@ import jsonschema
 from mcp.types import CallToolResult, Tool
 
 from jotsu.mcp.client.client import MCPClientSession
-from jotsu.mcp.types import JotsuException, WorkflowToolNode
+from jotsu.mcp.types import JotsuException, WorkflowToolNode, WorkflowServer
+from jotsu.mcp.types.models import RETRY_ON
+from jotsu.mcp.workflow import utils
+from jotsu.mcp.workflow.cache import AsyncCache, cache_key
 from jotsu.mcp.workflow.handler.types import WorkflowHandlerResult
+from jotsu.mcp.workflow.handler.utils import remaining
+from jotsu.mcp.workflow.retry import CircuitBreakers, call_with_retry
 from jotsu.mcp.workflow.sessions import WorkflowSessionManager
 
 logger = logging.getLogger(__name__)
@@ -17,7 +22,7 @@ logger = logging.getLogger(__name__)
 
 class ToolMixin(ABC):
     @abstractmethod
-    async def _get_session(self, *args, **kwargs) -> MCPClientSession:
+    def _session(self, *args, **kwargs) -> typing.AsyncContextManager[MCPClientSession]:
         ...
 
     @abstractmethod
@@ -30,34 +35,105 @@ class ToolMixin(ABC):
 
     @staticmethod
     async def get_tool(session: MCPClientSession, name: str) -> Tool | None:
-        res = await session.list_tools()
-        for tool in res.tools:
-            if tool.name == name:
-                return tool
-        return None
+        # The session keeps the tool list from load(), refreshed when the server says it changed.
+        return await session.find_tool(name)
+
+    @staticmethod
+    def _cacheable(node: WorkflowToolNode, tool: Tool) -> bool:
+        if node.cache is not None:
+            return node.cache
+        annotations = tool.annotations
+        return bool(annotations and (annotations.readOnlyHint or annotations.idempotentHint))
+
+    @staticmethod
+    def _tool_cache_key(
+            node: WorkflowToolNode, tool_name: str, arguments: dict, *,
+            servers: typing.Dict[str, WorkflowServer] | None
+    ) -> str:
+        # The same server id may point to different servers (or users) in different workflows.
+        session_id = node.server_id if node.server_id else node.id
+        server = servers.get(session_id) if servers else None
+        url, headers = (server.url, server.headers) if server else (node.url, node.headers)
+        return cache_key('tool', {
+            'server': session_id, 'url': str(url), 'headers': headers, 'tool': tool_name, 'arguments': arguments
+        })
+
+    @staticmethod
+    def _tool_server(
+            node: WorkflowToolNode, *, servers: typing.Dict[str, WorkflowServer] | None
+    ) -> typing.Tuple[str, WorkflowServer | None]:
+        """ The key of the server's circuit breaker, its URL since the engine shares breakers between workflows,
+        and the server if the node uses one.
+        """
+        session_id = node.server_id if node.server_id else node.id
+        server = servers.get(session_id) if servers else None
+        url = server.url if server else node.url
+        return str(url) if url else session_id, server
+
+    async def _call_tool(
+            self, session: MCPClientSession, node: WorkflowToolNode, tool: Tool, tool_name: str, arguments: dict, *,
+            tool_cache: AsyncCache | None, servers: typing.Dict[str, WorkflowServer] | None,
+            deadline: float | None = None
+    ) -> CallToolResult:
+        key = None
+        if tool_cache and self._cacheable(node, tool):
+            key = self._tool_cache_key(node, tool_name, arguments, servers=servers)
+            cached = await tool_cache.get(key)
+            if cached is not None:
+                return CallToolResult.model_validate_json(cached)
+
+        timeout = remaining(deadline)
+        result: CallToolResult = await session.call_tool(
+            tool_name, arguments=arguments,
+            read_timeout_seconds=datetime.timedelta(seconds=timeout) if timeout is not None else None
+        )
+        if key and not result.isError:
+            await tool_cache.set(key, result.model_dump_json(), expires_in=node.cache_ttl)
+        return result
 
     async def _handle_tool(
             self, data: dict, *,
-            node: WorkflowToolNode, sessions: WorkflowSessionManager, **_kwargs
+            node: WorkflowToolNode, sessions: WorkflowSessionManager,
+            tool_cache: AsyncCache | None = None, servers: typing.Dict[str, WorkflowServer] | None = None,
+            circuit_breakers: CircuitBreakers | None = None, deadline: float | None = None, **_kwargs
     ):
-        session = await self._get_session(node, sessions=sessions)
         tool_name = node.tool_name if node.tool_name else node.name
-
-        tool = await self.get_tool(session, tool_name)
-        if not tool:
-            raise JotsuException(f'MCP Tool not found: {tool_name}')
-
-        self._validate_schema(tool, data)
-
-        # tools likely only use the top-level properties
-        arguments = {}
-        for prop in tool.inputSchema.get('properties', []):
-            if prop in data:
-                arguments[prop] = data[prop]
-            elif prop == 'kwargs':
-                arguments['kwargs'] = data
-
-        result: CallToolResult = await session.call_tool(tool_name, arguments=arguments)
+        called = False
+
+        key, server = self._tool_server(node, servers=servers)
+        retry = node.retry or (server.retry if server else None)
+        retry_on = retry.retry_on if retry else RETRY_ON
+
+        async def attempt() -> CallToolResult:
+            nonlocal called
+            called = False
+            async with self._session(node, sessions=sessions, retry_on=retry_on) as session:
+                tool = await self.get_tool(session, tool_name)
+                if not tool:
+                    raise JotsuException(f'MCP Tool not found: {tool_name}')
+
+                self._validate_schema(tool, data)
+
+                # tools likely only use the top-level properties
+                arguments = {}
+                for prop in tool.inputSchema.get('properties', []):
+                    if prop in data:
+                        arguments[prop] = data[prop]
+                    elif prop == 'kwargs':
+                        arguments['kwargs'] = data
+
+                called = True
+                return await self._call_tool(
+                    session, node, tool, tool_name, arguments, tool_cache=tool_cache, servers=servers,
+                    deadline=deadline
+                )
+
+        # Connecting is retried too, the session manager doesn't keep a failed session, or one whose
+        # call failed with a transient error.
+        breaker = circuit_breakers.get(key, server.circuit_breaker if server else None) if circuit_breakers else None
+        result = await call_with_retry(
+            attempt, name=key, retry=retry, breaker=breaker, deadline=deadline, responded=lambda: called
+        )
         if result.isError:
             raise JotsuException(f"Error calling tool '{tool_name}': {result.content[0].text}.")
 
@@ -100,9 +176,7 @@ class ToolMixin(ABC):
 
     # kwargs is a convention meaning 'all data' - so we have to exclude it.
     @staticmethod
-    def _validate_schema(tool: Tool, data: dict):
-        input_schema = copy.deepcopy(tool.inputSchema)
-
+    def _input_schema(input_schema: dict) -> dict:
         properties = input_schema.get('properties', {})
         properties.pop('kwargs', None)
         input_schema['properties'] = properties
@@ -111,8 +185,11 @@ class ToolMixin(ABC):
         input_schema['required'] = [r for r in required if r != 'kwargs']
 
         input_schema['additionalProperties'] = True
+        return input_schema
 
+    @classmethod
+    def _validate_schema(cls, tool: Tool, data: dict):
         try:
-            jsonschema.validate(instance=data, schema=input_schema)
+            utils.json_schema_validate(data, tool.inputSchema, prepare=cls._input_schema)
         except jsonschema.ValidationError as e:
             raise JotsuException(e)
@@ -5,22 +5,31 @@ from jotsu.mcp.types.models import WorkflowTransformNode, WorkflowTransform, Wor
 from jotsu.mcp.workflow.handler.types import WorkflowHandlerResult
 
 from jotsu.mcp.workflow import utils
-from .utils import jsonata_value
+from .utils import jsonata_value, jsonata_artifacts
 
 
 class TransformMixin(ABC):
 
     @abstractmethod
-    async def _handle_rules(self, node: WorkflowRulesNode, data: dict) -> typing.AsyncIterator[WorkflowHandlerResult]:
+    async def _handle_rules(
+            self, node: WorkflowRulesNode, data: dict, artifacts: dict | None = None
+    ) -> typing.AsyncIterator[WorkflowHandlerResult]:
         yield WorkflowHandlerResult(edge='', data=None)  # pragma: no cover
 
+    @staticmethod
+    def prepare_transform(node: WorkflowTransformNode):
+        return jsonata_artifacts(*[
+            (WorkflowTransform(**transform) if isinstance(transform, dict) else transform).source
+            for transform in node.transforms
+        ], node.expr)
+
     async def handle_transform(
-            self, data: dict, *, node: WorkflowTransformNode, **_kwargs
+            self, data: dict, *, node: WorkflowTransformNode, artifacts: dict | None = None, **_kwargs
     ) -> typing.AsyncIterator[WorkflowHandlerResult]:
         for transform in node.transforms:
             transform = WorkflowTransform(**transform) if isinstance(transform, dict) else transform
             source_value = utils.transform_cast(
-                jsonata_value(data, transform.source), datatype=transform.datatype
+                jsonata_value(data, transform.source, artifacts), datatype=transform.datatype
             )
 
             match transform.type:
@@ -32,5 +41,5 @@ class TransformMixin(ABC):
                 case 'delete':
                     utils.path_delete(data, path=transform.source)
 
-        async for result in self._handle_rules(node, data):
+        async for result in self._handle_rules(node, data, artifacts):
             yield result
@@ -1,6 +1,24 @@
+import typing
+
 import pydantic
 
+from jotsu.mcp.workflow.data import CowDict
+
+
+def _snapshot(value, handler):
+    # Each result gets its own (top-level) copy, as validating a dict does, but shares everything else.
+    if isinstance(value, CowDict):
+        return value.snapshot()
+    return CowDict(value) if isinstance(value, dict) else handler(value)
+
 
 class WorkflowHandlerResult(pydantic.BaseModel):
     edge: str
-    data: dict
+    data: typing.Annotated[dict, pydantic.WrapValidator(_snapshot)]
+
+
+class WorkflowHandlerDelta(pydantic.BaseModel):
+    """ Output of a handler as it arrives, e.g. text from a model. """
+    text: str | None = None
+    # Part of the JSON text of structured output.
+    partial_json: str | None = None
@@ -1,22 +1,57 @@
+import asyncio
 import inspect
 import json
+import typing
 from datetime import datetime, timezone
 from zoneinfo import ZoneInfo
 
 import jsonata
 
 from jotsu.mcp.types.models import WorkflowModelNode
+from jotsu.mcp.workflow.cache import LRUCache, cache_key
 from jotsu.mcp.workflow.utils import pybars_render
 
+# Compiled JSONata expressions keyed by the expression text, use resize() to tune per worker.
+jsonata_cache = LRUCache(maxsize=512)
 
-def get_messages(data: dict, prompt: str):
+
+def model_cache_key(node: WorkflowModelNode, request: dict) -> str:
+    """ Model cache key for the request as sent to the provider, i.e. with rendered messages and system. """
+    return cache_key(f'model:{node.type}', request)
+
+
+def remaining(deadline: float | None) -> float | None:
+    """ Seconds until the deadline (event loop time) passed to a handler, if any. """
+    if deadline is None:
+        return None
+    return max(deadline - asyncio.get_running_loop().time(), 0.0)
+
+
+def deadline_kwargs(deadline: float | None) -> dict:
+    """ The timeout argument of model provider requests, empty without a deadline so the client default applies. """
+    return {} if deadline is None else {'timeout': remaining(deadline)}
+
+
+class DeltaCounter:
+    """ Passes output on to delta() and counts it, a streamed request can only be retried before any arrived. """
+
+    def __init__(self, delta: typing.Callable[..., None]):
+        self._delta = delta
+        self.count = 0
+
+    def __call__(self, **fields) -> None:
+        self.count += 1
+        self._delta(**fields)
+
+
+def get_messages(data: dict, prompt: str, artifacts: typing.Dict[str, typing.Any] | None = None):
     messages = data.get('messages', None)
     if messages is None:
         messages = []
 
         # Don't use prompt from the messages, it can be constructed if needed using a template.
         if prompt:
-            content = pybars_render(prompt, data)
+            content = pybars_render(prompt, data, artifacts)
             messages.append({
                 'role': 'user',
                 'content': content
@@ -88,15 +123,36 @@ def now_utc() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
-def jsonata_value(data: dict, expr: str):
-    expr = jsonata.Jsonata(expr)
+def jsonata_compile(expr: str) -> jsonata.Jsonata:
+    compiled = jsonata_cache.get(expr)
+    if compiled is None:
+        compiled = jsonata.Jsonata(expr)
+
+        # The Python implementation doesn't contain the Eval functions, including $parse.
+        compiled.register_lambda('parse', lambda x: json.loads(x))
+
+        # Datetime helpers
+        compiled.register_lambda('parse_utc', lambda x: parse_utc(x))
+        compiled.register_lambda('to_tz', lambda x, y: to_tz(x, y))
+        compiled.register_lambda('now_utc', lambda: now_utc())
+
+        jsonata_cache.set(expr, compiled)
+    return compiled
+
+
+def jsonata_artifacts(*exprs: str | None) -> typing.Dict[str, jsonata.Jsonata]:
+    """ The compiled expressions keyed by their text, returned by prepare_{type} hooks. """
+    return {expr: jsonata_compile(expr) for expr in exprs if expr}
+
 
-    # The Python implementation doesn't contain the Eval functions, including $parse.
-    expr.register_lambda('parse', lambda x: json.loads(x))
+def jsonata_value(data: dict, expr: str, artifacts: typing.Dict[str, typing.Any] | None = None):
+    # Compiled with the plan, or taken from the cache, e.g. when a handler is called directly.
+    compiled = artifacts.get(expr) if artifacts else None
+    if compiled is None:
+        compiled = jsonata_compile(expr)
 
-    # Datetime helpers
-    expr.register_lambda('parse_utc', lambda x: parse_utc(x))
-    expr.register_lambda('to_tz', lambda x, y: to_tz(x, y))
-    expr.register_lambda('now_utc', lambda: now_utc())
+    # Built-ins like $now() read the active instance from a thread-local, normally set by the constructor.
+    jsonata.Jsonata.CURRENT.jsonata = compiled
 
-    return expr.evaluate(data)
+    # Evaluate in a fresh frame so the cached instance doesn't keep a reference to the data.
+    return compiled.evaluate(data, jsonata.Jsonata.Frame(None))
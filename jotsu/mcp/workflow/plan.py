@@ -0,0 +1,127 @@
+import logging
+import typing
+
+from jotsu.mcp.types import JotsuException, Workflow, WorkflowServer, WorkflowNode, WorkflowConcurrency
+from jotsu.mcp.types.models import WorkflowModelNode
+
+from . import utils
+from .handler.utils import is_async_generator
+from .sessions import node_server
+
+if typing.TYPE_CHECKING:
+    from .handler import WorkflowHandler  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+
+class CompiledNode:
+    """ A workflow node with its handler and edge targets resolved ahead of time. """
+    __slots__ = (
+        'node', 'handler', 'is_async_generator', 'edges', 'end_node_id', 'end_node', 'artifacts', 'concurrency',
+        'ref'
+    )
+
+    def __init__(
+            self, node: WorkflowNode, *, handler: typing.Callable | None,
+            artifacts: typing.Dict[str, typing.Any] | None = None, concurrency: WorkflowConcurrency | None = None
+    ):
+        self.node = node
+        self.handler = handler
+        self.is_async_generator = is_async_generator(handler) if handler else False
+        self.edges: typing.List[CompiledNode | None] = []
+        self.end_node_id: str | None = getattr(node, 'end_node_id', None)
+        self.end_node: CompiledNode | None = None
+        # Parsed expressions and compiled templates keyed by their source, passed to the handler.
+        self.artifacts = artifacts or {}
+        # Set when the branches of this node run as concurrent tasks.
+        self.concurrency = concurrency
+        # Reference to the node in actions, created by the engine on first use.
+        self.ref = None
+
+    @property
+    def id(self) -> str:
+        return self.node.id
+
+    def targets(self) -> typing.Iterator['CompiledNode']:
+        for edge, target in zip(self.node.edges, self.edges):
+            if target is None:
+                raise JotsuException(f'Node not found: {edge}')
+            yield target
+
+    def end_target(self) -> typing.Optional['CompiledNode']:
+        """ The node to run after all edges complete, e.g. after a loop. """
+        if self.end_node_id and self.end_node is None:
+            raise JotsuException(f'Node not found: {self.end_node_id}')
+        return self.end_node
+
+
+class CompiledWorkflow:
+    """ Executable plan for a workflow, built once when the workflow is registered.
+    With precompile_templates, the prompt and system templates of model nodes are compiled here
+    and syntax errors are raised instead of surfacing when the node runs.
+    """
+
+    def __init__(self, workflow: Workflow, *, handler: 'WorkflowHandler', precompile_templates: bool = False):
+        self.workflow = workflow
+        templates = {node.id: self._compile_templates(node) for node in workflow.nodes} if precompile_templates else {}
+
+        self.servers: typing.Dict[str, WorkflowServer] = {server.id: server for server in workflow.servers}
+        for node in workflow.nodes:
+            # MCP nodes with their own URL, the node id is the session id.
+            if getattr(node, 'url', None) and node.id not in self.servers:
+                self.servers[node.id] = node_server(node)
+        self.nodes: typing.Dict[str, CompiledNode] = {
+            node.id: self._compile_node(node, workflow=workflow, handler=handler, templates=templates.get(node.id))
+            for node in workflow.nodes
+        }
+
+        for compiled in self.nodes.values():
+            compiled.edges = [self.nodes.get(edge) if edge else None for edge in compiled.node.edges]
+            compiled.end_node = self.nodes.get(compiled.end_node_id) if compiled.end_node_id else None
+
+        start_node_id = workflow.start_node_id
+        if not start_node_id:
+            start_node_id = workflow.nodes[0].id if len(workflow.nodes) else None
+        self.start_node = self.nodes.get(start_node_id) if start_node_id else None
+
+    def get_node(self, node_id: str) -> CompiledNode:
+        node = self.nodes.get(node_id)
+        if node is None:
+            raise JotsuException(f'Node not found: {node_id}')
+        return node
+
+    @staticmethod
+    def _compile_templates(node: WorkflowNode) -> typing.Dict[str, typing.Any]:
+        templates = {}
+        if isinstance(node, WorkflowModelNode):
+            for source in (node.prompt, node.system):
+                if source:
+                    try:
+                        templates[source] = utils.pybars_template(source)
+                    except Exception as e:
+                        raise JotsuException(f"Invalid template in node '{node.id}': {str(e)}") from e
+        return templates
+
+    @staticmethod
+    def _compile_node(
+            node: WorkflowNode, *, workflow: Workflow, handler: 'WorkflowHandler',
+            templates: typing.Dict[str, typing.Any] | None = None
+    ) -> CompiledNode:
+        # The prepare_{type} hook of the handler parses expressions, scripts, etc. ahead of time, so that
+        # the first run doesn't pay for it.  What it returns is kept as the artifacts of the node.
+        artifacts = dict(templates or {})
+        prepare = getattr(handler, f'prepare_{node.type}', None)
+        if prepare:
+            try:
+                artifacts.update(prepare(node) or {})
+            except Exception as e:  # noqa
+                # Not fatal here, the same error is reported as a node error when the node runs.
+                logger.warning("Could not prepare node '%s': %s", node.id, str(e))
+
+        # The workflow setting only applies where there is more than one branch.
+        concurrency = node.concurrency or (workflow.concurrency if len(node.edges) > 1 else None)
+
+        return CompiledNode(
+            node, handler=getattr(handler, f'handle_{node.type}', None), artifacts=artifacts,
+            concurrency=concurrency
+        )
@@ -0,0 +1,207 @@
+import asyncio
+import logging
+import time
+import typing
+
+from jotsu.mcp.client import MCPClient
+from jotsu.mcp.client.client import MCPClientSession
+from jotsu.mcp.types import WorkflowServer
+
+logger = logging.getLogger(__name__)
+
+PoolKey = typing.Tuple[str, str, typing.Tuple[typing.Tuple[str, str], ...], str | None]
+
+
+class _PooledSession:
+    __slots__ = ('session', 'task', 'closing', 'in_use', 'idle_since')
+
+    def __init__(self, session: MCPClientSession, *, task: asyncio.Task, closing: asyncio.Event):
+        self.session = session
+        # The task which entered the session context, it also exits it when 'closing' is set.
+        self.task = task
+        self.closing = closing
+        self.in_use = False
+        self.idle_since = time.monotonic()
+
+    @property
+    def alive(self) -> bool:
+        return not self.task.done() and not self.closing.is_set()
+
+
+class WorkflowSessionPool:
+    """
+    MCP sessions shared across workflow runs, keyed by server id, URL and credentials.
+    Each session is entered and exited by its own task so that any run can borrow it,
+    a session is only used by one run at a time.
+    """
+    def __init__(
+            self, client: MCPClient, *,
+            max_sessions: int = 4, idle_timeout: float | None = 300, health_check_interval: float | None = 30,
+            ping_timeout: float = 5
+    ):
+        self._client = client
+        self._max_sessions = max_sessions
+        self._idle_timeout = idle_timeout
+        # Idle sessions older than this are pinged before being handed out.
+        self._health_check_interval = health_check_interval
+        self._ping_timeout = ping_timeout
+
+        self._entries: typing.Dict[PoolKey, typing.List[_PooledSession]] = {}
+        self._conditions: typing.Dict[PoolKey, asyncio.Condition] = {}
+        # Sessions being connected per key, they count towards max_sessions.
+        self._opening: typing.Dict[PoolKey, int] = {}
+        self._borrowed: typing.Dict[int, typing.Tuple[PoolKey, _PooledSession]] = {}
+        self._reaper: asyncio.Task | None = None
+        self._closed = False
+
+    @property
+    def client(self) -> MCPClient:
+        return self._client
+
+    @staticmethod
+    def key(server: WorkflowServer) -> PoolKey:
+        client_id = server.client_info.client_id if server.client_info else None
+        return server.id, str(server.url), tuple(sorted(server.headers.items())), client_id
+
+    async def acquire(self, server: WorkflowServer) -> MCPClientSession:
+        """ Borrow a session for the server, waiting if the server has max_sessions in use. """
+        if self._closed:
+            raise RuntimeError('WorkflowSessionPool is closed')
+
+        if self._reaper is None and self._idle_timeout:
+            self._reaper = asyncio.create_task(self._reap())
+
+        key = self.key(server)
+        condition = self._conditions.setdefault(key, asyncio.Condition())
+        while True:
+            # Only the bookkeeping holds the condition, other borrowers don't wait for a connect or ping.
+            async with condition:
+                while True:
+                    entries = await self._evict(key)
+                    entry = next((x for x in entries if not x.in_use), None)
+                    if entry is not None:
+                        entry.in_use = True
+                        break
+                    if len(entries) + self._opening.get(key, 0) < self._max_sessions:
+                        # Reserve the slot of the new session.
+                        self._opening[key] = self._opening.get(key, 0) + 1
+                        break
+                    await condition.wait()
+
+            if entry is None:
+                return await self._connect(key, server, condition)
+            if await self._healthy(entry):
+                return self._borrow(key, entry)
+            async with condition:
+                await self._discard(key, entry)
+                condition.notify()
+
+    async def release(self, session: MCPClientSession, *, discard: bool = False) -> None:
+        """ Return a borrowed session, use discard if the session should not be used again. """
+        key, entry = self._borrowed.pop(id(session), (None, None))
+        if entry is None:
+            return
+
+        condition = self._conditions[key]
+        async with condition:
+            entry.in_use = False
+            entry.idle_since = time.monotonic()
+            if discard or self._closed:
+                await self._discard(key, entry)
+            condition.notify()
+
+    async def aclose(self) -> None:
+        """ Close every session, including borrowed ones. """
+        if self._closed:
+            return
+        self._closed = True
+
+        if self._reaper:
+            self._reaper.cancel()
+            await asyncio.gather(self._reaper, return_exceptions=True)
+
+        for key in list(self._entries):
+            for entry in self._entries.pop(key):
+                await self._close(entry)
+        self._borrowed.clear()
+
+    async def _connect(self, key: PoolKey, server: WorkflowServer, condition: asyncio.Condition) -> MCPClientSession:
+        try:
+            entry = await self._open(server)
+        except BaseException:
+            async with condition:
+                self._opening[key] -= 1
+                condition.notify()
+            raise
+
+        async with condition:
+            self._opening[key] -= 1
+            if self._closed:
+                await self._close(entry)
+                raise RuntimeError('WorkflowSessionPool is closed')
+            entry.in_use = True
+            self._entries.setdefault(key, []).append(entry)
+            return self._borrow(key, entry)
+
+    def _borrow(self, key: PoolKey, entry: _PooledSession) -> MCPClientSession:
+        self._borrowed[id(entry.session)] = (key, entry)
+        return entry.session
+
+    async def _open(self, server: WorkflowServer) -> _PooledSession:
+        ready: asyncio.Future = asyncio.get_running_loop().create_future()
+        closing = asyncio.Event()
+
+        async def hold():
+            try:
+                async with self._client.session(server) as session:
+                    await session.load()
+                    ready.set_result(session)
+                    await closing.wait()
+            except Exception as e:  # noqa
+                if not ready.done():
+                    ready.set_exception(e)
+                else:
+                    logger.warning("MCP session for server '%s' failed: %s", server.id, str(e))
+
+        task = asyncio.create_task(hold())
+        session = await ready
+        return _PooledSession(session, task=task, closing=closing)
+
+    async def _healthy(self, entry: _PooledSession) -> bool:
+        # Dead sessions were already evicted.
+        if self._health_check_interval is None or time.monotonic() - entry.idle_since < self._health_check_interval:
+            return True
+        try:
+            await asyncio.wait_for(entry.session.send_ping(), timeout=self._ping_timeout)
+        except Exception as e:  # noqa
+            logger.info('MCP session failed the health check: %s', str(e))
+            return False
+        return True
+
+    async def _evict(self, key: PoolKey) -> typing.List[_PooledSession]:
+        """ Remove dead sessions and ones idle for too long, returns the remaining entries. """
+        now = time.monotonic()
+        for entry in list(self._entries.get(key, [])):
+            if entry.in_use:
+                continue
+            if not entry.alive or (self._idle_timeout is not None and now - entry.idle_since >= self._idle_timeout):
+                await self._discard(key, entry)
+        return self._entries.get(key, [])
+
+    async def _discard(self, key: PoolKey, entry: _PooledSession) -> None:
+        entries = self._entries.get(key, [])
+        if entry in entries:
+            entries.remove(entry)
+        await self._close(entry)
+
+    @staticmethod
+    async def _close(entry: _PooledSession) -> None:
+        entry.closing.set()
+        await asyncio.gather(entry.task, return_exceptions=True)
+
+    async def _reap(self):
+        while True:
+            await asyncio.sleep(self._idle_timeout / 2)
+            for key, condition in list(self._conditions.items()):
+                async with condition:
+                    await self._evict(key)
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import random
+import typing
+from time import monotonic
+
+from jotsu.mcp.types import JotsuException
+from jotsu.mcp.types.models import WorkflowRetry, WorkflowCircuitBreaker, RETRY_ON
+
+logger = logging.getLogger(__name__)
+
+T = typing.TypeVar('T')
+
+
+class CircuitOpenError(JotsuException):
+    """ Raised instead of calling a server whose circuit breaker is open. """
+
+
+def is_transient(e: BaseException, retry_on: typing.Sequence[str] = RETRY_ON) -> bool:
+    """ Whether the class of the error, or one of its bases, is named in retry_on. """
+    if isinstance(e, CircuitOpenError):
+        return False
+    if isinstance(e, BaseExceptionGroup):
+        # e.g. from the task group of an MCP session.
+        return all(is_transient(x, retry_on) for x in e.exceptions)
+    for cls in type(e).__mro__:
+        if cls.__name__ in retry_on or f'{cls.__module__}.{cls.__qualname__}' in retry_on:
+            return True
+    return False
+
+
+def backoff(retry: WorkflowRetry, attempt: int) -> float:
+    """ Seconds to wait after the given attempt (starting at 1) failed. """
+    delay = min(retry.backoff * retry.multiplier ** (attempt - 1), retry.max_backoff)
+    return random.uniform(0, delay) if retry.jitter else delay
+
+
+class CircuitBreaker:
+    """ Closed while calls succeed.  Opens after failure_threshold transient failures in a row, and
+    then fails calls at once until reset_timeout seconds passed.  After that one call is let through:
+    the circuit closes if it succeeds and opens again if it fails.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        # monotonic() when the circuit opened, breakers are shared by runs on different event loops.
+        self._opened: float | None = None
+        self._trial = False
+
+    @property
+    def state(self) -> typing.Literal['closed', 'open', 'half-open']:
+        if self._opened is None:
+            return 'closed'
+        return 'half-open' if monotonic() - self._opened >= self.reset_timeout else 'open'
+
+    def before(self, name: str) -> None:
+        """ Called before each call, raises CircuitOpenError if it may not be made. """
+        state = self.state
+        if state == 'open' or (state == 'half-open' and self._trial):
+            raise CircuitOpenError(f"Circuit breaker for '{name}' is open.")
+        if state == 'half-open':
+            self._trial = True
+
+    def success(self) -> None:
+        self._failures = 0
+        self._opened = None
+        self._trial = False
+
+    def release(self) -> None:
+        """ The call was cancelled, e.g. by a timeout, without telling anything about the server. """
+        self._trial = False
+
+    def failure(self) -> None:
+        self._failures += 1
+        if self._trial or self._failures >= self.failure_threshold:
+            self._opened = monotonic()
+        self._trial = False
+
+
+class CircuitBreakers:
+    """ The circuit breakers of an engine by server, shared by all of its runs. """
+
+    def __init__(self, default: WorkflowCircuitBreaker | None = None):
+        # Used for servers which don't have their own settings, None to only use those.
+        self.default = default
+        self._breakers: typing.Dict[str, CircuitBreaker] = {}
+
+    def get(self, key: str, settings: WorkflowCircuitBreaker | None = None) -> CircuitBreaker | None:
+        settings = settings or self.default
+        if settings is None:
+            return None
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            breaker = self._breakers[key] = CircuitBreaker(settings.failure_threshold, settings.reset_timeout)
+        else:
+            # Workflows may change the settings, the state is kept.
+            breaker.failure_threshold = settings.failure_threshold
+            breaker.reset_timeout = settings.reset_timeout
+        return breaker
+
+
+async def call_with_retry(
+        func: typing.Callable[[], typing.Awaitable[T]], *, name: str,
+        retry: WorkflowRetry | None = None, breaker: CircuitBreaker | None = None,
+        deadline: float | None = None, retryable: typing.Callable[[], bool] | None = None,
+        responded: typing.Callable[[], bool] | None = None
+) -> T:
+    """ Call func until it succeeds, it fails with an error which isn't transient or the attempts of
+    the retry policy are used up.  There is no retry when the delay would pass the deadline (event loop
+    time), or retryable() returns false, e.g. once streamed output was emitted.
+    An error which isn't transient means the server responded, unless responded() returns false, e.g.
+    for a local validation error raised before the server was called.
+    """
+    retry_on = retry.retry_on if retry else RETRY_ON
+    attempt = 0
+    while True:
+        attempt += 1
+        if breaker:
+            breaker.before(name)
+        try:
+            result = await func()
+        except Exception as e:
+            transient = is_transient(e, retry_on)
+            if breaker and transient:
+                breaker.failure()
+            elif breaker and (responded is None or responded()):
+                breaker.success()
+            elif breaker:
+                breaker.release()
+            if not transient or retry is None or attempt >= retry.max_attempts:
+                raise
+            if retryable is not None and not retryable():
+                raise
+            delay = backoff(retry, attempt)
+            if deadline is not None and asyncio.get_running_loop().time() + delay >= deadline:
+                raise
+            logger.info("Retrying '%s' in %.2f seconds (attempt %d): %s", name, delay, attempt, str(e))
+            await asyncio.sleep(delay)
+        except BaseException:
+            if breaker:
+                breaker.release()
+            raise
+        else:
+            if breaker:
+                breaker.success()
+            return result
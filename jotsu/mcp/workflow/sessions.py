@@ -1,23 +1,50 @@
 import asyncio
+import logging
 import typing
 
 from jotsu.mcp.client import MCPClient
 from jotsu.mcp.client.client import MCPClientSession
 from jotsu.mcp.types import Workflow, WorkflowServer, WorkflowMCPNode
 
+if typing.TYPE_CHECKING:
+    from .pool import WorkflowSessionPool  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+
+def node_server(node: WorkflowMCPNode) -> WorkflowServer:
+    """ The server of an MCP node with its own URL, its session id is the node id. """
+    return WorkflowServer(id=node.id, url=node.url, headers=node.headers, client_info=node.client_info)
+
 
 class WorkflowSessionManager:
     """
     Caches MCP sessions per server and guarantees that all context-enter/exit
     happen in the SAME owning task to avoid AnyIO cancel-scope errors.
+    Sessions started by prefetch() are the exception, each is entered and exited by its own task.
     """
-    def __init__(self, workflow: Workflow, *, client: MCPClient):
+    def __init__(
+            self, workflow: Workflow, *, client: MCPClient, servers: typing.Dict[str, WorkflowServer] | None = None,
+            pool: typing.Optional['WorkflowSessionPool'] = None
+    ):
         self._workflow = workflow
         self._client = client
+        # Optional precomputed map of server id -> server, see CompiledWorkflow.
+        self._servers = servers
+        # Sessions are borrowed from the pool, if any, instead of being opened for this run only.
+        self._pool = pool
+        # Servers of MCP nodes with their own URL, for this run only.
+        self._node_servers: dict[str, WorkflowServer] = {}
 
         self._sessions: dict[str, MCPClientSession] = {}
         self._cms: list[typing.AsyncContextManager[MCPClientSession]] = []
-        self._lock = asyncio.Lock()
+        self._borrowed: list[MCPClientSession] = []
+        # Per session id, so that connecting to one server doesn't block the others.
+        self._locks: dict[str, asyncio.Lock] = {}
+        # Sessions started by prefetch() which weren't used yet.
+        self._pending: dict[str, asyncio.Future] = {}
+        # The tasks holding prefetched sessions open, with the event which tells them to exit.
+        self._holders: list[typing.Tuple[asyncio.Task, asyncio.Event]] = []
 
         # Remember the task that 'owns' enter/exit. We'll enforce close() is called by the same task.
         self._owner_task: asyncio.Task | None = None
@@ -27,48 +54,89 @@ class WorkflowSessionManager:
     def workflow(self) -> Workflow:
         return self._workflow
 
-    async def get_session(self, session_id: str) -> MCPClientSession:
+    def session_ids(self) -> typing.List[str]:
+        """ The ids of all servers of the workflow, and of MCP nodes with their own URL. """
+        session_ids = [server.id for server in self.workflow.servers]
+        session_ids.extend(
+            node.id for node in self.workflow.nodes if getattr(node, 'url', None) and node.id not in session_ids
+        )
+        return session_ids
+
+    def prefetch(self, session_ids: typing.Iterable[str] | None = None) -> None:
+        """
+        Start connecting to the servers (default: session_ids()) concurrently, without waiting.
+        get_session() then waits for the connection if it isn't ready yet, and if it failed,
+        connects again and raises any error there.
+        """
         if self._closed:
             raise RuntimeError('WorkflowSessionManager is closed')
+        self._set_owner()
 
-        current = asyncio.current_task()
-        async with self._lock:
-            if self._owner_task is None:
-                self._owner_task = asyncio.current_task()
-            elif self._owner_task is not current:
-                raise RuntimeError(  # pragma: no cover
-                    'WorkflowSessionManager used from a different task; '
-                    'this breaks MCP client session cancel scopes.'
-                )
+        for session_id in self.session_ids() if session_ids is None else session_ids:
+            if session_id in self._sessions or session_id in self._pending:
+                continue
+            server = self._resolve_server(session_id)
+            if self._pool is not None:
+                self._pending[session_id] = asyncio.create_task(self._pool.acquire(server))
+            else:
+                ready = asyncio.get_running_loop().create_future()
+                closing = asyncio.Event()
+                self._holders.append((asyncio.create_task(self._hold(server, ready, closing)), closing))
+                self._pending[session_id] = ready
 
+    async def get_session(self, session_id: str) -> MCPClientSession:
+        if self._closed:
+            raise RuntimeError('WorkflowSessionManager is closed')
+
+        self._set_owner()
+        async with self._locks.setdefault(session_id, asyncio.Lock()):
             session = self._sessions.get(session_id)
             if session is not None:
                 return session
 
-            server = self._get_server(session_id)
-            if not server:
-                node = self._get_node(session_id)
-                if not node:
-                    raise RuntimeError(f'Invalid session id: {session_id}')
+            pending = self._pending.pop(session_id, None)
+            if pending is not None:
+                try:
+                    session = await pending
+                except Exception as e:  # noqa
+                    logger.info("Prefetching session '%s' failed, connecting again: %s", session_id, str(e))
+                else:
+                    if self._pool is not None:
+                        self._borrowed.append(session)
+                    self._sessions[session_id] = session
+                    return session
 
-                server = WorkflowServer(
-                    id=session_id,
-                    url=node.url,
-                    headers=node.headers,
-                    client_info=node.client_info,
-                )
-                self.workflow.servers.append(server)
+            server = self._resolve_server(session_id)
+            if self._pool is not None:
+                # Already loaded, the pool enters and exits the context in its own task.
+                session = await self._pool.acquire(server)
+                self._borrowed.append(session)
+            else:
+                # Enter the client's context here; we own the exit later.
+                cm = self._client.session(server)  # async context manager
+                session = await cm.__aenter__()    # DO NOT call from another task
+                self._cms.append(cm)
 
-            # Enter the client's context here; we own the exit later.
-            cm = self._client.session(server)  # async context manager
-            session = await cm.__aenter__()    # DO NOT call from another task
-            self._cms.append(cm)
-
-            await session.load()
+                await session.load()
 
             self._sessions[server.id] = session
             return session
 
+    def cached(self, session_id: str) -> MCPClientSession | None:
+        """Return the session if it is already open, this is safe from any task."""
+        return self._sessions.get(session_id) if not self._closed else None
+
+    async def discard(self, session_id: str) -> None:
+        """
+        Stop using a session whose call failed with a connection error, the next get_session() connects again.
+        A pooled session is closed by the pool, this is safe from any task.  Other sessions are still
+        exited by aclose(), in the owning task.
+        """
+        session = self._sessions.pop(session_id, None)
+        if session is not None and session in self._borrowed:
+            self._borrowed.remove(session)
+            await self._pool.release(session, discard=True)
+
     def is_owner(self):
         """Is the current task the owning task"""
         return not self._owner_task or self._owner_task is asyncio.current_task()
@@ -85,6 +153,22 @@ class WorkflowSessionManager:
         # Prevent reuse while closing
         self._sessions.clear()
 
+        if self._pool is not None:
+            # Let prefetches finish, cancelling them could leave the pool's entries half open.
+            for result in await asyncio.gather(*self._pending.values(), return_exceptions=True):
+                if not isinstance(result, BaseException):
+                    self._borrowed.append(result)
+        self._pending.clear()
+
+        for session in self._borrowed:
+            await self._pool.release(session)
+        self._borrowed.clear()
+
+        for _task, closing in self._holders:
+            closing.set()
+        await asyncio.gather(*(task for task, _closing in self._holders), return_exceptions=True)
+        self._holders.clear()
+
         # First try per-session aclose() (if provided), then exit contexts.
         # aclose() is optional; if present it lets the session tidy up before CM exit.
         for cm in reversed(self._cms):
@@ -96,7 +180,42 @@ class WorkflowSessionManager:
 
         self._cms.clear()
 
+    def _set_owner(self):
+        current = asyncio.current_task()
+        if self._owner_task is None:
+            self._owner_task = current
+        elif self._owner_task is not current:
+            raise RuntimeError(  # pragma: no cover
+                'WorkflowSessionManager used from a different task; '
+                'this breaks MCP client session cancel scopes.'
+            )
+
+    async def _hold(self, server: WorkflowServer, ready: asyncio.Future, closing: asyncio.Event):
+        # Enters and exits the session context in this task, like WorkflowSessionPool.
+        try:
+            async with self._client.session(server) as session:
+                await session.load()
+                ready.set_result(session)
+                await closing.wait()
+        except Exception as e:  # noqa
+            if not ready.done():
+                ready.set_exception(e)
+            else:
+                logger.warning("MCP session for server '%s' failed: %s", server.id, str(e))
+
+    def _resolve_server(self, session_id: str) -> WorkflowServer:
+        server = self._get_server(session_id) or self._node_servers.get(session_id)
+        if not server:
+            node = self._get_node(session_id)
+            if not node:
+                raise RuntimeError(f'Invalid session id: {session_id}')
+            # Not added to the workflow, which is shared by all of its runs.
+            server = self._node_servers[session_id] = node_server(node)
+        return server
+
     def _get_server(self, server_id: str) -> WorkflowServer | None:
+        if self._servers is not None and server_id in self._servers:
+            return self._servers[server_id]
         for server in self.workflow.servers:
             if server.id == server_id:
                 return server
@@ -108,3 +227,36 @@ class WorkflowSessionManager:
                 if getattr(node, 'url', None):
                     return node
         return None
+
+
+class WorkflowSessionRelay:
+    """
+    Session access for tasks other than the one owning a WorkflowSessionManager, e.g. concurrent
+    branches.  Open sessions are returned directly, new ones are requested from the task handling
+    the relay's requests so enter/exit still happen in the owning task.
+    """
+    def __init__(
+            self, sessions: typing.Union[WorkflowSessionManager, 'WorkflowSessionRelay'], *,
+            request: typing.Callable[[str, asyncio.Future], None]
+    ):
+        self._sessions = sessions
+        self._request = request
+
+    @property
+    def workflow(self) -> Workflow:
+        return self._sessions.workflow
+
+    def cached(self, session_id: str) -> MCPClientSession | None:
+        return self._sessions.cached(session_id)
+
+    async def discard(self, session_id: str) -> None:
+        await self._sessions.discard(session_id)
+
+    async def get_session(self, session_id: str) -> MCPClientSession:
+        session = self.cached(session_id)
+        if session is not None:
+            return session
+
+        future = asyncio.get_running_loop().create_future()
+        self._request(session_id, future)
+        return await future
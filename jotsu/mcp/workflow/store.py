@@ -0,0 +1,223 @@
+import asyncio
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import typing
+import urllib.parse
+from abc import ABC, abstractmethod
+
+from jotsu.mcp.types import Workflow
+
+
+class WorkflowInfo(typing.NamedTuple):
+    id: str
+    name: str
+    description: str | None
+
+
+class WorkflowStore(ABC):
+    """ Source of workflow definitions, which the engine loads and compiles when they are first used.
+    Implement this to keep workflows elsewhere, e.g. in a database shared by workers.
+    The engine keeps the compiled plans, call WorkflowEngine.invalidate_workflow() after changing a workflow.
+    """
+
+    @abstractmethod
+    async def get(self, name: str) -> Workflow | None:
+        """ The workflow with the given id, otherwise the first one with the given name. """
+
+    @abstractmethod
+    async def list(self) -> typing.List[WorkflowInfo]:
+        """ Every workflow in the store, without loading the definitions. """
+
+    @abstractmethod
+    async def put(self, workflow: Workflow) -> None:
+        """ Add the workflow, replacing the one with the same id if any. """
+
+    @abstractmethod
+    async def delete(self, workflow_id: str) -> None:
+        ...
+
+
+def _info(workflow: Workflow) -> WorkflowInfo:
+    return WorkflowInfo(id=workflow.id, name=workflow.name or workflow.id, description=workflow.description)
+
+
+class MemoryWorkflowStore(WorkflowStore):
+    """ WorkflowStore backed by a dict, mostly useful for tests. """
+
+    def __init__(self, workflows: typing.Iterable[Workflow] = ()):
+        self._workflows: typing.Dict[str, Workflow] = {workflow.id: workflow for workflow in workflows}
+
+    async def get(self, name: str) -> Workflow | None:
+        workflow = self._workflows.get(name)
+        if workflow is None:
+            workflow = next((x for x in self._workflows.values() if (x.name or x.id) == name), None)
+        return workflow
+
+    async def list(self) -> typing.List[WorkflowInfo]:
+        return [_info(workflow) for workflow in self._workflows.values()]
+
+    async def put(self, workflow: Workflow) -> None:
+        self._workflows[workflow.id] = workflow
+
+    async def delete(self, workflow_id: str) -> None:
+        self._workflows.pop(workflow_id, None)
+
+
+class DirectoryWorkflowStore(WorkflowStore):
+    """ WorkflowStore with one JSON file per workflow in a directory, files added with put() are named after the
+    URL-quoted id, so ids can't refer to paths outside the directory.
+    The id, name and description of each file are indexed and only re-read when the file changes.
+    """
+
+    def __init__(self, directory: str | os.PathLike):
+        self._directory = os.fspath(directory)
+        # path -> (mtime, info)
+        self._index: typing.Dict[str, typing.Tuple[int, WorkflowInfo]] = {}
+
+    def _path(self, workflow_id: str) -> str:
+        return os.path.join(self._directory, urllib.parse.quote(workflow_id, safe='') + '.json')
+
+    async def get(self, name: str) -> Workflow | None:
+        return await asyncio.to_thread(self._get, name)
+
+    async def list(self) -> typing.List[WorkflowInfo]:
+        return list((await asyncio.to_thread(self._scan)).values())
+
+    async def put(self, workflow: Workflow) -> None:
+        await asyncio.to_thread(self._write, self._path(workflow.id), workflow.model_dump_json(exclude_none=True))
+
+    async def delete(self, workflow_id: str) -> None:
+        await asyncio.to_thread(self._delete, workflow_id)
+
+    def _get(self, name: str) -> Workflow | None:
+        # Usually the file is named after the id, which avoids scanning the directory.
+        workflow = self._read(self._path(name))
+        if workflow is not None and workflow.id == name:
+            return workflow
+
+        index = self._scan()
+        for key in ('id', 'name'):
+            for path, info in index.items():
+                if getattr(info, key) == name:
+                    return self._read(path)
+        return None
+
+    def _scan(self) -> typing.Dict[str, WorkflowInfo]:
+        try:
+            filenames = sorted(x for x in os.listdir(self._directory) if x.endswith('.json'))
+        except FileNotFoundError:
+            filenames = []
+
+        index = {}
+        for filename in filenames:
+            path = os.path.join(self._directory, filename)
+            try:
+                mtime = os.stat(path).st_mtime_ns
+                cached = self._index.get(path)
+                if cached is None or cached[0] != mtime:
+                    with open(path) as fp:
+                        value = json.load(fp)
+                    info = WorkflowInfo(
+                        id=value['id'], name=value.get('name') or value['id'], description=value.get('description')
+                    )
+                    cached = (mtime, info)
+            except (OSError, ValueError, KeyError, TypeError):
+                # Not a workflow, or removed in the meantime.
+                continue
+            index[path] = cached
+
+        self._index = index
+        return {path: info for path, (_mtime, info) in index.items()}
+
+    @staticmethod
+    def _read(path: str) -> Workflow | None:
+        try:
+            with open(path) as fp:
+                return Workflow.model_validate_json(fp.read())
+        except FileNotFoundError:
+            return None
+
+    def _write(self, path: str, text: str) -> None:
+        os.makedirs(self._directory, exist_ok=True)
+        # Readers never see a partial file.
+        fd, tmp = tempfile.mkstemp(dir=self._directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as fp:
+            fp.write(text)
+        os.replace(tmp, path)
+
+    def _delete(self, workflow_id: str) -> None:
+        for path, info in self._scan().items():
+            if info.id == workflow_id:
+                os.remove(path)
+                self._index.pop(path, None)
+
+
+class _SQLiteDatabase:
+    """ SQLite connection used from worker threads, one at a time, created with the schema on first use. """
+
+    def __init__(self, path: str | os.PathLike, schema: typing.Sequence[str]):
+        self._path = os.fspath(path)
+        self._schema = schema
+        self._connection: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    async def execute(self, sql: str, parameters: typing.Sequence = ()) -> typing.List[tuple]:
+        return await asyncio.to_thread(self._execute, sql, parameters)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def _execute(self, sql: str, parameters: typing.Sequence) -> typing.List[tuple]:
+        with self._lock:
+            if self._connection is None:
+                self._connection = sqlite3.connect(self._path, check_same_thread=False)
+                with self._connection:
+                    for statement in self._schema:
+                        self._connection.execute(statement)
+            with self._connection:
+                return self._connection.execute(sql, parameters).fetchall()
+
+
+class SQLiteWorkflowStore(WorkflowStore):
+    """ WorkflowStore in a SQLite database, with the id, name and description in their own columns. """
+
+    def __init__(self, path: str | os.PathLike = ':memory:'):
+        self._db = _SQLiteDatabase(path, (
+            'CREATE TABLE IF NOT EXISTS workflows '
+            '(id TEXT PRIMARY KEY, name TEXT NOT NULL, description TEXT, definition TEXT NOT NULL)',
+            'CREATE INDEX IF NOT EXISTS workflows_name ON workflows (name)',
+        ))
+
+    async def get(self, name: str) -> Workflow | None:
+        row = await self._db.execute(
+            'SELECT definition FROM workflows WHERE id = ? '
+            'UNION ALL SELECT definition FROM (SELECT definition FROM workflows WHERE name = ? ORDER BY rowid) '
+            'LIMIT 1',
+            (name, name)
+        )
+        return Workflow.model_validate_json(row[0][0]) if row else None
+
+    async def list(self) -> typing.List[WorkflowInfo]:
+        rows = await self._db.execute('SELECT id, name, description FROM workflows ORDER BY rowid')
+        return [WorkflowInfo(*row) for row in rows]
+
+    async def put(self, workflow: Workflow) -> None:
+        info = _info(workflow)
+        await self._db.execute(
+            'INSERT INTO workflows (id, name, description, definition) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT (id) DO UPDATE SET '
+            'name = excluded.name, description = excluded.description, definition = excluded.definition',
+            (info.id, info.name, info.description, workflow.model_dump_json(exclude_none=True))
+        )
+
+    async def delete(self, workflow_id: str) -> None:
+        await self._db.execute('DELETE FROM workflows WHERE id = ?', (workflow_id,))
+
+    def close(self) -> None:
+        self._db.close()
@@ -1,15 +1,54 @@
+import copy
 import datetime
 import json
+import time
 import zoneinfo
 
 import typing
-from types import SimpleNamespace
+from types import FunctionType, ModuleType, SimpleNamespace
 
+import jsonschema
 import quickjs
 from asteval import Interpreter
 
 from jotsu.mcp.types import JotsuException
 
+from .cache import LRUCache
+
+# Compiled JSON schema validators, keyed by the (canonical) schema text.
+validator_cache = LRUCache(maxsize=256)
+# Compiled handlebars templates (prompts, system messages) keyed by the template source.
+template_cache = LRUCache(maxsize=256)
+
+
+def json_schema_validator(
+        schema: dict, *, prepare: typing.Callable[[dict], dict] | None = None
+) -> jsonschema.protocols.Validator:
+    """ Return a validator for the schema, checking and compiling it only once.
+    If given, prepare() is called with a copy of the schema to patch before compiling.
+    """
+    # By content, schemas may be changed in place.  The validator has its own copy for the same reason.
+    key = (json.dumps(schema, sort_keys=True, default=str), prepare)
+    validator = validator_cache.get(key)
+    if validator is None:
+        patched = copy.deepcopy(schema)
+        if prepare:
+            patched = prepare(patched)
+        cls = jsonschema.validators.validator_for(patched, default=jsonschema.Draft202012Validator)
+        cls.check_schema(patched)
+        validator = cls(patched)
+        validator_cache.set(key, validator)
+    return validator
+
+
+def json_schema_validate(instance, schema: dict, *, prepare: typing.Callable[[dict], dict] | None = None):
+    """ Same as jsonschema.validate() using a cached validator. """
+    error = jsonschema.exceptions.best_match(
+        json_schema_validator(schema, prepare=prepare).iter_errors(instance)
+    )
+    if error is not None:
+        raise error
+
 
 def wrap_function(expr: str):
     lines = ['def __func():']
@@ -20,44 +59,268 @@ def wrap_function(expr: str):
     return '\n'.join(lines)
 
 
+class _ReadOnly:
+    """ Attribute access to a shared object (module, namespace, function) without any way to change it. """
+    __slots__ = ('_target',)
+
+    def __init__(self, target):
+        object.__setattr__(self, '_target', target)
+
+    def __getattr__(self, name):
+        return _read_only(getattr(object.__getattribute__(self, '_target'), name))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"'{name}' is read-only")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"'{name}' is read-only")
+
+    def __call__(self, *args, **kwargs):
+        return object.__getattribute__(self, '_target')(*args, **kwargs)
+
+    def __repr__(self):
+        return repr(object.__getattribute__(self, '_target'))
+
+
+def _read_only(value):
+    # Built-in functions and types can't be changed anyway, classes defined in Python can.
+    if isinstance(value, (FunctionType, ModuleType, SimpleNamespace)) or (
+            isinstance(value, type) and not value.__flags__ & _IMMUTABLE_TYPE):
+        return _ReadOnly(value)
+    return value
+
+
+_IMMUTABLE_TYPE = 1 << 8  # Py_TPFLAGS_IMMUTABLETYPE
+
+
+class _Interpreter(Interpreter):
+    """ asteval Interpreter which stops once an eval() runs longer than its time limit. """
+
+    def __init__(self, *, time_limit: float | None):
+        self.time_limit = time_limit
+        self.started = time.monotonic()
+        super().__init__()
+
+        self.symtable['datetime'] = SimpleNamespace(
+            datetime=datetime.datetime,
+            timedelta=datetime.timedelta,
+            timezone=datetime.timezone,
+            zoneinfo=zoneinfo
+        )
+        self.symtable.pop('print', None)
+        # Restored after every call so nothing a function defines leaks into the next one.  The values
+        # are shared between calls (and the module level ones between interpreters) so none may be changed.
+        self.base_symtable = {key: _read_only(value) for key, value in self.symtable.items()}
+        self.symtable.update(self.base_symtable)
+
+    def run(self, node, expr=None, lineno=None, with_raise=True):
+        if self.time_limit is not None and time.monotonic() - self.started > self.time_limit:
+            self.raise_exception(node, exc=TimeoutError, msg=f'Time limit of {self.time_limit}s exceeded')
+        return super().run(node, expr=expr, lineno=lineno, with_raise=with_raise)
+
+    def call(self, tree, *, data: dict, node):
+        self.symtable['data'] = data
+        self.symtable['node'] = node
+        self.started = time.monotonic()
+        try:
+            return self.eval(tree)
+        finally:
+            self.symtable.clear()
+            self.symtable.update(self.base_symtable)
+            self.code_text.clear()
+
+
+class FunctionInterpreterPool:
+    """ Reusable asteval interpreters for function nodes.
+    Function bodies are parsed once and cached, the interpreter symbol table is reset between calls.
+    An interpreter is dropped after any error.
+    """
+    def __init__(self, size: int = 4, *, time_limit: float | None = 5, max_functions: int = 256):
+        self._size = size
+        self._time_limit = time_limit
+        self._idle: typing.List[_Interpreter] = []
+        self._functions = LRUCache(maxsize=max_functions)
+
+    def compile(self, expr: str):
+        """ Parse a function body ahead of time, e.g. when a workflow is registered. """
+        tree = self._functions.get(expr)
+        if tree is None:
+            tree = self._run(lambda aeval: aeval.parse(wrap_function(expr)))
+            self._functions.set(expr, tree)
+        return tree
+
+    def call(self, expr: str, data: dict, node):
+        tree = self.compile(expr)
+        return self._run(lambda aeval: aeval.call(tree, data=data, node=node))
+
+    def clear(self) -> None:
+        self._idle.clear()
+        self._functions.clear()
+
+    def _run(self, func: typing.Callable[[_Interpreter], typing.Any]):
+        aeval = self._idle.pop() if self._idle else _Interpreter(time_limit=self._time_limit)
+        try:
+            result = func(aeval)
+        except Exception as e:
+            raise JotsuException('\n'.join([x.msg for x in aeval.error]) or str(e)) from e
+        if aeval.error:
+            raise JotsuException('\n'.join([x.msg for x in aeval.error]))
+
+        # Only reached without an error, otherwise the interpreter is discarded.
+        if len(self._idle) < self._size:
+            self._idle.append(aeval)
+        return result
+
+
+function_pool = FunctionInterpreterPool()
+
+
 def asteval(data: dict, expr: str, *, node):
-    aeval = Interpreter()
-    aeval.symtable['data'] = data
-    aeval.symtable['node'] = node
-
-    aeval.symtable['datetime'] = SimpleNamespace(
-        datetime=datetime.datetime,
-        timedelta=datetime.timedelta,
-        timezone=datetime.timezone,
-        zoneinfo=zoneinfo
-    )
+    return function_pool.call(expr, data, node)
 
-    aeval.symtable.pop('print', None)
 
-    result = aeval(wrap_function(expr))
-    if aeval.error:
-        raise JotsuException('\n'.join([e.msg for e in aeval.error]))
-    return result
+# Freezes the built-in objects, so that scripts can't leave anything in them, and returns a function
+# which puts the properties of the global object back as they were.  It returns false if it can't.
+_SCRIPT_LOCKDOWN = """
+    (function () {
+        "use strict";
+        const frozen = new Set([globalThis]);
+        const harden = (obj) => {
+            if (obj === null || (typeof obj !== 'object' && typeof obj !== 'function') || frozen.has(obj)) {
+                return;
+            }
+            frozen.add(obj);
+            Object.freeze(obj);
+            harden(Reflect.getPrototypeOf(obj));
+            for (const key of Reflect.ownKeys(obj)) {
+                const descriptor = Reflect.getOwnPropertyDescriptor(obj, key);
+                harden(descriptor.value);
+                harden(descriptor.get);
+                harden(descriptor.set);
+            }
+        };
+        harden(Reflect.getPrototypeOf(globalThis));
+        const keys = Reflect.ownKeys(globalThis);
+        keys.forEach((key) => harden(Reflect.getOwnPropertyDescriptor(globalThis, key).value));
+        // Built-ins which aren't properties of any other.
+        [
+            [][Symbol.iterator](), new Map()[Symbol.iterator](), new Set()[Symbol.iterator](),
+            ''[Symbol.iterator](), /a/[Symbol.matchAll](''),
+            function* () {}, async function () {}, async function* () {}, Int8Array,
+        ].forEach((x) => harden(Reflect.getPrototypeOf(x)));
 
+        const values = keys.map((key) => globalThis[key]);
+        const known = new Set(keys);
+        return function () {
+            let clean = true;
+            for (const key of Reflect.ownKeys(globalThis)) {
+                if (!known.has(key) && !Reflect.deleteProperty(globalThis, key)) {
+                    clean = false;
+                }
+            }
+            for (let i = 0; i < keys.length; i++) {
+                if (!Object.is(globalThis[keys[i]], values[i])) {
+                    try {
+                        globalThis[keys[i]] = values[i];
+                    } catch (e) {
+                        clean = false;
+                    }
+                }
+            }
+            return clean;
+        };
+    })()
+"""
 
-def script(data, expr: str, *, node):
-    context = quickjs.Context()
-    context.eval(f"""
-    const __data = JSON.parse({json.dumps(json.dumps(data))});
-    const __node = JSON.parse({json.dumps(node.model_dump_json())});
-""")
-    wrapper = f"""
-        (function () {{
-            "use strict";
-            const data = __data;
-            function __user() {{
-                {expr}
-            }}
-            const result = __user();
-            return result ? JSON.stringify(result) : JSON.stringify(data);
-        }})()
+
+class _ScriptContext:
+    __slots__ = ('context', 'functions', 'reset')
+
+    def __init__(self, *, memory_limit: int, time_limit: float, max_scripts: int):
+        self.context = quickjs.Context()
+        self.context.set_memory_limit(memory_limit)
+        # Applies to each eval() and function call separately.
+        self.context.set_time_limit(time_limit)
+        self.functions = LRUCache(maxsize=max_scripts)
+        # Scripts of different runs share the context, nothing they leave behind may reach the next one.
+        self.reset = self.context.eval(_SCRIPT_LOCKDOWN)
+
+    def function(self, expr: str):
+        function = self.functions.get(expr)
+        if function is None:
+            function = self.context.eval(f"""
+                (function () {{
+                    "use strict";
+                    function __user(data, __node) {{
+                        {expr}
+                    }}
+                    Object.freeze(__user);
+                    const {{parse, stringify}} = JSON;
+                    return function (data, node) {{
+                        data = parse(data);
+                        const result = __user(data, parse(node));
+                        return result ? stringify(result) : stringify(data);
+                    }};
+                }})()
+            """)
+            self.functions.set(expr, function)
+        return function
+
+
+class ScriptContextPool:
+    """ Reusable QuickJS contexts for script nodes.
+    Each script is compiled into a function once per context and data is passed in as JSON arguments.
+    A context is dropped after any error since a script that ran out of memory leaves it unusable.
+    Built-in objects are frozen and globals a script adds or changes are undone after each call, the context
+    is dropped if they can't be.  Nothing a script leaves behind reaches the next one, which may be another run.
     """
-    result = context.eval(wrapper)
+    def __init__(
+            self, size: int = 4, *,
+            memory_limit: int = 64 * 1024 * 1024, time_limit: float = 5, max_scripts: int = 128
+    ):
+        self._size = size
+        self._memory_limit = memory_limit
+        self._time_limit = time_limit
+        self._max_scripts = max_scripts
+        self._idle: typing.List[_ScriptContext] = []
+
+    def compile(self, expr: str) -> None:
+        """ Compile a script ahead of time in every context of the pool, e.g. when a workflow is registered. """
+        while len(self._idle) < self._size:
+            self._idle.append(self._context())
+        for context in list(self._idle):
+            try:
+                context.function(expr)
+            except Exception:
+                self._idle.remove(context)
+                raise
+
+    def call(self, expr: str, data: dict, node_json: str) -> str | None:
+        return self._run(lambda context: context.function(expr)(json.dumps(data), node_json))
+
+    def clear(self) -> None:
+        self._idle.clear()
+
+    def _context(self) -> _ScriptContext:
+        return _ScriptContext(
+            memory_limit=self._memory_limit, time_limit=self._time_limit, max_scripts=self._max_scripts
+        )
+
+    def _run(self, func: typing.Callable[[_ScriptContext], typing.Any]):
+        context = self._idle.pop() if self._idle else self._context()
+        result = func(context)
+
+        # Only reached without an error, otherwise the context is discarded.
+        if context.reset() and len(self._idle) < self._size:
+            self._idle.append(context)
+        return result
+
+
+script_pool = ScriptContextPool()
+
+
+def script(data, expr: str, *, node):
+    result = script_pool.call(expr, data, node.model_dump_json())
     return json.loads(result) if result else data
 
 
@@ -68,10 +331,19 @@ def pybars_compiler():  # pragma: no coverage
     return getattr(pybars_compiler, '_compiler')
 
 
-def pybars_render(source: str, data: typing.Any) -> str:
-    compiler = pybars_compiler()
-    template = compiler.compile(source)
-    return template(data)
+def pybars_template(source: str) -> typing.Callable[[typing.Any], str]:
+    """ Compile a handlebars template, or return it from the cache. """
+    template = template_cache.get(source)
+    if template is None:
+        template = pybars_compiler().compile(source)
+        template_cache.set(source, template)
+    return template
+
+
+def pybars_render(source: str, data: typing.Any, artifacts: typing.Dict[str, typing.Any] | None = None) -> str:
+    """ Render the template, compiled with the plan (see CompiledNode.artifacts) or taken from the cache. """
+    template = artifacts.get(source) if artifacts else None
+    return (template or pybars_template(source))(data)
 
 
 def path_set(data: dict, *, path: str, value):
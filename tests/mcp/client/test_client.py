@@ -1,15 +1,18 @@
+import asyncio
+import time
 from contextlib import asynccontextmanager
 
 import pytest
 import pydantic
 import httpx
-from mcp import McpError, ErrorData
+from mcp import McpError, ErrorData, types
+from mcp.types import Tool, Resource, Prompt
 
 from mcp.shared.auth import OAuthToken
 
 from jotsu.mcp.client import MCPClient
 from jotsu.mcp.client.client import MCPClientSession, split_scopes
-from jotsu.mcp.client.credentials import CredentialsManager
+from jotsu.mcp.client.credentials import CredentialsManager, MemoryCredentialsManager
 from jotsu.mcp.types import WorkflowServer
 
 
@@ -270,3 +273,217 @@ def test_split_scopes():
     assert scopes == ['a']
 
     assert split_scopes('') == []
+
+
+async def test_client_session_catalog(mocker):
+    server = WorkflowServer(id='hello', url=pydantic.AnyHttpUrl('https://hello.mcp.jotsu.com/mcp/'))
+    session = MCPClientSession(
+        read_stream=mocker.Mock(), write_stream=mocker.Mock(), client=mocker.Mock(), server=server
+    )
+
+    tool = Tool(name='tool', inputSchema={})
+    resource = Resource(name='resource', uri=pydantic.AnyUrl('resource://hello/'))
+    prompt = Prompt(name='prompt')
+
+    list_tools = mocker.patch.object(
+        session, 'list_tools', new_callable=mocker.AsyncMock, return_value=mocker.Mock(tools=[tool])
+    )
+    list_resources = mocker.patch.object(
+        session, 'list_resources', new_callable=mocker.AsyncMock, return_value=mocker.Mock(resources=[resource])
+    )
+    list_prompts = mocker.patch.object(
+        session, 'list_prompts', new_callable=mocker.AsyncMock, return_value=mocker.Mock(prompts=[prompt])
+    )
+
+    await session.load()
+    for _ in range(2):
+        assert await session.find_tool('tool') == tool
+        assert await session.find_tool('missing') is None
+        assert await session.find_resource('resource://hello/') == resource
+        assert await session.find_prompt('prompt') == prompt
+    list_tools.assert_called_once()
+
+    for notification in (
+            types.ToolListChangedNotification(method='notifications/tools/list_changed'),
+            types.ResourceListChangedNotification(method='notifications/resources/list_changed'),
+            types.PromptListChangedNotification(method='notifications/prompts/list_changed'),
+    ):
+        await session._received_notification(types.ServerNotification(notification))
+
+    assert await session.find_tool('tool') == tool
+    assert await session.find_resource('resource://hello/') == resource
+    assert await session.find_prompt('prompt') == prompt
+    assert list_tools.call_count == 2
+    assert list_resources.call_count == 2
+    assert list_prompts.call_count == 2
+    assert session.server.tools == [tool]
+
+    session.invalidate()
+    assert await session.find_tool('tool') == tool
+    assert list_tools.call_count == 3
+
+
+async def test_refresh_token_http_client(mocker):
+    http_client = httpx.AsyncClient()
+    client = MCPClient(credentials_manager=MockCredentialsManager(), http_client=http_client)
+    assert client.http_client is http_client
+
+    oauth = mocker.patch('jotsu.mcp.client.client.OAuth2AuthorizationCodeClient')
+    oauth.return_value.exchange_refresh_token = mocker.AsyncMock(return_value=None)
+
+    server = WorkflowServer(id='hello', url=pydantic.AnyHttpUrl('https://hello.mcp.jotsu.com/mcp/'))
+    await client.token_refresh(server, await client.credentials.load(server.id))
+    assert oauth.call_args.kwargs['http_client'] is http_client
+    await http_client.aclose()
+
+
+async def test_refresh_token_single_flight(mocker):
+    async def exchange(*_args, **_kwargs):
+        await asyncio.sleep(0.01)
+        return OAuthToken(access_token='new', expires_in=3600)
+
+    exchange_refresh_token = mocker.patch(
+        'jotsu.mcp.client.OAuth2AuthorizationCodeClient.exchange_refresh_token', side_effect=exchange
+    )
+
+    client = MCPClient()
+    server = WorkflowServer(id='hello', url=pydantic.AnyHttpUrl('https://hello.mcp.jotsu.com/mcp/'))
+    credentials = await MockCredentialsManager().load(server.id)
+
+    tokens = await asyncio.gather(*[client.token_refresh(server, credentials) for _ in range(5)])
+    assert tokens == ['new'] * 5
+    exchange_refresh_token.assert_called_once()
+
+    stored = await client.credentials.load(server.id)
+    assert stored['refresh_token'] == 'xxx'
+    assert stored['expires_at'] == pytest.approx(time.time() + 3600, abs=5)
+
+    # Done, the next refresh is a new request.
+    assert await client.token_refresh(server, stored) == 'new'
+    assert exchange_refresh_token.call_count == 2
+
+
+async def test_refresh_token_staggered(mocker):
+    tokens = iter(['new', 'newer'])
+
+    async def exchange(*_args, **kwargs):
+        calls.append(kwargs)
+        await asyncio.sleep(0.01)
+        return OAuthToken(access_token=next(tokens), refresh_token=f'refresh-{len(calls)}', expires_in=3600)
+
+    calls = []
+    mocker.patch('jotsu.mcp.client.OAuth2AuthorizationCodeClient.exchange_refresh_token', side_effect=exchange)
+
+    server = WorkflowServer(id='hello', url=pydantic.AnyHttpUrl('https://hello.mcp.jotsu.com/mcp/'))
+    credentials = await MockCredentialsManager().load(server.id)
+    client = MCPClient(credentials_manager=MemoryCredentialsManager({server.id: credentials}))
+
+    # Both callers load the same credentials, the second only refreshes after the first finished.
+    first = await client.credentials.load(server.id)
+    second = await client.credentials.load(server.id)
+    assert await client.token_refresh(server, first) == 'new'
+    assert await client.token_refresh(server, second) == 'new'
+    assert len(calls) == 1
+    assert calls[0]['refresh_token'].token == 'xxx'
+
+    # With the stored credentials, the rotated refresh token is used.
+    assert await client.token_refresh(server, await client.credentials.load(server.id)) == 'newer'
+    assert len(calls) == 2
+    assert calls[1]['refresh_token'].token == 'refresh-1'
+
+
+def _connect_mock(mocker, headers: list):
+    @asynccontextmanager
+    async def mock_connect(_server, connect_headers, **_kwargs):
+        headers.append(connect_headers.get('Authorization'))
+        yield mocker.Mock()
+
+    return mock_connect
+
+
+async def test_client_proactive_refresh(mocker):
+    exchange_refresh_token = mocker.patch(
+        'jotsu.mcp.client.OAuth2AuthorizationCodeClient.exchange_refresh_token',
+        new_callable=mocker.AsyncMock, return_value=OAuthToken(access_token='new', expires_in=3600)
+    )
+    server = WorkflowServer(id='hello', url=pydantic.AnyHttpUrl('https://hello.mcp.jotsu.com/mcp/'))
+
+    credentials = await MockCredentialsManager().load(server.id)
+    store = {server.id: {**credentials, 'expires_at': int(time.time()) + 10}}
+    client = MCPClient(credentials_manager=MemoryCredentialsManager(store), refresh_margin=60)
+
+    headers = []
+    mocker.patch.object(client, '_connect', new=_connect_mock(mocker, headers))
+
+    async with client.session(server):
+        ...
+    async with client.session(server):
+        ...
+    # The stored token is refreshed once, before it expires, and then used.
+    assert headers == ['Bearer new', 'Bearer new']
+    exchange_refresh_token.assert_called_once()
+
+    # If the refresh fails, the current token is still tried.
+    store[server.id]['expires_at'] = int(time.time())
+    exchange_refresh_token.return_value = None
+    async with client.session(server):
+        ...
+    assert headers[-1] == 'Bearer new'
+
+
+async def test_client_proactive_refresh_error(mocker):
+    exchange_refresh_token = mocker.patch(
+        'jotsu.mcp.client.OAuth2AuthorizationCodeClient.exchange_refresh_token',
+        new_callable=mocker.AsyncMock, side_effect=httpx.ConnectError('refused')
+    )
+    server = WorkflowServer(id='hello', url=pydantic.AnyHttpUrl('https://hello.mcp.jotsu.com/mcp/'))
+
+    credentials = await MockCredentialsManager().load(server.id)
+    store = {server.id: {**credentials, 'access_token': 'current', 'expires_at': int(time.time()) + 10}}
+    client = MCPClient(credentials_manager=MemoryCredentialsManager(store), refresh_margin=60)
+
+    headers = []
+    mocker.patch.object(client, '_connect', new=_connect_mock(mocker, headers))
+
+    # The token is still valid, connect with it.  Later sessions don't try again right away.
+    for _ in range(2):
+        async with client.session(server):
+            ...
+    assert headers == ['Bearer current', 'Bearer current']
+    exchange_refresh_token.assert_called_once()
+
+    # Tried again after the backoff, the failure is forgotten once it succeeds.
+    client._refresh_failures[server.id] -= 30
+    exchange_refresh_token.side_effect = None
+    exchange_refresh_token.return_value = OAuthToken(access_token='new', expires_in=3600)
+    async with client.session(server):
+        ...
+    assert headers[-1] == 'Bearer new'
+    assert client._refresh_failures == {}
+
+
+async def test_client_auth_replaced_token(mocker):
+    req = httpx.Request('GET', 'https://example.com')
+    e = BaseExceptionGroup('error', [httpx.HTTPStatusError('xxx', request=req, response=httpx.Response(401))])
+
+    server = WorkflowServer(id='hello', url=pydantic.AnyHttpUrl('https://hello.mcp.jotsu.com/mcp/'))
+    store = {server.id: {'access_token': 'old'}}
+    client = MCPClient(credentials_manager=MemoryCredentialsManager(store))
+    authenticate = mocker.patch.object(client, 'authenticate', new_callable=mocker.AsyncMock)
+
+    headers = []
+
+    @asynccontextmanager
+    async def mock_connect(_server, connect_headers, **_kwargs):
+        headers.append(connect_headers.get('Authorization'))
+        if len(headers) == 1:
+            # Another run refreshed the token meanwhile.
+            store[server.id] = {'access_token': 'new'}
+            raise e
+        yield mocker.Mock()
+
+    mocker.patch.object(client, '_connect', new=mock_connect)
+    async with client.session(server):
+        ...
+    assert headers == ['Bearer old', 'Bearer new']
+    authenticate.assert_not_called()
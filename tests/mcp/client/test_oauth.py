@@ -6,7 +6,7 @@ import httpx
 from mcp.server.auth.provider import RefreshToken
 from mcp.shared.auth import OAuthToken, OAuthClientInformationFull
 
-from jotsu.mcp.client.oauth import OAuth2AuthorizationCodeClient, log_request
+from jotsu.mcp.client.oauth import OAuth2AuthorizationCodeClient, log_request, create_http_client
 
 
 @pytest.fixture(scope='function', name='oauth_client')
@@ -177,3 +177,50 @@ async def test_oauth_dynamic_client_registration(mocker):
 async def test_oauth_log_request():
     req = httpx.Request(method='GET', url='https://www.example.com', content=b'XXX')
     assert await log_request(req) is None
+
+
+@pytest.mark.asyncio
+async def test_oauth_create_http_client(mocker):
+    # HTTP/2 only if 'h2' is installed.
+    mocker.patch('jotsu.mcp.client.oauth.importlib.util.find_spec', return_value=None)
+    async with create_http_client(max_keepalive_connections=5) as client:
+        assert client.event_hooks['request'] == [log_request]
+
+
+@pytest.mark.asyncio
+async def test_oauth_shared_http_client(oauth_client):
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if request.url.path == '/register':
+            return httpx.Response(200, json={
+                'client_id': 'client_id', 'redirect_uris': ['http://localhost/'], 'response_types': ['code']
+            })
+        if request.url.path == '/.well-known/oauth-authorization-server':
+            return httpx.Response(200, json={
+                'authorization_endpoint': 'https://example.com/authorize',
+                'token_endpoint': 'https://example.com/token'
+            })
+        return httpx.Response(200, json={'access_token': '123', 'token_type': 'bearer'})
+
+    async with create_http_client(transport=httpx.MockTransport(handler)) as http_client:
+        oauth_client.http_client = http_client
+        refresh_token = RefreshToken(token='xxx', client_id='client_id', scopes=[])
+        for _ in range(2):
+            token = await oauth_client.exchange_refresh_token(refresh_token=refresh_token, scopes=[])
+            assert token.access_token == '123'
+        token = await oauth_client.exchange_authorization_code(redirect_uri='https://localhost', code='xxx')
+        assert token.access_token == '123'
+
+        assert await OAuth2AuthorizationCodeClient.server_metadata_discovery(
+            base_url='https://example.com/mcp/', http_client=http_client
+        )
+        assert await OAuth2AuthorizationCodeClient.dynamic_client_registration(
+            registration_endpoint='https://example.com/register', redirect_uris=['http://localhost/'],
+            http_client=http_client
+        )
+
+        # The shared client stays open between requests.
+        assert not http_client.is_closed
+    assert len(requests) == 5
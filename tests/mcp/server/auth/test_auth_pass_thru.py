@@ -1,3 +1,4 @@
+import httpx
 import jwt
 import pydantic
 import pytest
@@ -79,3 +80,10 @@ async def test_auth_pass_thru_revoke_token(pass_thru_provider, mocker):
     # not implemented
     with pytest.raises(NotImplementedError):
         assert await pass_thru_provider.revoke_token(mocker.Mock()) is None
+
+
+async def test_auth_pass_thru_http_client(pass_thru_provider, client_info):
+    http_client = httpx.AsyncClient()
+    pass_thru_provider.http_client = http_client
+    assert pass_thru_provider._oauth(client_info).http_client is http_client
+    await http_client.aclose()
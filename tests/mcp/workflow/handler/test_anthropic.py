@@ -1,8 +1,13 @@
+import asyncio
+import types
+
 import pydantic
+import pytest
 
-from jotsu.mcp.types import Workflow
+from jotsu.mcp.types import Workflow, WorkflowNode, WorkflowRetry, WorkflowCircuitBreaker
 from jotsu.mcp.types.models import WorkflowAnthropicNode, WorkflowServer
-from jotsu.mcp.workflow import WorkflowEngine
+from jotsu.mcp.workflow import WorkflowEngine, MemoryCache
+from jotsu.mcp.workflow.retry import CircuitBreakers
 
 
 async def test_handler_anthropic(mocker):
@@ -38,6 +43,14 @@ async def test_handler_anthropic(mocker):
     assert 'content' in result
     assert result['claude'] == 'XXX\nYYY'
     anthropic_client_create.assert_called_once()
+    assert 'timeout' not in anthropic_client_create.call_args.kwargs
+
+    deadline = asyncio.get_running_loop().time() + 10
+    await engine.handler.handle_anthropic(
+        {'prompt': 'What?'},
+        action_id='x', workflow=workflow, node=node, usage=[], deadline=deadline
+    )
+    assert 0 < anthropic_client_create.call_args.kwargs['timeout'] <= 10
 
 
 async def test_handler_anthropic_schema(mocker):
@@ -121,3 +134,162 @@ async def test_handler_anthropic_servers(mocker):
     assert 'content' in result
     anthropic_client_create.assert_called_once()
     logger_warning.assert_called_once()
+
+
+class _MessageStream:
+    def __init__(self, events: list, message):
+        self._events = events
+        self._message = message
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *_args):
+        return False
+
+    async def __aiter__(self):
+        for event in self._events:
+            yield event
+
+    async def get_final_message(self):
+        return self._message
+
+
+async def test_handler_anthropic_stream(mocker):
+    from anthropic.types.beta.beta_message import BetaMessage
+    from anthropic.types.beta.beta_text_block import BetaTextBlock
+    from anthropic.types.beta.beta_tool_use_block import BetaToolUseBlock
+    from anthropic.types.beta.beta_usage import BetaUsage
+
+    message = BetaMessage(
+        id='1',
+        content=[
+            BetaTextBlock(text='XXX', type='text'),
+            BetaToolUseBlock(id='123', input={'foo': 'baz'}, name='structured_output', type='tool_use')
+        ],
+        model='claude', role='assistant', type='message',
+        usage=BetaUsage(input_tokens=0, output_tokens=0)
+    )
+    events = [
+        types.SimpleNamespace(type='text', text='XX'),
+        types.SimpleNamespace(type='text', text='X'),
+        types.SimpleNamespace(type='content_block_stop'),
+        types.SimpleNamespace(type='input_json', partial_json='{"foo": '),
+        types.SimpleNamespace(type='input_json', partial_json='"baz"}'),
+    ]
+
+    workflow = Workflow(id='workflow')
+    engine = WorkflowEngine([workflow])
+    anthropic_client = engine.handler.anthropic_client
+    anthropic_client_stream = mocker.patch.object(
+        anthropic_client.beta.messages, 'stream', return_value=_MessageStream(events, message)
+    )
+
+    node = WorkflowAnthropicNode(
+        id='a', name='claude', messages=[], model='claude-2', json_schema={'must_not_be_empty': True},
+        include_message_in_output=False, stream=True
+    )
+
+    deltas = []
+    result = await engine.handler.handle_anthropic(
+        {'prompt': 'What?'}, action_id='x', workflow=workflow, node=node, usage=[],
+        delta=lambda **fields: deltas.append(fields)
+    )
+    assert result['foo'] == 'baz'
+    assert deltas == [
+        {'text': 'XX'}, {'text': 'X'}, {'partial_json': '{"foo": '}, {'partial_json': '"baz"}'}
+    ]
+    anthropic_client_stream.assert_called_once()
+
+
+async def test_handler_anthropic_cache(mocker):
+    from anthropic.types.beta.beta_message import BetaMessage
+    from anthropic.types.beta.beta_text_block import BetaTextBlock
+    from anthropic.types.beta.beta_usage import BetaUsage
+
+    message = BetaMessage(
+        id='1', content=[BetaTextBlock(text='XXX', type='text')],
+        model='claude', role='assistant', type='message',
+        usage=BetaUsage(input_tokens=10, output_tokens=20)
+    )
+
+    workflow = Workflow(id='workflow', nodes=[
+        WorkflowAnthropicNode(
+            id='a', name='claude', model='claude-2', prompt='{{question}}', cache=True, edges=['result']
+        ),
+        WorkflowNode(id='result', type='result')
+    ])
+    engine = WorkflowEngine([workflow], model_cache=MemoryCache())
+    anthropic_client_create = mocker.patch.object(
+        engine.handler.anthropic_client.beta.messages, 'create', new_callable=mocker.AsyncMock, return_value=message
+    )
+
+    async def run(question: str):
+        actions = [x async for x in engine.run_workflow('workflow', {'question': question})]
+        return next(x for x in actions if x['action'] == 'node' and x['node']['id'] == 'a')
+
+    first = await run('What?')
+    second = await run('What?')
+    assert anthropic_client_create.call_count == 1
+    assert second['data']['claude'] == first['data']['claude'] == 'XXX'
+    assert first['usage'][0]['input_tokens'] == 10
+    assert first['usage'][0]['cached'] is False
+    assert second['usage'][0]['input_tokens'] == 0
+    assert second['usage'][0]['cached'] is True
+
+    # A different rendered prompt is a different request.
+    await run('Why?')
+    assert anthropic_client_create.call_count == 2
+
+    workflow.nodes[0].cache = False
+    await run('What?')
+    assert anthropic_client_create.call_count == 3
+
+
+async def test_handler_anthropic_retry(mocker):
+    import anthropic
+    import httpx
+    from anthropic.types.beta.beta_message import BetaMessage
+    from anthropic.types.beta.beta_text_block import BetaTextBlock
+    from anthropic.types.beta.beta_usage import BetaUsage
+
+    message = BetaMessage(
+        id='1', content=[BetaTextBlock(text='XXX', type='text')],
+        model='claude', role='assistant', type='message',
+        usage=BetaUsage(input_tokens=0, output_tokens=0)
+    )
+    error = anthropic.APIConnectionError(request=httpx.Request('POST', 'https://api.anthropic.com'))
+
+    workflow = Workflow(id='workflow')
+    engine = WorkflowEngine([workflow])
+    anthropic_client_create = mocker.patch.object(
+        engine.handler.anthropic_client.beta.messages, 'create', new_callable=mocker.AsyncMock
+    )
+    anthropic_client_create.side_effect = [error, message]
+
+    node = WorkflowAnthropicNode(
+        id='a', name='claude', messages=[], model='claude-2', retry=WorkflowRetry(backoff=0)
+    )
+    breakers = CircuitBreakers(WorkflowCircuitBreaker())
+    result = await engine.handler.handle_anthropic(
+        {'prompt': 'What?'}, action_id='x', workflow=workflow, node=node, usage=[], circuit_breakers=breakers
+    )
+    assert result['claude'] == 'XXX'
+    assert anthropic_client_create.call_count == 2
+    assert breakers.get('anthropic').state == 'closed'
+
+    # Not retried once output was streamed.
+    class _FailingStream(_MessageStream):
+        async def __aiter__(self):
+            yield types.SimpleNamespace(type='text', text='XX')
+            raise error
+
+    anthropic_client_stream = mocker.patch.object(
+        engine.handler.anthropic_client.beta.messages, 'stream', return_value=_FailingStream([], message)
+    )
+    node.stream = True
+    with pytest.raises(anthropic.APIConnectionError):
+        await engine.handler.handle_anthropic(
+            {'prompt': 'What?'}, action_id='x', workflow=workflow, node=node, usage=[], delta=lambda **_: None
+        )
+    anthropic_client_stream.assert_called_once()
@@ -1,6 +1,8 @@
+import asyncio
+
 from jotsu.mcp.types import Workflow
 from jotsu.mcp.types.models import WorkflowCloudflareNode
-from jotsu.mcp.workflow import WorkflowEngine
+from jotsu.mcp.workflow import WorkflowEngine, MemoryCache
 
 
 async def test_handler_cloudflare(mocker):
@@ -29,6 +31,14 @@ async def test_handler_cloudflare(mocker):
     )
     assert result['baz'] == 'xxx'
     cloudflare_client_run.assert_called_once()
+    assert 'timeout' not in cloudflare_client_run.call_args.kwargs
+
+    deadline = asyncio.get_running_loop().time() + 10
+    await engine.handler.handle_cloudflare(
+        {'prompt': 'What?'},
+        action_id='x', workflow=workflow, node=node, usage=[], deadline=deadline
+    )
+    assert 0 < cloudflare_client_run.call_args.kwargs['timeout'] <= 10
 
 
 async def test_handler_cloudflare_schema(mocker):
@@ -56,3 +66,94 @@ async def test_handler_cloudflare_schema(mocker):
     )
     assert result['foo'] == 'baz'
     cloudflare_client_run.assert_called_once()
+
+
+class _StreamedResponse:
+    def __init__(self, lines: list):
+        self._lines = lines
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *_args):
+        return False
+
+    async def iter_lines(self):
+        for line in self._lines:
+            yield line
+
+
+async def test_handler_cloudflare_stream(mocker):
+    workflow = Workflow(id='workflow')
+    engine = WorkflowEngine([workflow])
+
+    cloudflare_client = engine.handler.cloudflare_client
+    cloudflare_client_run = mocker.patch.object(
+        cloudflare_client.ai.with_streaming_response, 'run', return_value=_StreamedResponse([
+            'data: {"response": "x"}',
+            '',
+            'data: {"response": "xx"}',
+            'data: {"response": "", "usage": {"prompt_tokens": 1, "completion_tokens": 2}}',
+            'data: [DONE]',
+        ])
+    )
+
+    node = WorkflowCloudflareNode(
+        id='a', name='cf', messages=[], model='meta', member='baz', stream=True
+    )
+
+    deltas = []
+    usage = []
+    result = await engine.handler.handle_cloudflare(
+        {'prompt': 'What?'}, action_id='x', workflow=workflow, node=node, usage=usage,
+        delta=lambda **fields: deltas.append(fields)
+    )
+    assert result['baz'] == 'xxx'
+    assert deltas == [{'text': 'x'}, {'text': 'xx'}]
+    assert usage[0].model_extra == {'prompt_tokens': 1, 'completion_tokens': 2}
+    assert cloudflare_client_run.call_args.kwargs['stream'] is True
+
+
+async def test_handler_cloudflare_stream_schema(mocker):
+    workflow = Workflow(id='workflow')
+    engine = WorkflowEngine([workflow])
+
+    cloudflare_client = engine.handler.cloudflare_client
+    mocker.patch.object(
+        cloudflare_client.ai.with_streaming_response, 'run', return_value=_StreamedResponse([
+            'data: {"response": "{\\"foo\\": "}',
+            'data: {"response": "\\"baz\\"}"}',
+        ])
+    )
+
+    node = WorkflowCloudflareNode(id='a', name='cf', messages=[], model='meta', use_json_schema=True, stream=True)
+
+    deltas = []
+    result = await engine.handler.handle_cloudflare(
+        {}, action_id='x', workflow=workflow, node=node, usage=[], delta=lambda **fields: deltas.append(fields)
+    )
+    assert result['foo'] == 'baz'
+    assert deltas == [{'partial_json': '{"foo": '}, {'partial_json': '"baz"}'}]
+
+
+async def test_handler_cloudflare_cache(mocker):
+    workflow = Workflow(id='workflow')
+    engine = WorkflowEngine([workflow])
+    cloudflare_client_run = mocker.patch.object(
+        engine.handler.cloudflare_client.ai, 'run', new_callable=mocker.AsyncMock,
+        return_value={'response': 'xxx', 'usage': {'input_tokens': 1, 'output_tokens': 2}}
+    )
+
+    cache = MemoryCache()
+    node = WorkflowCloudflareNode(id='a', name='cf', messages=[], model='meta', cache=True)
+    usages = []
+    for _ in range(2):
+        usage = []
+        result = await engine.handler.handle_cloudflare(
+            {'prompt': 'What?'}, action_id='x', workflow=workflow, node=node, usage=usage, model_cache=cache
+        )
+        assert result['cf'] == 'xxx'
+        usages.extend(usage)
+
+    cloudflare_client_run.assert_called_once()
+    assert [(x.output_tokens, x.cached) for x in usages] == [(2, False), (0, True)]
@@ -137,6 +137,12 @@ async def test_handler_function_empty():
     assert [x.model_dump() for x in results] == []
 
 
+def test_handler_function_prepare():
+    engine = WorkflowEngine([])
+    handler = WorkflowHandler(engine=engine)
+    handler.prepare_function(WorkflowFunctionNode(id='1', name='test-function', function='return data'))
+
+
 async def test_handler_transform_move():
     engine = WorkflowEngine([])
 
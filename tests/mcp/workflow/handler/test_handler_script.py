@@ -1,6 +1,10 @@
+import pytest
+import quickjs
+
 from jotsu.mcp.types.models import WorkflowScriptNode
 from jotsu.mcp.workflow import WorkflowEngine
 from jotsu.mcp.workflow.handler import WorkflowHandler
+from jotsu.mcp.workflow.utils import ScriptContextPool
 
 
 async def test_handler_script():
@@ -91,3 +95,74 @@ async def test_handler_script_no_edges():
     results = await handler.handle_script({'x': {'y': 3}}, node=node)
 
     assert [x.model_dump() for x in results] == []
+
+
+def test_script_pool():
+    pool = ScriptContextPool(size=1, time_limit=0.1, memory_limit=8 * 1024 * 1024)
+    node = WorkflowScriptNode(id='1', name='test-script', script='')
+
+    pool.compile('data.x += 1;')
+    assert pool.call('data.x += 1;', {'x': 1}, node.model_dump_json()) == '{"x":2}'
+    assert pool.call('return __node;', {}, node.model_dump_json()) == node.model_dump_json()
+    assert len(pool._idle) == 1
+    assert pool._idle[0].functions.info().hits == 1
+
+    with pytest.raises(quickjs.JSException):
+        pool.call('while (true) {}', {}, '{}')
+    assert len(pool._idle) == 0
+
+    with pytest.raises(quickjs.JSException):
+        pool.call('const a = []; while (true) { a.push("x" + a.length); }', {}, '{}')
+    assert pool.call('return {y: 1};', {}, '{}') == '{"y":1}'
+
+    with pytest.raises(quickjs.JSException):
+        pool.compile('return (;')
+
+    pool.clear()
+    assert len(pool._idle) == 0
+
+
+def test_script_pool_globals():
+    pool = ScriptContextPool(size=1)
+
+    # Nothing a call leaves behind is seen by the next one, which may be another run.
+    leak = 'globalThis.stash = data.secret; globalThis.JSON = {stringify: () => data.secret};'
+    assert pool.call(leak, {'secret': 'tenantA'}, '{}') == '{"secret":"tenantA"}'
+    read = 'return {leak: [typeof stash, ({}).proto, Math.max(1, 2)]};'
+    assert pool.call(read, {}, '{}') == '{"leak":["undefined",null,2]}'
+    assert len(pool._idle) == 1
+
+    # Built-in objects can't be changed at all.
+    for script in (
+            'Object.prototype.proto = data.secret;', 'Math.max = () => data.secret;',
+            'Object.getPrototypeOf([].values()).stash = data.secret;'
+    ):
+        with pytest.raises(quickjs.JSException):
+            pool.call(script, {'secret': 'tenantA'}, '{}')
+    assert pool.call(read, {}, '{}') == '{"leak":["undefined",null,2]}'
+
+    # Script functions can't keep state either.
+    with pytest.raises(quickjs.JSException):
+        pool.call('__user.stash = data.secret;', {'secret': 'tenantA'}, '{}')
+
+    # Globals which can't be removed, the context is dropped instead.
+    pool.call(read, {}, '{}')
+    context = pool._idle[0]
+    pool.call('Object.defineProperty(globalThis, "stash", {value: data.secret});', {'secret': 'tenantA'}, '{}')
+    assert pool._idle == []
+    assert pool.call(read, {}, '{}') == '{"leak":["undefined",null,2]}'
+    assert pool._idle[0] is not context
+
+
+def test_script_pool_compile():
+    pool = ScriptContextPool(size=3)
+    pool.compile('return data;')
+    # Every context of the pool has the script.
+    assert len(pool._idle) == 3
+    assert all(x.functions.get('return data;') is not None for x in pool._idle)
+
+
+def test_handler_script_prepare():
+    engine = WorkflowEngine([])
+    handler = WorkflowHandler(engine=engine)
+    handler.prepare_script(WorkflowScriptNode(id='1', name='test-script', script='return data;'))
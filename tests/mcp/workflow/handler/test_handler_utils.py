@@ -1,3 +1,4 @@
+import asyncio
 from datetime import datetime, timezone
 from zoneinfo import ZoneInfo
 
@@ -14,6 +15,8 @@ def test_update_data_from_json(mocker):
 
 def test_is_result_or_complete_node():
     assert utils.is_result_or_complete_node({}) is False
+    assert utils.is_result_or_complete_node({'node': {'type': 'other'}}) is False
+    assert utils.is_result_or_complete_node({'node': {'type': 'result'}}) is True
 
 
 def test_get_messages():
@@ -69,3 +72,31 @@ def test_jsonata_value_to_tz_naive_datetime_raises():
 
     with pytest.raises(ValueError, match='datetime must be timezone-aware'):
         utils.jsonata_value({}, expr)
+
+
+def test_jsonata_value_cached():
+    utils.jsonata_cache.clear()
+
+    assert utils.jsonata_value({'a': 1}, 'a + 1') == 2
+    assert utils.jsonata_value({'a': 2}, 'a + 1') == 3
+
+    info = utils.jsonata_cache.info()
+    assert info.misses == 1
+    assert info.hits == 1
+    assert info.currsize == 1
+
+
+def test_jsonata_value_cache_does_not_hold_data():
+    data = {'a': 1}
+    utils.jsonata_value(data, 'a')
+    assert utils.jsonata_compile('a').environment.lookup('$') is None
+
+
+async def test_deadline_kwargs():
+    assert utils.remaining(None) is None
+    assert utils.deadline_kwargs(None) == {}
+
+    loop = asyncio.get_running_loop()
+    assert 0 < utils.deadline_kwargs(loop.time() + 10)['timeout'] <= 10
+    # Never negative once the deadline passed.
+    assert utils.remaining(loop.time() - 1) == 0.0
@@ -1,8 +1,14 @@
+import asyncio
 import os
+import types
 
-from jotsu.mcp.types import Workflow
-from jotsu.mcp.types.models import WorkflowOpenAINode
-from jotsu.mcp.workflow import WorkflowEngine
+import pytest
+
+from jotsu.mcp.types import JotsuException, Workflow
+from jotsu.mcp.types.models import WorkflowOpenAINode, WorkflowRetry, WorkflowCircuitBreaker
+from jotsu.mcp.workflow import WorkflowEngine, MemoryCache
+from jotsu.mcp.workflow.handler.openai import ResponseFailedError
+from jotsu.mcp.workflow.retry import CircuitBreakers
 
 
 async def test_handler_openai(mocker):
@@ -50,6 +56,14 @@ async def test_handler_openai(mocker):
     )
     assert result['baz'] == 'xxx'
     openai_client_create.assert_called_once()
+    assert 'timeout' not in openai_client_create.call_args.kwargs
+
+    deadline = asyncio.get_running_loop().time() + 10
+    await engine.handler.handle_openai(
+        {'prompt': 'What?'},
+        action_id='x', workflow=workflow, node=node, usage=[], deadline=deadline
+    )
+    assert 0 < openai_client_create.call_args.kwargs['timeout'] <= 10
     os.environ.pop('OPENAI_API_KEY')
 
 
@@ -98,3 +112,147 @@ async def test_handler_openai_schema(mocker):
     assert result['foo'] == 'baz'
     openai_client_create.assert_called_once()
     os.environ.pop('OPENAI_API_KEY')
+
+
+async def _events(*events):
+    for event in events:
+        yield event
+
+
+async def test_handler_openai_stream(mocker):
+    from openai.types.responses import Response, ResponseError, ResponseOutputMessage, ResponseOutputText
+
+    os.environ['OPENAI_API_KEY'] = 'sk_key'
+
+    content = ResponseOutputText(type='output_text', text='{"foo": "baz"}', annotations=[])
+    output = ResponseOutputMessage(id='a', type='message', role='assistant', content=[content], status='completed')
+    response = Response(
+        id='1', model='gpt-5', object='response', output=[output],
+        parallel_tool_calls=False, tool_choice='none', tools=[], created_at=0
+    )
+
+    workflow = Workflow(id='workflow')
+    engine = WorkflowEngine([workflow])
+
+    openai_client = engine.handler.openai_client
+    openai_client_create = mocker.patch.object(
+        openai_client.responses, 'create', new_callable=mocker.AsyncMock
+    )
+    openai_client_create.return_value = _events(
+        types.SimpleNamespace(type='response.created'),
+        types.SimpleNamespace(type='response.output_text.delta', delta='{"foo": '),
+        types.SimpleNamespace(type='response.output_text.delta', delta='"baz"}'),
+        types.SimpleNamespace(type='response.completed', response=response),
+    )
+
+    node = WorkflowOpenAINode(
+        id='a', name='chatgpt', messages=[], model='gpt-5',
+        json_schema={'properties': {}}, include_message_in_output=False, stream=True
+    )
+
+    deltas = []
+    result = await engine.handler.handle_openai(
+        {}, action_id='x', workflow=workflow, node=node, usage=[], delta=lambda **fields: deltas.append(fields)
+    )
+    assert result['foo'] == 'baz'
+    assert deltas == [{'partial_json': '{"foo": '}, {'partial_json': '"baz"}'}]
+    assert openai_client_create.call_args.kwargs['stream'] is True
+
+    # Text output and a stream which ends early.
+    openai_client_create.return_value = _events(
+        types.SimpleNamespace(type='response.output_text.delta', delta='xxx'),
+    )
+    node = WorkflowOpenAINode(id='a', name='chatgpt', messages=[], model='gpt-5', stream=True)
+
+    deltas = []
+    with pytest.raises(JotsuException):
+        await engine.handler.handle_openai(
+            {}, action_id='x', workflow=workflow, node=node, usage=[], delta=lambda **fields: deltas.append(fields)
+        )
+    assert deltas == [{'text': 'xxx'}]
+
+    # A failed response is an error, not the output of the node.
+    failed = response.model_copy(update={
+        'status': 'failed', 'error': ResponseError(code='server_error', message='Oops')
+    })
+    for res in (failed, response.model_copy(update={'status': 'failed'})):
+        openai_client_create.return_value = _events(types.SimpleNamespace(type='response.failed', response=res))
+        with pytest.raises(ResponseFailedError, match='failed'):
+            await engine.handler.handle_openai({}, action_id='x', workflow=workflow, node=node, usage=[], delta=len)
+    os.environ.pop('OPENAI_API_KEY')
+
+
+async def test_handler_openai_failed(mocker):
+    from openai.types.responses import Response, ResponseError
+
+    os.environ['OPENAI_API_KEY'] = 'sk_key'
+    response = Response(
+        id='1', model='gpt-5', object='response', output=[], parallel_tool_calls=False, tool_choice='none',
+        tools=[], created_at=0, status='failed', error=ResponseError(code='server_error', message='Oops')
+    )
+
+    workflow = Workflow(id='workflow')
+    engine = WorkflowEngine([workflow])
+    openai_client_create = mocker.patch.object(
+        engine.handler.openai_client.responses, 'create', new_callable=mocker.AsyncMock, return_value=response
+    )
+    breakers = CircuitBreakers(WorkflowCircuitBreaker(failure_threshold=5))
+    node = WorkflowOpenAINode(
+        id='a', name='chatgpt', messages=[], model='gpt-5', retry=WorkflowRetry(max_attempts=2, backoff=0)
+    )
+
+    # Transient, i.e. retried and counted by the circuit breaker.
+    with pytest.raises(ResponseFailedError, match='server_error: Oops'):
+        await engine.handler.handle_openai(
+            {}, action_id='x', workflow=workflow, node=node, usage=[], circuit_breakers=breakers
+        )
+    assert openai_client_create.call_count == 2
+    assert breakers.get('openai')._failures == 2
+    os.environ.pop('OPENAI_API_KEY')
+
+
+async def test_handler_openai_cache(mocker):
+    from openai.types.responses import Response, ResponseOutputMessage, ResponseOutputText
+
+    os.environ['OPENAI_API_KEY'] = 'sk_key'
+
+    content = ResponseOutputText(type='output_text', text='xxx', annotations=[])
+    output = ResponseOutputMessage(id='a', type='message', role='assistant', content=[content], status='completed')
+    response = Response(
+        id='1', model='gpt-5', object='response', output=[output],
+        parallel_tool_calls=False, tool_choice='none', tools=[], created_at=0, status='completed'
+    )
+
+    workflow = Workflow(id='workflow')
+    engine = WorkflowEngine([workflow])
+    openai_client_create = mocker.patch.object(
+        engine.handler.openai_client.responses, 'create', new_callable=mocker.AsyncMock, return_value=response
+    )
+
+    cache = MemoryCache()
+    node = WorkflowOpenAINode(id='a', name='chatgpt', messages=[], model='gpt-5', cache=True, cache_ttl=60)
+
+    async def call():
+        usage = []
+        result = await engine.handler.handle_openai(
+            {'prompt': 'What?'}, action_id='x', workflow=workflow, node=node, usage=usage, model_cache=cache
+        )
+        assert result['chatgpt'] == 'xxx'
+        return usage
+
+    # Incomplete responses aren't cached.
+    openai_client_create.return_value = response.model_copy(update={'status': 'incomplete'})
+    await call()
+    assert openai_client_create.call_count == 1
+
+    openai_client_create.return_value = response
+    await call()
+    usage = await call()
+    assert openai_client_create.call_count == 2
+    assert usage[0].cached
+
+    # Off by default.
+    node = WorkflowOpenAINode(id='a', name='chatgpt', messages=[], model='gpt-5')
+    await call()
+    assert openai_client_create.call_count == 3
+    os.environ.pop('OPENAI_API_KEY')
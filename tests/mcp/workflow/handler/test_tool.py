@@ -1,11 +1,17 @@
+import asyncio
+import json
+import time
+
 import pytest
 
-from mcp.types import TextContent, ImageContent, CallToolResult, Tool
+from mcp.types import TextContent, ImageContent, CallToolResult, Tool, ToolAnnotations
 
-from jotsu.mcp.types import WorkflowToolNode, WorkflowServer
+from jotsu.mcp.types import WorkflowToolNode, WorkflowServer, WorkflowRetry, WorkflowCircuitBreaker
+from jotsu.mcp.local.cache import AsyncMemoryCache
 from jotsu.mcp.types.exceptions import JotsuException
-from jotsu.mcp.workflow import WorkflowEngine
+from jotsu.mcp.workflow import WorkflowEngine, MemoryCache
 from jotsu.mcp.workflow.handler import WorkflowHandler
+from jotsu.mcp.workflow.retry import CircuitBreakers, CircuitOpenError
 
 
 async def test_handler_tool(mocker):
@@ -24,7 +30,7 @@ async def test_handler_tool(mocker):
 
     handler = WorkflowHandler(engine=engine)
     session = mocker.AsyncMock()
-    session.list_tools.return_value = mocker.Mock(tools=[Tool(name='test_tool', inputSchema=input_schema)])
+    session.find_tool.return_value = Tool(name='test_tool', inputSchema=input_schema)
     session.call_tool.return_value = CallToolResult(isError=False, content=[TextContent(type='text', text='xxx')])
 
     sessions = mocker.AsyncMock()
@@ -34,6 +40,12 @@ async def test_handler_tool(mocker):
     res = [x async for x in handler.handle_tool({'name': 'foo'}, sessions=sessions, node=node)]
     assert res == []
     session.call_tool.assert_called_once()
+    assert session.call_tool.call_args.kwargs['read_timeout_seconds'] is None
+
+    # The tool call may take the time the node has left.
+    deadline = asyncio.get_running_loop().time() + 10
+    _ = [x async for x in handler.handle_tool({'name': 'foo'}, sessions=sessions, node=node, deadline=deadline)]
+    assert 0 < session.call_tool.call_args.kwargs['read_timeout_seconds'].total_seconds() <= 10
 
 
 async def test_handler_tool_structured_content(mocker):
@@ -42,7 +54,7 @@ async def test_handler_tool_structured_content(mocker):
 
     handler = WorkflowHandler(engine=engine)
     session = mocker.AsyncMock()
-    session.list_tools.return_value = mocker.Mock(tools=[Tool(name='test_tool', inputSchema={})])
+    session.find_tool.return_value = Tool(name='test_tool', inputSchema={})
 
     call_tool_result = CallToolResult(
         isError=False, content=[TextContent(type='text', text='{"a": "b"}')]
@@ -67,7 +79,7 @@ async def test_handler_tool_structured_content_member(mocker):
 
     handler = WorkflowHandler(engine=engine)
     session = mocker.AsyncMock()
-    session.list_tools.return_value = mocker.Mock(tools=[Tool(name='test_tool', inputSchema={})])
+    session.find_tool.return_value = Tool(name='test_tool', inputSchema={})
 
     call_tool_result = CallToolResult(
         isError=False, content=[TextContent(type='text', text='{"a": "b"}')]
@@ -100,7 +112,7 @@ async def test_handler_tool_schema_validation_error(mocker):
 
     handler = WorkflowHandler(engine=engine)
     session = mocker.AsyncMock()
-    session.list_tools.return_value = mocker.Mock(tools=[Tool(name='test_tool', inputSchema=input_schema)])
+    session.find_tool.return_value = Tool(name='test_tool', inputSchema=input_schema)
 
     sessions = mocker.AsyncMock()
     sessions.workflow.servers = [WorkflowServer.model_create(id='test', url='https://testserver/mcp/')]
@@ -117,7 +129,7 @@ async def test_handler_tool_error(mocker):
 
     handler = WorkflowHandler(engine=engine)
     session = mocker.AsyncMock()
-    session.list_tools.return_value = mocker.Mock(tools=[Tool(name='test_tool', inputSchema={})])
+    session.find_tool.return_value = Tool(name='test_tool', inputSchema={})
     session.call_tool.return_value = CallToolResult(isError=True, content=[TextContent(type='text', text='error?')])
 
     sessions = mocker.AsyncMock()
@@ -135,7 +147,7 @@ async def test_handler_tool_get_none(mocker):
 
     handler = WorkflowHandler(engine=engine)
     session = mocker.AsyncMock()
-    session.list_tools.return_value = mocker.Mock(tools=[])
+    session.find_tool.return_value = None
 
     sessions = mocker.AsyncMock()
     sessions.workflow.servers = [WorkflowServer.model_create(id='test', url='https://testserver/mcp/')]
@@ -155,7 +167,7 @@ async def test_handler_tool_bad_type(mocker):
     content = ImageContent(type='image', data='xxx', mimeType='image/png')
 
     session = mocker.AsyncMock()
-    session.list_tools.return_value = mocker.Mock(tools=[Tool(name='test_tool', inputSchema={})])
+    session.find_tool.return_value = Tool(name='test_tool', inputSchema={})
     session.call_tool.return_value = CallToolResult(isError=False, content=[content])
 
     sessions = mocker.AsyncMock()
@@ -189,7 +201,7 @@ async def test_handler_tool_structured_output(mocker):
 
     handler = WorkflowHandler(engine=engine)
     session = mocker.AsyncMock()
-    session.list_tools.return_value = mocker.Mock(tools=[Tool(name='test_tool', inputSchema=input_schema)])
+    session.find_tool.return_value = Tool(name='test_tool', inputSchema=input_schema)
     session.call_tool.return_value = CallToolResult(
         isError=False, content=[TextContent(type='text', text='[{"foo": "baz"}]')]
     )
@@ -201,3 +213,152 @@ async def test_handler_tool_structured_output(mocker):
     res = [x async for x in handler.handle_tool({'name': 'test'}, sessions=sessions, node=node)]
     assert len(res) == 1
     assert res[0].data == {'name': 'test', 'foo': 'baz'}
+
+
+async def test_handler_tool_cache(mocker):
+    engine = WorkflowEngine([])
+    handler = WorkflowHandler(engine=engine)
+
+    input_schema = {'type': 'object', 'properties': {'name': {'type': 'string'}}}
+    session = mocker.AsyncMock()
+    session.find_tool.return_value = Tool(
+        name='test_tool', inputSchema=input_schema, annotations=ToolAnnotations(readOnlyHint=True)
+    )
+    session.call_tool.return_value = CallToolResult(isError=False, content=[TextContent(type='text', text='xxx')])
+
+    sessions = mocker.AsyncMock()
+    sessions.get_session.return_value = session
+    servers = {'test': WorkflowServer.model_create(id='test', url='https://testserver/mcp/')}
+
+    cache = MemoryCache()
+
+    async def call(node: WorkflowToolNode, data: dict):
+        res = [
+            x async for x in handler.handle_tool(data, sessions=sessions, node=node, servers=servers, tool_cache=cache)
+        ]
+        assert res[0].data['test_tool'] == 'xxx'
+
+    node = WorkflowToolNode(id='1', name='test-tool', tool_name='test_tool', server_id='test', edges=['2'])
+    await call(node, {'name': 'foo'})
+    await call(node, {'name': 'foo'})
+    assert session.call_tool.call_count == 1
+
+    # Different arguments, or the same server id with another URL.
+    await call(node, {'name': 'bar'})
+    assert session.call_tool.call_count == 2
+    servers['test'] = WorkflowServer.model_create(id='test', url='https://otherserver/mcp/')
+    await call(node, {'name': 'foo'})
+    assert session.call_tool.call_count == 3
+
+    # Opt-out, even though the tool is read-only.
+    node.cache = False
+    await call(node, {'name': 'foo'})
+    assert session.call_tool.call_count == 4
+
+    # Tools which aren't annotated are only cached when the node says so.
+    session.find_tool.return_value = Tool(name='test_tool', inputSchema=input_schema)
+    node = WorkflowToolNode(
+        id='2', name='test-tool', tool_name='test_tool', url='https://testserver/mcp/', edges=['3']
+    )
+    await call(node, {'name': 'foo'})
+    await call(node, {'name': 'foo'})
+    assert session.call_tool.call_count == 6
+
+    node.cache = True
+    await call(node, {'name': 'foo'})
+    await call(node, {'name': 'foo'})
+    assert session.call_tool.call_count == 7
+
+
+async def test_handler_tool_cache_server(mocker):
+    # Any cache of the MCP server, e.g. one backed by Redis, holds the results as JSON text.
+    handler = WorkflowHandler(engine=WorkflowEngine([]))
+    node = WorkflowToolNode(
+        id='1', name='test-tool', tool_name='test_tool', server_id='test', cache=True, edges=['2']
+    )
+
+    session = mocker.AsyncMock()
+    session.find_tool.return_value = Tool(name='test_tool', inputSchema={})
+    session.call_tool.return_value = CallToolResult(isError=False, content=[TextContent(type='text', text='xxx')])
+    sessions = mocker.AsyncMock()
+    sessions.get_session.return_value = session
+
+    cache = AsyncMemoryCache()
+    for _ in range(2):
+        res = [x async for x in handler.handle_tool({}, sessions=sessions, node=node, tool_cache=cache)]
+        assert res[0].data['test_tool'] == 'xxx'
+    assert session.call_tool.call_count == 1
+    assert json.loads(next(iter(cache.cache.values())))['content'][0]['text'] == 'xxx'
+
+
+async def test_handler_tool_cache_error(mocker):
+    engine = WorkflowEngine([])
+    handler = WorkflowHandler(engine=engine)
+    node = WorkflowToolNode(id='1', name='test-tool', tool_name='test_tool', server_id='test', cache=True)
+
+    session = mocker.AsyncMock()
+    session.find_tool.return_value = Tool(name='test_tool', inputSchema={})
+    session.call_tool.return_value = CallToolResult(isError=True, content=[TextContent(type='text', text='xxx')])
+    sessions = mocker.AsyncMock()
+    sessions.get_session.return_value = session
+
+    cache = MemoryCache()
+    for _ in range(2):
+        with pytest.raises(JotsuException):
+            async for _ in handler.handle_tool({}, sessions=sessions, node=node, tool_cache=cache):
+                ...
+    # Errors aren't cached.
+    assert session.call_tool.call_count == 2
+
+
+async def test_handler_tool_retry(mocker):
+    engine = WorkflowEngine([])
+    node = WorkflowToolNode(id='1', name='test-tool', tool_name='test_tool', type='tool', server_id='test')
+    server = WorkflowServer.model_create(
+        id='test', url='https://testserver/mcp/', retry=WorkflowRetry(backoff=0),
+        circuit_breaker=WorkflowCircuitBreaker(failure_threshold=2)
+    )
+
+    handler = WorkflowHandler(engine=engine)
+    session = mocker.AsyncMock()
+    session.find_tool.return_value = Tool(name='test_tool', inputSchema={})
+    session.call_tool.side_effect = [
+        ConnectionError('reset'), CallToolResult(isError=False, content=[TextContent(type='text', text='xxx')])
+    ]
+
+    sessions = mocker.AsyncMock()
+    sessions.get_session.return_value = session
+
+    breakers = CircuitBreakers()
+    kwargs = dict(sessions=sessions, node=node, servers={'test': server}, circuit_breakers=breakers)
+    res = await handler._handle_tool({}, **kwargs)
+    assert res == {'test_tool': 'xxx'}
+    assert session.call_tool.call_count == 2
+    # The retry doesn't use the session whose call failed.
+    sessions.discard.assert_awaited_once_with('test')
+    assert sessions.get_session.await_count == 2
+
+    # The server keeps failing, its circuit opens and later calls fail without calling it.
+    session.call_tool.reset_mock(side_effect=True)
+    session.call_tool.side_effect = ConnectionError('reset')
+    with pytest.raises(CircuitOpenError):
+        await handler._handle_tool({}, **kwargs)
+    assert session.call_tool.call_count == 2
+    assert breakers.get('https://testserver/mcp/', server.circuit_breaker).state == 'open'
+
+    # Schema validation fails before the server is called, the half-open circuit stays that way.
+    mocker.patch('jotsu.mcp.workflow.retry.monotonic', return_value=time.monotonic() + 60)
+    session.find_tool.return_value = Tool(
+        name='test_tool', inputSchema={'type': 'object', 'required': ['x'], 'properties': {'x': {'type': 'string'}}}
+    )
+    with pytest.raises(JotsuException):
+        await handler._handle_tool({}, **kwargs)
+    assert breakers.get('https://testserver/mcp/', server.circuit_breaker).state == 'half-open'
+    session.find_tool.return_value = Tool(name='test_tool', inputSchema={})
+
+    # The node setting overrides the server.
+    node.retry = WorkflowRetry(max_attempts=1)
+    breakers = CircuitBreakers()
+    with pytest.raises(ConnectionError):
+        await handler._handle_tool({}, **{**kwargs, 'circuit_breakers': breakers})
+    assert session.call_tool.call_count == 3
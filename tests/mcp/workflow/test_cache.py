@@ -0,0 +1,106 @@
+import os
+
+from jotsu.mcp.server import AsyncCache
+from jotsu.mcp.workflow.cache import LRUCache, MemoryCache, FileCache, cache_key
+
+
+def test_lru_cache():
+    cache = LRUCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+
+    # 'b' is now the least recently used.
+    cache.set('c', 3)
+    assert 'b' not in cache
+    assert cache.get('b') is None
+    assert len(cache) == 2
+
+    info = cache.info()
+    assert info.hits == 1
+    assert info.misses == 1
+    assert info.maxsize == 2
+    assert info.currsize == 2
+
+
+def test_lru_cache_resize():
+    cache = LRUCache(maxsize=3)
+    for key in 'abc':
+        cache.set(key, key)
+
+    cache.resize(1)
+    assert cache.maxsize == 1
+    assert 'c' in cache
+    assert len(cache) == 1
+
+    cache.delete('c')
+    cache.delete('c')
+    assert len(cache) == 0
+
+
+def test_lru_cache_disabled():
+    cache = LRUCache(maxsize=0)
+    cache.set('a', 1)
+    assert cache.get('a', 'default') == 'default'
+
+
+def test_lru_cache_clear():
+    cache = LRUCache()
+    cache.set('a', 1)
+    cache.get('a')
+    cache.clear()
+    assert cache.info() == (0, 0, 128, 0)
+
+
+async def test_memory_cache(mocker):
+    monotonic = mocker.patch('jotsu.mcp.workflow.cache.time.monotonic', return_value=0)
+    cache = MemoryCache(maxsize=2, expires_in=10)
+    assert isinstance(cache, AsyncCache)
+
+    await cache.set('a', '{"a": [1]}')
+    assert await cache.get('a') == '{"a": [1]}'
+
+    await cache.set('b', 'b', expires_in=20)
+    monotonic.return_value = 10
+    assert await cache.get('a') is None
+    assert await cache.get('b') == 'b'
+    assert cache.info().currsize == 1
+
+    await cache.delete('b')
+    assert await cache.get('b') is None
+    await cache.set('c', 'c')
+    cache.clear()
+    assert cache.info().currsize == 0
+
+
+async def test_file_cache(tmp_path, mocker):
+    now = mocker.patch('jotsu.mcp.workflow.cache.time.time', return_value=0)
+    directory = tmp_path / 'cache'
+    cache = FileCache(directory, expires_in=10)
+
+    assert await cache.get('a') is None
+    await cache.set('a', '{"a": 1}')
+    await cache.set('b', 'b', expires_in=None)
+    await cache.set('c', 'c', expires_in=20)
+    assert await cache.get('a') == '{"a": 1}'
+    assert len(os.listdir(directory)) == 3
+
+    # Another instance, e.g. in another process, sees the same entries.
+    other = FileCache(directory)
+    now.return_value = 15
+    assert await other.get('a') is None
+    assert await other.get('c') == 'c'
+    assert len(os.listdir(directory)) == 2
+
+    await other.delete('c')
+    await other.delete('c')
+    assert await cache.get('c') is None
+
+    (directory / os.listdir(directory)[0]).write_text('{')
+    assert await cache.get('b') is None
+
+
+def test_cache_key():
+    assert cache_key('x', {'a': 1, 'b': 2}) == cache_key('x', {'b': 2, 'a': 1})
+    assert cache_key('x', {'a': 1}) != cache_key('y', {'a': 1})
+    assert cache_key('x', {'a': 1}).startswith('x:')
@@ -0,0 +1,265 @@
+import collections
+import os
+
+import pytest
+
+from jotsu.mcp.types import Workflow, WorkflowNode, WorkflowConcurrency
+from jotsu.mcp.types.models import WorkflowLoopNode, WorkflowModelUsage
+from jotsu.mcp.workflow import WorkflowEngine
+from jotsu.mcp.workflow.checkpoint import (
+    MemoryCheckpointStore, FileCheckpointStore, SQLiteCheckpointStore, WorkflowRunCheckpoint
+)
+from jotsu.mcp.workflow.handler import WorkflowHandler
+
+
+class Handler(WorkflowHandler):
+    calls = collections.Counter()
+    # Nodes which fail the next time they run.
+    failing = set()
+
+    @classmethod
+    async def handle_count(cls, data: dict, *, node: WorkflowNode, usage: list, **_kwargs) -> dict:
+        cls.calls[node.id] += 1
+        if node.id in cls.failing:
+            cls.failing.discard(node.id)
+            raise ValueError('fail')
+        usage.append(WorkflowModelUsage(ref_id=node.id, model='model', input_tokens=1))
+        return {**data, node.id: data.get(node.id, 0) + 1}
+
+    @classmethod
+    async def handle_item(cls, data: dict, **_kwargs) -> dict:
+        cls.calls[data['item']] += 1
+        if data['item'] in cls.failing:
+            cls.failing.discard(data['item'])
+            raise ValueError('fail')
+        return data
+
+
+@pytest.fixture(params=['memory', 'file', 'sqlite'])
+def store(request, tmp_path):
+    match request.param:
+        case 'memory':
+            yield MemoryCheckpointStore()
+        case 'file':
+            yield FileCheckpointStore(tmp_path / 'checkpoints')
+        case _:
+            store = SQLiteCheckpointStore(tmp_path / 'checkpoints.db')
+            yield store
+            store.close()
+
+
+@pytest.fixture(autouse=True)
+def reset():
+    Handler.calls.clear()
+    Handler.failing.clear()
+
+
+async def test_checkpoint_store(store):
+    assert await store.load('run') is None
+
+    await store.begin('run', 'workflow', {'x': 1})
+    await store.append('run', 'a', {'result': {'edge': 'b', 'data': {}}})
+    await store.append('run', 'b', {'done': True})
+
+    checkpoint = await store.load('run')
+    assert checkpoint.run_id == 'run'
+    assert checkpoint.workflow_id == 'workflow'
+    assert checkpoint.data == {'x': 1}
+    assert checkpoint.entries == [('a', {'result': {'edge': 'b', 'data': {}}}), ('b', {'done': True})]
+
+    # Restarting keeps the entries.
+    await store.begin('run', 'other', None)
+    checkpoint = await store.load('run')
+    assert checkpoint.workflow_id == 'other'
+    assert checkpoint.data is None
+    assert len(checkpoint.entries) == 2
+
+    await store.delete('run')
+    await store.delete('run')
+    assert await store.load('run') is None
+
+
+async def test_checkpoint_file_partial_line(tmp_path):
+    store = FileCheckpointStore(tmp_path)
+    await store.begin('run', 'workflow', None)
+    await store.append('run', 'a', {'done': True})
+    with open(tmp_path / 'run.jsonl', 'a') as fp:
+        fp.write('{"key": "b", "ent')
+
+    checkpoint = await store.load('run')
+    assert checkpoint.entries == [('a', {'done': True})]
+
+
+@pytest.mark.parametrize('text', ['', '{"run_id": "run", "work', '{"run_id": "run"}\n'])
+async def test_checkpoint_file_partial_header(tmp_path, text):
+    store = FileCheckpointStore(tmp_path)
+    with open(tmp_path / 'run.jsonl', 'w') as fp:
+        fp.write(text)
+    assert await store.load('run') is None
+
+
+async def test_checkpoint_file_run_ids(tmp_path):
+    # Run ids are escaped, not cut down to a file name.
+    store = FileCheckpointStore(tmp_path)
+    await store.begin('a/x', 'a', None)
+    await store.begin('b/x', 'b', None)
+    await store.begin('../x', 'c', None)
+
+    assert (await store.load('a/x')).workflow_id == 'a'
+    assert (await store.load('b/x')).workflow_id == 'b'
+    assert await store.load('x') is None
+    assert sorted(os.listdir(tmp_path)) == ['..%2Fx.jsonl', 'a%2Fx.jsonl', 'b%2Fx.jsonl']
+
+
+def _workflow() -> Workflow:
+    return Workflow(
+        id='test', nodes=[
+            WorkflowNode(id='a', type='count', edges=['b']),
+            WorkflowNode(id='b', type='count', edges=['result']),
+            WorkflowNode(id='result', type='result'),
+        ]
+    )
+
+
+async def _run(engine: WorkflowEngine, workflow_id: str = 'test', data: dict = None, run_id: str = 'run') -> list:
+    return [x async for x in engine.run_workflow(workflow_id, data, run_id=run_id)]
+
+
+async def _resume(engine: WorkflowEngine, run_id: str = 'run') -> list:
+    return [x async for x in engine.resume_workflow(run_id)]
+
+
+async def test_checkpoint_resume(store):
+    engine = WorkflowEngine(_workflow(), handler_cls=Handler, checkpoints=store)
+
+    Handler.failing.add('b')
+    trace = await _run(engine, data={'x': 1})
+    assert trace[-1]['action'] == 'workflow-failed'
+    assert (await store.load('run')).data == {'x': 1}
+
+    trace = await _resume(engine)
+    assert trace[-1]['action'] == 'workflow-end'
+    assert trace[-1]['run_id'] == 'run'
+    assert trace[-1]['result'] == {'x': 1, 'a': 1, 'b': 1}
+    # 'a' isn't run again, its usage is reported as cached.
+    assert Handler.calls == {'a': 1, 'b': 2}
+    a = next(x for x in trace if x['action'] == 'node' and x['node']['id'] == 'a')
+    assert [x['cached'] for x in a['usage']] == [True]
+    b = next(x for x in trace if x['action'] == 'node' and x['node']['id'] == 'b')
+    assert [x['cached'] for x in b['usage']] == [False]
+
+    # Removed once the run completes.
+    assert await store.load('run') is None
+    with pytest.raises(ValueError):
+        await _resume(engine)
+
+
+async def test_checkpoint_run_again(store):
+    engine = WorkflowEngine(_workflow(), handler_cls=Handler, checkpoints=store)
+
+    Handler.failing.add('b')
+    assert (await _run(engine, data={'x': 1}))[-1]['action'] == 'workflow-failed'
+
+    # Only resume_workflow() replays the checkpoint, a new run with the same id starts over.
+    trace = await _run(engine, data={'x': 2})
+    assert trace[-1]['result'] == {'x': 2, 'a': 1, 'b': 1}
+    assert Handler.calls == {'a': 2, 'b': 2}
+    assert await store.load('run') is None
+
+
+async def test_checkpoint_resume_edges():
+    workflow = Workflow(
+        id='test', nodes=[
+            WorkflowNode(id='a', type='count', edges=['b', 'c']),
+            WorkflowNode(id='b', type='count', edges=['result']),
+            WorkflowNode(id='c', type='count', edges=['result']),
+            WorkflowNode(id='result', type='result'),
+        ]
+    )
+    engine = WorkflowEngine(workflow, handler_cls=Handler, checkpoints=MemoryCheckpointStore())
+
+    Handler.failing.add('b')
+    trace = await _run(engine)
+    assert trace[-1]['action'] == 'workflow-failed'
+    assert Handler.calls == {'a': 1, 'b': 1}
+
+    # 'a' continues with the second edge, from the data of the first.
+    trace = await _resume(engine)
+    assert trace[-1]['action'] == 'workflow-end'
+    assert Handler.calls == {'a': 2, 'b': 2, 'c': 1}
+    assert trace[-1]['result'] == {'a': 2, 'c': 1}
+
+    # Both results of 'a' were recorded before 'c' failed.
+    Handler.calls.clear()
+    Handler.failing.add('c')
+    await _run(engine, run_id='other')
+    await _resume(engine, 'other')
+    assert Handler.calls == {'a': 2, 'b': 1, 'c': 2}
+
+
+async def test_checkpoint_resume_loop():
+    workflow = Workflow(
+        id='test', nodes=[
+            WorkflowLoopNode(id='loop', expr='$.items', member='item', edges=['a'], end_node_id='result'),
+            WorkflowNode(id='a', type='item', edges=['a-r']),
+            WorkflowNode(id='a-r', type='result'),
+            WorkflowNode(id='result', type='result'),
+        ]
+    )
+    engine = WorkflowEngine(workflow, handler_cls=Handler, checkpoints=MemoryCheckpointStore())
+
+    Handler.failing.add(3)
+    trace = await _run(engine, data={'items': [1, 2, 3, 4]})
+    assert trace[-1]['action'] == 'workflow-failed'
+
+    # The loop runs again, the items which completed don't.
+    trace = await _resume(engine)
+    assert trace[-1]['action'] == 'workflow-end'
+    assert Handler.calls == {1: 1, 2: 1, 3: 2, 4: 1}
+
+
+async def test_checkpoint_resume_concurrency():
+    workflow = Workflow(
+        id='test', concurrency=WorkflowConcurrency(), nodes=[
+            WorkflowNode(id='start', type='other', edges=['a', 'b']),
+            WorkflowNode(id='a', type='count', edges=['result']),
+            WorkflowNode(id='b', type='count', edges=['result']),
+            WorkflowNode(id='result', type='result'),
+        ]
+    )
+    engine = WorkflowEngine(workflow, handler_cls=Handler, checkpoints=MemoryCheckpointStore())
+
+    Handler.failing.add('b')
+    assert (await _run(engine))[-1]['action'] == 'workflow-failed'
+    assert (await _resume(engine))[-1]['action'] == 'workflow-end'
+    assert Handler.calls == {'a': 1, 'b': 2}
+
+
+async def test_checkpoint_mocks():
+    engine = WorkflowEngine(_workflow(), handler_cls=Handler, checkpoints=MemoryCheckpointStore())
+    trace = await _run(engine, data={'__mocks__': {'a': {'a': 10}}})
+    assert trace[-1]['result'] == {'a': 10, 'b': 1}
+    assert Handler.calls == {'b': 1}
+
+
+async def test_checkpoint_key():
+    checkpoint = WorkflowRunCheckpoint(MemoryCheckpointStore(), 'run', [])
+    first = checkpoint.key('a', {'x': 1})
+    assert checkpoint.key('a', {'x': 1}) != first
+    assert checkpoint.key('a', {'x': 2}).endswith(':0')
+    assert checkpoint.replay(first) is None
+
+
+async def test_checkpoint_no_store():
+    engine = WorkflowEngine(_workflow(), handler_cls=Handler)
+    with pytest.raises(ValueError):
+        await _resume(engine)
+
+
+async def test_checkpoint_file_layout(tmp_path):
+    # One file per run, named after the run.
+    store = FileCheckpointStore(tmp_path)
+    engine = WorkflowEngine(_workflow(), handler_cls=Handler, checkpoints=store)
+    Handler.failing.add('a')
+    await _run(engine, run_id='run-1')
+    assert os.listdir(tmp_path) == ['run-1.jsonl']
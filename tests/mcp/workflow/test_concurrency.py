@@ -0,0 +1,309 @@
+import asyncio
+import time
+
+import pydantic
+import pytest
+
+from jotsu.mcp.local import LocalMCPClient
+from jotsu.mcp.types import Workflow, WorkflowNode, WorkflowServer, WorkflowConcurrency, WorkflowLoopNode
+from jotsu.mcp.workflow import WorkflowEngine
+from jotsu.mcp.workflow.engine import _produced
+from jotsu.mcp.workflow.handler import WorkflowHandler
+from jotsu.mcp.workflow.sessions import WorkflowSessionManager, WorkflowSessionRelay
+
+
+class Handler(WorkflowHandler):
+    running = 0
+    max_running = 0
+
+    @staticmethod
+    async def handle_other(data: dict, **_kwargs) -> dict:
+        return data
+
+    @classmethod
+    async def handle_sleep(cls, data: dict, *, node: WorkflowNode, **_kwargs) -> dict:
+        cls.running += 1
+        cls.max_running = max(cls.max_running, cls.running)
+        try:
+            await asyncio.sleep(node.metadata['delay'])
+        finally:
+            cls.running -= 1
+        return {**data, node.id: True}
+
+    @classmethod
+    async def handle_square(cls, data: dict, **_kwargs) -> dict:
+        cls.running += 1
+        cls.max_running = max(cls.max_running, cls.running)
+        await asyncio.sleep(0.05 * (5 - data['item']))
+        cls.running -= 1
+        return {'square': data['item'] ** 2}
+
+    @staticmethod
+    async def handle_double(data: dict, **_kwargs) -> dict:
+        data['double'] = data['item'] * 2
+        data['count'] += 1
+        return data
+
+    @staticmethod
+    async def handle_fail(_data: dict, **_kwargs) -> dict:
+        raise ValueError('fail')
+
+    @staticmethod
+    async def handle_session(data: dict, *, node: WorkflowNode, sessions, **_kwargs) -> dict:
+        session = await sessions.get_session(node.metadata['server_id'])
+        return {**data, node.id: session.value}
+
+
+def _branch(node_id: str, node_type: str = 'sleep', delay: float = 0.0) -> list:
+    return [
+        WorkflowNode(
+            id=node_id, type=node_type, metadata={'delay': delay, 'server_id': 'server'}, edges=[f'{node_id}-r']
+        ),
+        WorkflowNode(id=f'{node_id}-r', type='result'),
+    ]
+
+
+def _workflow(concurrency: WorkflowConcurrency | None, *branches: list, start_type: str = 'other') -> Workflow:
+    edges = [branch[0].id for branch in branches]
+    nodes = [WorkflowNode(id='start', type=start_type, edges=edges, concurrency=concurrency)]
+    for branch in branches:
+        nodes.extend(branch)
+    return Workflow(id='test', nodes=nodes)
+
+
+def _summary(trace: list) -> list:
+    return [(x['action'], x.get('node', {}).get('id'), x.get('data')) for x in trace]
+
+
+async def _run(workflow: Workflow, data: dict = None) -> list:
+    Handler.running = Handler.max_running = 0
+    engine = WorkflowEngine([workflow], handler_cls=Handler)
+    return [x async for x in engine.run_workflow(workflow.id, data or {})]
+
+
+async def test_concurrency_branch_order():
+    concurrency = WorkflowConcurrency(max_tasks=2)
+    branches = (_branch('a', delay=0.2), _branch('b', delay=0.1))
+
+    start = time.time()
+    trace = await _run(_workflow(concurrency, *branches))
+    assert time.time() - start < 0.3
+    assert Handler.max_running == 2
+
+    sequential = await _run(_workflow(None, *branches))
+    assert _summary(trace) == _summary(sequential)
+    assert trace[-1]['action'] == 'workflow-end'
+
+    # 'last' merge, the data of the last branch.
+    assert trace[-2]['node']['id'] == 'start'
+    assert trace[-2]['data'] == {'b': True}
+
+
+async def test_concurrency_completion_order():
+    concurrency = WorkflowConcurrency(order='completion', merge='update')
+    trace = await _run(_workflow(concurrency, _branch('a', delay=0.2), _branch('b', delay=0.01)))
+
+    ends = [x['node']['id'] for x in trace if x['action'] == 'node']
+    assert ends.index('b-r') < ends.index('a-r')
+    assert trace[-2]['data'] == {'a': True, 'b': True}
+    assert trace[-1]['result'] == {'a': True}
+
+
+async def test_concurrency_max_tasks():
+    concurrency = WorkflowConcurrency(max_tasks=1)
+    trace = await _run(_workflow(concurrency, *[_branch(f'n{i}', delay=0.01) for i in range(3)]))
+    assert trace[-1]['action'] == 'workflow-end'
+    assert Handler.max_running == 1
+
+
+async def test_concurrency_no_branches():
+    trace = await _run(_workflow(WorkflowConcurrency()))
+    assert trace[-2]['node']['id'] == 'start'
+    assert trace[-2]['data'] == {}
+    assert trace[-1]['action'] == 'workflow-end'
+
+
+async def test_concurrency_workflow_default():
+    workflow = _workflow(None, _branch('a', delay=0.1), _branch('b', delay=0.1))
+    workflow.concurrency = WorkflowConcurrency()
+
+    trace = await _run(workflow)
+    assert trace[-1]['action'] == 'workflow-end'
+    assert Handler.max_running == 2
+
+
+async def test_concurrency_result_node():
+    concurrency = WorkflowConcurrency()
+    workflow = _workflow(concurrency, _branch('a', delay=0.1), _branch('b', delay=0.1), start_type='result')
+
+    trace = await _run(workflow)
+    assert trace[-1]['action'] == 'workflow-end'
+    assert Handler.max_running == 2
+
+
+async def test_concurrency_error():
+    concurrency = WorkflowConcurrency(merge='update')
+    workflow = _workflow(concurrency, _branch('a', delay=1), _branch('b', node_type='fail'))
+
+    start = time.time()
+    trace = await _run(workflow)
+    assert time.time() - start < 1
+    assert [x['node']['id'] for x in trace if x['action'] == 'node-error'] == ['b', 'start']
+    assert trace[-1]['action'] == 'workflow-failed'
+
+
+async def test_concurrency_handler_error():
+    concurrency = WorkflowConcurrency()
+    trace = await _run(_workflow(concurrency, _branch('a'), start_type='fail'))
+    assert [x['node']['id'] for x in trace if x['action'] == 'node-error'] == ['start']
+    assert trace[-1]['action'] == 'workflow-failed'
+
+
+async def test_concurrency_complete():
+    concurrency = WorkflowConcurrency()
+    workflow = _workflow(concurrency, _branch('a', delay=1), _branch('b', node_type='complete'))
+
+    trace = await _run(workflow)
+    assert trace[-2]['action'] == 'node'
+    assert trace[-2]['node']['id'] == 'start'
+    assert trace[-1]['action'] == 'workflow-end'
+
+
+async def test_concurrency_nested():
+    inner = WorkflowConcurrency()
+    workflow = _workflow(WorkflowConcurrency(), _branch('a', delay=0.1), _branch('b', delay=0.1))
+    workflow.nodes.append(WorkflowNode(id='c', type='other', edges=['a', 'b'], concurrency=inner))
+    workflow.nodes[0].edges.append('c')
+
+    trace = await _run(workflow)
+    assert trace[-1]['action'] == 'workflow-end'
+    assert Handler.max_running == 4
+
+
+async def test_concurrency_sessions(mocker):
+    mocked_session = mocker.AsyncMock()
+    mocked_session.load.return_value = None
+    mocked_session.value = 'session'
+
+    enter = mocker.patch(
+        'jotsu.mcp.client.client.MCPClientSession.__aenter__',
+        new_callable=mocker.AsyncMock, return_value=mocked_session
+    )
+
+    server = WorkflowServer(id='server', url=pydantic.AnyHttpUrl('https://example.com/mcp/'))
+    workflow = _workflow(
+        WorkflowConcurrency(max_tasks=1), _branch('a', node_type='session'), _branch('b', node_type='session')
+    )
+    workflow.servers.append(server)
+
+    trace = await _run(workflow)
+    assert trace[-2]['data'] == {'b': 'session'}
+    assert trace[-1]['action'] == 'workflow-end'
+    assert enter.call_count == 1
+
+
+async def test_concurrency_prefetch_sessions(mocker):
+    mocked_session = mocker.AsyncMock()
+    mocked_session.value = 'session'
+    enter = mocker.patch(
+        'jotsu.mcp.client.client.MCPClientSession.__aenter__',
+        new_callable=mocker.AsyncMock, return_value=mocked_session
+    )
+    mocker.patch('jotsu.mcp.client.client.MCPClientSession.__aexit__', new_callable=mocker.AsyncMock)
+
+    workflow = _workflow(WorkflowConcurrency(), _branch('a', node_type='session'), _branch('b', node_type='session'))
+    workflow.servers.append(WorkflowServer(id='server', url=pydantic.AnyHttpUrl('https://example.com/mcp/')))
+    # Never used, but connected anyway.
+    workflow.servers.append(WorkflowServer(id='other', url=pydantic.AnyHttpUrl('https://example.org/mcp/')))
+
+    engine = WorkflowEngine([workflow], handler_cls=Handler, prefetch_sessions=True)
+    trace = [x async for x in engine.run_workflow(workflow.id, {})]
+    assert trace[-1]['action'] == 'workflow-end'
+    assert trace[-2]['data'] == {'b': 'session'}
+    assert enter.call_count == 2
+
+
+async def test_concurrency_sessions_error():
+    workflow = _workflow(WorkflowConcurrency(), _branch('a', node_type='session'))
+    trace = await _run(workflow)
+    assert trace[-1]['action'] == 'workflow-failed'
+
+
+async def test_concurrency_stop_early():
+    workflow = _workflow(WorkflowConcurrency(), _branch('a', delay=0.01), _branch('b', delay=10))
+    engine = WorkflowEngine([workflow], handler_cls=Handler)
+    plan = engine._plan(workflow)
+    sessions = WorkflowSessionManager(workflow, client=LocalMCPClient())
+
+    actions = engine._execute_workflow_node(plan, plan.start_node, {}, sessions=sessions, run_id='run', mocks={})
+    async for action in actions:
+        if action['action'] == 'node' and action['node']['id'] == 'a-r':
+            break
+    await actions.aclose()
+    assert Handler.running == 0
+
+
+def _loop_workflow(node_type: str = 'square', **kwargs) -> Workflow:
+    return Workflow(
+        id='loop', nodes=[
+            WorkflowLoopNode(id='loop', expr='$.items', member='item', edges=['square'], end_node_id='end', **kwargs),
+            WorkflowNode(id='square', type=node_type, edges=['square-r']),
+            WorkflowNode(id='square-r', type='result'),
+            WorkflowNode(id='end', type='other', edges=['result']),
+            WorkflowNode(id='result', type='result'),
+        ]
+    )
+
+
+async def test_loop_parallel():
+    workflow = _loop_workflow(parallel=True, max_concurrency=3, results_member='squares')
+    assert workflow.nodes[0].concurrency.merge == 'collect'
+
+    start = time.time()
+    trace = await _run(workflow, {'items': [1, 2, 3, 4]})
+    assert time.time() - start < 0.4
+    assert Handler.max_running == 3
+
+    assert trace[-1]['action'] == 'workflow-end'
+    assert [x['square'] for x in trace[-1]['result']['squares']] == [1, 4, 9, 16]
+
+    sequential = await _run(_loop_workflow(), {'items': [1, 2, 3, 4]})
+    # Everything up to the end of the loop node.
+    assert _summary(trace)[:-5] == _summary(sequential)[:-5]
+
+
+async def test_loop_parallel_results():
+    # Only what each iteration added or changed is collected, not the data it started with.
+    workflow = _loop_workflow('double', parallel=True, results_member='doubles')
+    trace = await _run(workflow, {'items': [1, 2], 'count': 0, 'other': {'x': [1, 2, 3]}})
+    result = trace[-1]['result']
+    assert result['doubles'] == [{'double': 2, 'count': 1}, {'double': 4, 'count': 1}]
+    assert result['count'] == 0
+    assert _produced({'x': 1}, None) is None
+
+
+async def test_loop_parallel_last():
+    trace = await _run(_loop_workflow(parallel=True), {'items': [1, 2]})
+    assert trace[-1]['result'] == {'square': 4}
+
+
+async def test_loop_parallel_empty():
+    trace = await _run(_loop_workflow(parallel=True, results_member='squares'), {'items': []})
+    assert trace[-1]['result']['squares'] == []
+
+
+async def test_sessions_relay():
+    workflow = Workflow(id='test')
+    sessions = WorkflowSessionManager(workflow, client=LocalMCPClient())
+
+    requests = []
+    relay = WorkflowSessionRelay(sessions, request=lambda session_id, future: requests.append(session_id))
+    assert relay.workflow is workflow
+    assert relay.cached('missing') is None
+
+    task = asyncio.create_task(relay.get_session('missing'))
+    await asyncio.sleep(0)
+    assert requests == ['missing']
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
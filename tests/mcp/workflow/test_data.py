@@ -0,0 +1,187 @@
+import copy
+import json
+import pickle
+
+import pytest
+
+from jotsu.mcp.workflow.data import CowDict, CowList, json_patch
+from tests.workflows.utils import apply_patch
+
+
+def _data() -> CowDict:
+    return CowDict({'a': {'b': [1, {'c': 2}]}, 'd': 'text', 'big': {'x': list(range(10))}})
+
+
+def test_cow_dict_snapshot():
+    data = _data()
+    snapshot = data.snapshot()
+    assert snapshot == data
+
+    data['a']['b'][1]['c'] = 3
+    data['a']['b'].append(4)
+    data['d'] = 'changed'
+    assert snapshot == {'a': {'b': [1, {'c': 2}]}, 'd': 'text', 'big': {'x': list(range(10))}}
+    assert data['a'] == {'b': [1, {'c': 3}, 4]}
+
+    # Only the accessed path is copied.
+    assert dict.__getitem__(data, 'big') is dict.__getitem__(snapshot, 'big')
+
+    # And changes to the snapshot don't reach the data either.
+    snapshot['a']['b'].clear()
+    assert data['a']['b'] == [1, {'c': 3}, 4]
+
+
+def test_cow_dict_views():
+    # Values read without data[key] aren't shared with the snapshot either.
+    data = _data()
+    snapshot = data.snapshot()
+
+    for key, value in data.items():
+        if key == 'a':
+            value['b'].append(3)
+    for value in data.values():
+        if isinstance(value, dict) and 'x' in value:
+            value['x'].clear()
+    {**data}['a']['b'].append(4)
+    dict(data)['a']['e'] = 1
+    (lambda **kwargs: kwargs['big'])(**data)['y'] = 1
+
+    assert snapshot == _data()
+    assert data == {'a': {'b': [1, {'c': 2}, 3, 4], 'e': 1}, 'd': 'text', 'big': {'x': [], 'y': 1}}
+    assert ('d', 'text') in data.items()
+    assert len(data.values()) == 3
+
+    items = CowList([{'a': 1}])
+    snapshot = items.copy()
+    (items + [2])[0]['a'] = 2
+    (items * 2)[1]['a'] = 3
+    (2 * items)[0]['a'] = 4
+    assert snapshot == [{'a': 1}]
+    assert items == [{'a': 4}]
+
+
+def test_cow_dict_owned():
+    data = _data()
+    a = data['a']
+    assert data['a'] is a
+
+    data.snapshot()
+    assert data['a'] is not a
+    assert isinstance(data['a'], CowDict)
+    assert isinstance(data['a']['b'], CowList)
+
+
+def test_cow_dict_methods():
+    data = _data()
+    snapshot = data.snapshot()
+
+    data.get('a')['e'] = 1
+    assert data.get('missing', 1) == 1
+    data.setdefault('a', {})['f'] = 1
+    data.setdefault('g', {})['h'] = 1
+    assert data['g'] == {'h': 1}
+
+    big = data.pop('big')
+    big['y'] = 1
+    assert data.pop('missing', None) is None
+    with pytest.raises(KeyError):
+        data.pop('missing')
+
+    key, value = data.popitem()
+    assert key == 'g'
+    del data['d']
+    data.update({'i': 1}, j=2)
+    data |= {'k': 3}
+
+    assert data == {'a': {'b': [1, {'c': 2}], 'e': 1, 'f': 1}, 'i': 1, 'j': 2, 'k': 3}
+    assert snapshot == _data()
+
+    key, value = snapshot.popitem()
+    value['z'] = 1
+    assert snapshot.snapshot() == {'a': {'b': [1, {'c': 2}]}, 'd': 'text'}
+
+    data.clear()
+    assert data == {}
+
+
+def test_cow_dict_operators():
+    data = _data()
+
+    merged = data | {'d': 'other'}
+    assert isinstance(merged, CowDict)
+    merged['a']['b'].append(3)
+    assert merged['d'] == 'other'
+    assert data['a']['b'] == [1, {'c': 2}]
+
+    merged = {'d': 'other', 'e': 1} | data
+    assert isinstance(merged, CowDict)
+    assert merged['d'] == 'text'
+    assert merged['e'] == 1
+
+    assert data.__or__(1) is NotImplemented
+    assert data.__ror__(1) is NotImplemented
+
+    other = CowDict()
+    other.update(data)
+    other['a']['b'].clear()
+    assert data['a']['b'] == [1, {'c': 2}]
+
+
+def test_cow_dict_copy():
+    data = _data()
+    for result in (data.copy(), copy.copy(data), copy.deepcopy(data), pickle.loads(pickle.dumps(data))):
+        assert isinstance(result, CowDict)
+        result['a']['b'][1]['c'] = 3
+        assert data['a']['b'][1]['c'] == 2
+
+    assert json.loads(json.dumps(data)) == data
+
+
+def test_cow_list():
+    items = CowList([{'a': 1}, [1], 2])
+    snapshot = items.copy()
+
+    items[-3]['a'] = 2
+    items[1].append(2)
+    assert [x for x in snapshot] == [{'a': 1}, [1], 2]
+    assert list(reversed(items)) == [2, [1, 2], {'a': 2}]
+
+    part = items[0:2]
+    part[0]['a'] = 3
+    assert items[0] == {'a': 2}
+
+    items[0] = {'a': 4}
+    items[0:1] = [{'a': 5}]
+    assert items.pop(0) == {'a': 5}
+    items.insert(0, {'b': 1})
+    assert items == [{'b': 1}, [1, 2], 2]
+    assert snapshot == [{'a': 1}, [1], 2]
+
+    for result in (copy.copy(items), copy.deepcopy(items), pickle.loads(pickle.dumps(items))):
+        assert isinstance(result, CowList)
+        result[0]['b'] = 2
+        assert items[0] == {'b': 1}
+
+
+def test_json_patch():
+    data = CowDict({'a': {'b': [1, {'c': 2}], 'x/y': 1}, 'd': 'text', 'e': [1, 2], 'f': 1, 'big': {'x': [0] * 100}})
+    old = data.snapshot()
+
+    data['a']['b'][1]['c'] = 3
+    data['a']['b'].append(4)
+    data['a']['x/y'] = 2
+    data['e'].pop()
+    data['f'] = 1.0
+    data['g'] = {'h': 1}
+    del data['d']
+    new = data.snapshot()
+
+    patch = json_patch(old, new)
+    assert apply_patch(old, patch) == new
+    assert {'op': 'remove', 'path': '/d'} in patch
+    assert {'op': 'replace', 'path': '/a/x~1y', 'value': 2} in patch
+    assert not any(op['path'].startswith('/big') for op in patch)
+
+    assert json_patch(new, new) == []
+    assert json_patch({'a': 'abc'.upper()}, {'a': 'abc'.upper()}) == []
+    assert json_patch(1, {'a': 1}) == [{'op': 'replace', 'path': '', 'value': {'a': 1}}]
@@ -1,15 +1,20 @@
 import asyncio
+import json
 
 import pydantic
 import pytest
+from mcp.server.fastmcp.exceptions import ResourceError
 
 from jotsu.mcp.types import (
     Workflow, WorkflowServer,
     WorkflowNode,
     WorkflowToolNode, WorkflowResourceNode, WorkflowPromptNode,
-    WorkflowEvent, WorkflowResultNode
+    WorkflowEvent, WorkflowResultNode, JotsuException
 )
-from jotsu.mcp.workflow import WorkflowEngine
+from jotsu.mcp.types.models import WorkflowAnthropicNode
+from jotsu.mcp.workflow import WorkflowEngine, MemoryWorkflowStore
+from jotsu.mcp.workflow.engine import WorkflowActionFailed
+from tests.workflows.utils import apply_patch
 from jotsu.mcp.workflow.handler import WorkflowHandler
 
 
@@ -23,6 +28,128 @@ async def test_engine():
     assert trace[1]['action'] == 'workflow-end'
 
 
+async def test_engine_stream():
+    workflow = Workflow(
+        id='test', name='Test', nodes=[
+            WorkflowNode(id='a', name='a', type='other', edges=['b']),
+            WorkflowResultNode(id='b', name='b'),
+        ]
+    )
+    engine = WorkflowEngine([workflow], handler_cls=MockHandler)
+
+    events = [x async for x in engine.stream_workflow('Test', {'x': 1})]
+    assert [x.action for x in events] == ['workflow-start', 'node-start', 'node', 'node', 'workflow-end']
+    assert all(x._dict is None for x in events)
+    assert repr(events[0]) == '<WorkflowActionEvent workflow-start>'
+
+    # Read access without serializing.
+    assert events[1].data == {'x': 1}
+    assert events[1]['data'] == {'x': 1}
+    assert events[1]['action'] == 'node-start'
+    assert events[1].node.id == 'a'
+    assert events[0].node is None
+    assert events[-1]['result'] == {'x': 1}
+    assert events[-1].data is None
+    assert events[1]._dict is None
+
+    # Membership is answered from the model, and agrees with to_dict().
+    keys = ['action', 'data', 'result', 'patch', 'node', 'duration', 'missing']
+    for event in events + [events[1].without_data(), events[1].without_data([{'op': 'add'}])]:
+        contains = {key: key in event for key in keys}
+        assert event._dict is None
+        assert contains == {key: key in event.to_dict() for key in keys}
+
+    result = events[1].to_dict()
+    assert result['action'] == 'node-start'
+    assert result['node'] == {'id': 'a', 'name': 'a', 'type': 'other'}
+    assert events[1].to_dict() is result
+    assert json.loads(events[1].to_json_bytes()) == json.loads(json.dumps(result))
+
+    assert events[1]['run_id'] == result['run_id']
+    assert 'duration' in events[2]
+    assert events[0].get('missing') is None
+
+
+async def test_engine_trace():
+    workflow = Workflow(
+        id='test', name='Test', nodes=[
+            WorkflowNode(id='a', name='a', type='other', edges=['b']),
+            WorkflowResultNode(id='b', name='b'),
+        ]
+    )
+    engine = WorkflowEngine([workflow], handler_cls=MockHandler, trace='summary')
+
+    trace = [x async for x in engine.run_workflow('Test', {'x': 1})]
+    assert [x['action'] for x in trace] == ['workflow-start', 'node-start', 'node', 'node', 'workflow-end']
+    assert all('data' not in x for x in trace)
+    assert trace[-1]['result'] == {'x': 1}
+
+    trace = [x async for x in engine.run_workflow('Test', {'x': 1}, trace='none')]
+    assert [x['action'] for x in trace] == ['workflow-end']
+    assert trace[-1]['result'] == {'x': 1}
+
+    full = [x async for x in engine.run_workflow('Test', {'x': 1}, trace='full')]
+    assert all('data' in x for x in full[:-1])
+
+
+async def test_engine_trace_diff():
+    workflow = Workflow(
+        id='test', name='Test', nodes=[
+            WorkflowNode(id='a', name='a', type='tool', edges=['b']),
+            WorkflowNode(id='b', name='b', type='other', edges=['c']),
+            WorkflowResultNode(id='c', name='c'),
+        ]
+    )
+
+    class Handler(MockHandler):
+        @staticmethod
+        async def handle_tool(data: dict, **_kwargs) -> dict:
+            data['items'].append({'n': len(data['items'])})
+            data['big']['value'] = 1
+            return data
+
+    engine = WorkflowEngine([workflow], handler_cls=Handler)
+    payload = {'items': [], 'big': {'values': list(range(1000))}}
+
+    full = [x async for x in engine.run_workflow('Test', payload)]
+    diff = [x async for x in engine.run_workflow('Test', payload, trace='diff')]
+    assert [x['action'] for x in diff] == [x['action'] for x in full]
+    assert diff[0]['data'] == payload
+
+    data = diff[0]['data']
+    for action, expected in zip(diff[1:-1], full[1:-1]):
+        assert 'data' not in action
+        data = apply_patch(data, action['patch'])
+        assert data == expected['data']
+
+    assert diff[1]['patch'] == []
+    assert diff[2]['patch'] == [
+        {'op': 'add', 'path': '/items/-', 'value': {'n': 0}}, {'op': 'add', 'path': '/big/value', 'value': 1}
+    ]
+    assert diff[-1]['result'] == full[-1]['result']
+
+
+async def test_engine_trace_error():
+    workflow = Workflow(id='test', nodes=[WorkflowNode(id='a', type='fail', edges=['b']), WorkflowResultNode(id='b')])
+
+    class Handler(MockHandler):
+        @staticmethod
+        async def handle_fail(_data: dict, **_kwargs) -> dict:
+            raise ValueError('fail')
+
+    engine = WorkflowEngine([workflow], handler_cls=Handler, trace='diff')
+    trace = [x async for x in engine.run_workflow('test')]
+    assert [x['action'] for x in trace] == ['workflow-start', 'node-start', 'node-error', 'workflow-failed']
+
+    with pytest.raises(ValueError):
+        WorkflowEngine([], trace='other')  # type: ignore
+
+
+def test_engine_action_timestamp():
+    action = WorkflowActionFailed(workflow={'id': 'test', 'name': 'Test'}, duration=0, run_id='run')
+    assert action.timestamp > 0
+
+
 class MockHandler(WorkflowHandler):
     @staticmethod
     async def handle_tool(data: dict, **_kwargs) -> dict:
@@ -250,3 +377,148 @@ async def test_engine_workflow_close_error(mocker):
     assert len(trace) == 3   # workflow start/end
     aclose.assert_called_once()
     logger_warning.assert_called_once()
+
+
+async def test_engine_workflow_index():
+    first = Workflow(id='first', name='Shared')
+    second = Workflow(id='second', name='Shared')
+    engine = WorkflowEngine([first, second])
+
+    assert await engine.get_workflow('first') is first
+    assert await engine.get_workflow('second') is second
+    assert await engine.get_workflow('Shared') is first
+    assert await engine.get_workflow('missing') is None
+
+    with pytest.raises(ValueError):
+        engine.add_workflow(Workflow(id='first'))
+
+    assert engine.remove_workflow('first') is first
+    assert await engine.get_workflow('first') is None
+    assert await engine.get_workflow('Shared') is second
+    assert [str(x.uri) for x in await engine.list_resources()] == ['workflow://second/']
+    assert 'first' not in engine._plans
+
+    with pytest.raises(ValueError):
+        engine.remove_workflow('first')
+
+    # The remaining workflows with the name take over in registration order.
+    third = Workflow(id='third', name='Shared')
+    engine.add_workflow(first)
+    engine.add_workflow(third)
+    engine.remove_workflow('first')
+    assert await engine.get_workflow('Shared') is second
+    engine.remove_workflow('second')
+    assert await engine.get_workflow('Shared') is third
+    engine.remove_workflow('third')
+    assert await engine.get_workflow('Shared') is None
+
+
+async def test_engine_workflow_replace():
+    workflow = Workflow(id='test', name='Test')
+    engine = WorkflowEngine([])
+    assert engine.replace_workflow(workflow) is None
+
+    replacement = Workflow(
+        id='test', name='Replaced', nodes=[WorkflowResultNode(id='result', name='result')], data={'x': 1}
+    )
+    assert engine.replace_workflow(replacement) is workflow
+    assert await engine.get_workflow('Test') is None
+    assert await engine.get_workflow('Replaced') is replacement
+    assert len(await engine.list_resources()) == 1
+
+    trace = [x async for x in engine.run_workflow('test')]
+    assert trace[-1]['result'] == {'x': 1}
+
+
+async def test_engine_workflow_replace_error():
+    workflow = Workflow(id='test', name='Test')
+    engine = WorkflowEngine([workflow], precompile_templates=True)
+
+    # Compiled before the registered workflow is removed, which is kept.
+    invalid = Workflow(id='test', name='Invalid', nodes=[WorkflowAnthropicNode(id='a', model='m', prompt='{{x}')])
+    with pytest.raises(JotsuException):
+        engine.replace_workflow(invalid)
+    assert await engine.get_workflow('test') is workflow
+    assert await engine.get_workflow('Test') is workflow
+    assert await engine.get_workflow('Invalid') is None
+
+
+async def test_engine_workflow_store():
+    store = MemoryWorkflowStore([
+        Workflow(id='stored', name='Stored', nodes=[WorkflowResultNode(id='result', name='result')], data={'x': 1}),
+        Workflow(id='test'),
+    ])
+    get = store.get
+    calls = []
+
+    async def counted_get(name):
+        calls.append(name)
+        return await get(name)
+    store.get = counted_get
+
+    engine = WorkflowEngine(store=store, plan_cache_size=4)
+    engine.add_workflow(Workflow(id='test', name='Test'))
+
+    trace = [x async for x in engine.run_workflow('Stored')]
+    assert trace[-1]['result'] == {'x': 1}
+    trace = [x async for x in engine.run_workflow('stored')]
+    assert trace[-1]['result'] == {'x': 1}
+    # Loaded and compiled once, registered workflows take precedence.
+    assert calls == ['Stored']
+    assert (await engine.get_workflow('test')).name == 'Test'
+    assert await engine.get_workflow('missing') is None
+
+    resources = await engine.list_resources()
+    assert [(str(x.uri), x.name) for x in resources] == [
+        ('workflow://test/', 'Test'), ('workflow://stored/', 'Stored')
+    ]
+
+    contents = list(await engine.read_resource('workflow://stored/'))
+    assert json.loads(contents[0].content)['id'] == 'stored'
+    assert contents[0].mime_type == 'application/json'
+    contents = list(await engine.read_resource(pydantic.AnyUrl('workflow://test/')))
+    assert json.loads(contents[0].content)['name'] == 'Test'
+
+    with pytest.raises(ResourceError):
+        await engine.read_resource('workflow://missing/')
+    with pytest.raises(ResourceError):
+        await engine.read_resource('workflow://Stored/')
+    with pytest.raises(ValueError):
+        await engine.read_resource('file://missing')
+
+
+async def test_engine_workflow_store_invalidate():
+    store = MemoryWorkflowStore([
+        Workflow(id='stored', name='Stored', nodes=[WorkflowResultNode(id='result', name='result')], data={'x': 1}),
+    ])
+    engine = WorkflowEngine(store=store, plan_cache_size=1)
+
+    async def result(name: str):
+        trace = [x async for x in engine.run_workflow(name)]
+        return trace[-1].get('result')
+
+    assert await result('Stored') == {'x': 1}
+    # Only the plan is cached, not once per name it was requested with.
+    assert len(engine._loaded) == 1
+    assert await result('stored') == {'x': 1}
+
+    # The cached plan keeps running until it is invalidated.
+    await store.put(Workflow(
+        id='stored', name='Renamed', nodes=[WorkflowResultNode(id='result', name='result')], data={'x': 2}
+    ))
+    assert await result('Stored') == {'x': 1}
+    engine.invalidate_workflow('stored')
+    assert await result('stored') == {'x': 2}
+    assert await engine.get_workflow('Stored') is None
+    assert (await engine.get_workflow('Renamed')).data == {'x': 2}
+
+    await store.delete('stored')
+    engine.invalidate_workflow('stored')
+    assert await engine.get_workflow('Renamed') is None
+
+
+async def test_engine_workflow_no_store():
+    engine = WorkflowEngine()
+    assert await engine.list_resources() == []
+    with pytest.raises(ResourceError):
+        await engine.read_resource('workflow://missing/')
@@ -0,0 +1,267 @@
+import asyncio
+
+import pydantic
+import pytest
+
+from jotsu.mcp.types import Workflow, WorkflowNode, WorkflowServer, WorkflowConcurrency
+from jotsu.mcp.types.models import WorkflowLoopNode
+from jotsu.mcp.workflow import WorkflowEngine
+from jotsu.mcp.workflow.handler import WorkflowHandler
+from tests.workflows.utils import load_workflow
+
+
+class Handler(WorkflowHandler):
+    @staticmethod
+    async def handle_other(data: dict, **_kwargs) -> dict:
+        return {**data, 'count': data.get('count', 0) + 1}
+
+    @staticmethod
+    async def handle_nested(data: dict, **_kwargs) -> dict:
+        data.setdefault('nested', {}).setdefault('items', []).append(len(data['nested']['items']))
+        return data
+
+    @staticmethod
+    async def handle_views(data: dict, **_kwargs) -> dict:
+        for key, value in data.items():
+            if key == 'nested':
+                value['items'].append(len(value['items']))
+        result = {**data}
+        result['nested']['count'] = len(result['nested']['items'])
+        return result
+
+    @staticmethod
+    async def handle_fail(_data: dict, **_kwargs) -> dict:
+        raise ExceptionGroup('group', [ValueError('fail')])
+
+    @staticmethod
+    async def handle_chat(data: dict, *, node: WorkflowNode, sessions, delta=None, **_kwargs) -> dict:
+        text = ''
+        for chunk in ('Hello', ', ', 'world'):
+            if delta:
+                delta(text=chunk)
+            text += chunk
+            await asyncio.sleep(0)
+        if node.metadata:
+            # Sessions are requested from the task running the workflow.
+            text += (await sessions.get_session(node.metadata['server_id'])).value
+        return {**data, node.id: text}
+
+
+def _summary(trace: list) -> list:
+    # Everything except the values which change on every run.
+    return [
+        (x['action'], x.get('node', {}).get('id'), x.get('data'), x.get('result'), x.get('message'))
+        for x in trace
+    ]
+
+
+async def _run(workflow: Workflow, executor: str, data: dict = None) -> list:
+    engine = WorkflowEngine([workflow], handler_cls=Handler, executor=executor)
+    return [x async for x in engine.run_workflow(workflow.id, data)]
+
+
+@pytest.mark.parametrize('name', ['loop', 'post', 'complete'])
+async def test_executor_same_actions(name):
+    workflow = Workflow(**load_workflow(name))
+    recursive = await _run(workflow, 'recursive')
+    iterative = await _run(workflow, 'iterative')
+    assert _summary(iterative) == _summary(recursive)
+
+
+def _loop_workflow(*, body: str, end_node_id: str | None = 'end') -> Workflow:
+    return Workflow(
+        id='loop', nodes=[
+            WorkflowLoopNode(id='loop', expr='$.items', member='item', edges=['a'], end_node_id=end_node_id),
+            WorkflowNode(id='a', type='other', edges=['b', 'c']),
+            WorkflowNode(id='b', type=body, edges=['c']),
+            WorkflowNode(id='c', type='other'),
+            WorkflowNode(id='end', type='other', edges=['result']),
+            WorkflowNode(id='result', type='result'),
+        ]
+    )
+
+
+@pytest.mark.parametrize('body', ['other', 'result', 'complete', 'fail'])
+async def test_executor_loop(body):
+    workflow = _loop_workflow(body=body)
+    data = {'items': [1, 2, 3]}
+
+    recursive = await _run(workflow, 'recursive', data)
+    iterative = await _run(workflow, 'iterative', data)
+    assert _summary(iterative) == _summary(recursive)
+
+
+async def test_executor_error_unwind():
+    workflow = _loop_workflow(body='fail')
+    trace = await _run(workflow, 'iterative', {'items': [1]})
+
+    errors = [x for x in trace if x['action'] == 'node-error']
+    assert [x['node']['id'] for x in errors] == ['b', 'a', 'loop']
+    assert all(x['exc_type'] == 'ValueError' for x in errors)
+    assert trace[-1]['action'] == 'workflow-failed'
+
+
+async def test_executor_error_after_result():
+    workflow = Workflow(
+        id='result', nodes=[
+            WorkflowNode(id='result', type='result', edges=['fail']),
+            WorkflowNode(id='fail', type='fail', edges=['other']),
+            WorkflowNode(id='other', type='other'),
+        ]
+    )
+    recursive = await _run(workflow, 'recursive')
+    iterative = await _run(workflow, 'iterative')
+
+    assert _summary(iterative) == _summary(recursive)
+    assert iterative[-1]['action'] == 'workflow-failed'
+
+
+async def test_executor_end_node_error():
+    workflow = _loop_workflow(body='other', end_node_id='missing')
+    recursive = await _run(workflow, 'recursive', {'items': [1]})
+    iterative = await _run(workflow, 'iterative', {'items': [1]})
+
+    assert _summary(iterative) == _summary(recursive)
+    assert iterative[-2]['action'] == 'node-error'
+    assert iterative[-1]['action'] == 'workflow-failed'
+
+
+async def test_executor_deep():
+    size = 2000
+    workflow = Workflow(
+        id='deep', nodes=[
+            WorkflowNode(id=str(i), type='other', edges=[str(i + 1)] if i + 1 < size else []) for i in range(size)
+        ]
+    )
+    trace = await _run(workflow, 'iterative')
+
+    assert trace[-1]['action'] == 'workflow-end'
+    assert trace[-2]['data'] == {'count': size - 1}
+
+
+@pytest.mark.parametrize('executor', ['iterative', 'recursive'])
+async def test_executor_data_snapshots(executor):
+    workflow = Workflow(
+        id='snapshots', nodes=[
+            WorkflowNode(id='a', type='nested', edges=['b', 'c']),
+            WorkflowNode(id='b', type='nested', edges=['result']),
+            WorkflowNode(id='c', type='nested', edges=['result']),
+            WorkflowNode(id='result', type='result'),
+        ]
+    )
+    trace = await _run(workflow, executor, {'nested': {'items': []}})
+
+    # Actions keep the data as it was when they were emitted, even though nodes change it in place.
+    assert trace[0]['data'] == {'nested': {'items': []}}
+    starts = [x['data']['nested']['items'] for x in trace if x['action'] == 'node-start']
+    assert starts == [[], [0], [0, 1]]
+
+    # Each edge gets its own copy, 'a' runs once per edge and isn't affected by what 'b' did.
+    results = [x['data']['nested']['items'] for x in trace if x['action'] == 'node' and x['node']['id'] == 'result']
+    assert results == [[0, 1], [0, 1, 2]]
+
+
+@pytest.mark.parametrize('executor', ['iterative', 'recursive'])
+async def test_executor_data_snapshots_views(executor):
+    # The same when nodes change nested values they got from items() or {**data}.
+    workflow = Workflow(
+        id='snapshots', nodes=[
+            WorkflowNode(id='a', type='views', edges=['b']),
+            WorkflowNode(id='b', type='views', edges=['result']),
+            WorkflowNode(id='result', type='result'),
+        ]
+    )
+    trace = await _run(workflow, executor, {'nested': {'items': []}})
+
+    starts = [x['data']['nested'] for x in trace if x['action'] == 'node-start']
+    assert starts == [{'items': []}, {'items': [0], 'count': 1}]
+    assert trace[-1]['result']['nested'] == {'items': [0, 1], 'count': 2}
+
+
+def _chat_workflow(**kwargs) -> Workflow:
+    return Workflow(
+        id='chat', nodes=[
+            WorkflowNode(id='chat', type='chat', edges=['a', 'b'], **kwargs),
+            WorkflowNode(id='a', type='other', edges=['result']),
+            WorkflowNode(id='b', type='other', edges=['result']),
+            WorkflowNode(id='result', type='result'),
+        ]
+    )
+
+
+@pytest.mark.parametrize('executor, concurrency', [
+    ('iterative', None), ('recursive', None), ('iterative', WorkflowConcurrency())
+])
+async def test_executor_stream(executor, concurrency):
+    workflow = _chat_workflow(stream=True, concurrency=concurrency)
+    trace = await _run(workflow, executor)
+
+    # The handler runs once per edge.
+    deltas = [x for x in trace if x['action'] == 'node-delta']
+    assert [x['text'] for x in deltas] == ['Hello', ', ', 'world'] * 2
+    start = trace[1]
+    assert start['action'] == 'node-start'
+    assert all(x['start_id'] == start['id'] and x['node']['id'] == 'chat' and 'data' not in x for x in deltas)
+
+    # The node ends as it does without streaming.
+    unstreamed = await _run(_chat_workflow(concurrency=concurrency), executor)
+    assert _summary([x for x in trace if x['action'] != 'node-delta']) == _summary(unstreamed)
+    assert trace[-2]['data']['chat'] == 'Hello, world'
+
+    engine = WorkflowEngine([workflow], handler_cls=Handler, executor=executor)
+    actions = [x async for x in engine.run_workflow(workflow.id, trace='summary')]
+    assert len([x for x in actions if x['action'] == 'node-delta']) == 6
+    actions = [x async for x in engine.run_workflow(workflow.id, trace='none')]
+    assert [x['action'] for x in actions] == ['workflow-end']
+
+
+@pytest.mark.parametrize('executor', ['iterative', 'recursive'])
+async def test_executor_stream_sessions(mocker, executor):
+    mocked_session = mocker.AsyncMock()
+    mocked_session.load.return_value = None
+    mocked_session.value = '!'
+    enter = mocker.patch(
+        'jotsu.mcp.client.client.MCPClientSession.__aenter__',
+        new_callable=mocker.AsyncMock, return_value=mocked_session
+    )
+
+    workflow = _chat_workflow(stream=True, metadata={'server_id': 'server'})
+    workflow.servers.append(WorkflowServer(id='server', url=pydantic.AnyHttpUrl('https://example.com/mcp/')))
+    trace = await _run(workflow, executor)
+
+    assert trace[-1]['action'] == 'workflow-end'
+    assert trace[-2]['data']['chat'] == 'Hello, world!'
+    assert enter.call_count == 1
+
+    # The error of a failed session request goes to the handler.
+    workflow.servers.clear()
+    trace = await _run(workflow, executor)
+    assert trace[-2]['action'] == 'node-error'
+    assert trace[-1]['action'] == 'workflow-failed'
+
+
+def test_executor_invalid():
+    with pytest.raises(ValueError):
+        WorkflowEngine([], executor='other')  # type: ignore
+
+
+async def test_executor_recursive_concurrency():
+    # The recursive executor would ignore the settings, i.e. run the branches in order.
+    with pytest.raises(ValueError, match="Workflow 'chat' runs nodes concurrently \\(chat\\)"):
+        WorkflowEngine([_chat_workflow(concurrency=WorkflowConcurrency())], executor='recursive')
+
+    loop = Workflow(id='loop', nodes=[
+        WorkflowLoopNode(id='loop', name='loop', expr='$.items', parallel=True, edges=['result']),
+        WorkflowNode(id='result', type='result'),
+    ])
+    with pytest.raises(ValueError, match='iterative executor'):
+        WorkflowEngine([loop], executor='recursive')
+
+    # Loaded on first use, the run fails.
+    class Engine(WorkflowEngine):
+        async def get_workflow(self, name: str):
+            return Workflow(id='other', nodes=loop.nodes, concurrency=WorkflowConcurrency())
+
+    trace = [x async for x in Engine(executor='recursive').run_workflow('other')]
+    assert [x['action'] for x in trace] == ['workflow-start', 'workflow-error', 'workflow-failed']
+    assert trace[1]['exc_type'] == 'ValueError'
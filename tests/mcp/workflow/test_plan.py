@@ -0,0 +1,198 @@
+import logging
+
+import pytest
+
+from jotsu.mcp.types import JotsuException, Workflow, WorkflowNode, WorkflowServer
+from jotsu.mcp.types.models import (
+    WorkflowLoopNode, WorkflowSwitchNode, WorkflowPickNode, WorkflowTransformNode, WorkflowTransform,
+    WorkflowAnthropicNode, WorkflowToolNode
+)
+from jotsu.mcp.workflow import WorkflowEngine, MemoryWorkflowStore, utils
+from jotsu.mcp.workflow.handler import WorkflowHandler
+from jotsu.mcp.workflow.handler.utils import jsonata_cache
+from jotsu.mcp.workflow.plan import CompiledWorkflow
+
+
+def test_plan_compile():
+    workflow = Workflow(
+        id='test', servers=[WorkflowServer(id='s', url='https://example.com/mcp/')],
+        nodes=[
+            WorkflowLoopNode(id='a', name='a', expr='$.items', member='item', edges=['b'], end_node_id='c'),
+            WorkflowNode(id='b', name='b', type='other'),
+            WorkflowNode(id='c', name='c', type='other'),
+        ]
+    )
+    plan = CompiledWorkflow(workflow, handler=WorkflowHandler(engine=None))
+
+    assert plan.start_node.id == 'a'
+    assert plan.servers['s'].id == 's'
+    assert plan.start_node.handler
+    assert plan.start_node.artifacts['$.items'] is jsonata_cache.get('$.items')
+    assert [node.id for node in plan.start_node.targets()] == ['b']
+    assert plan.start_node.end_target() is plan.get_node('c')
+    assert plan.get_node('b').handler is None
+    assert plan.get_node('b').end_target() is None
+
+
+def test_plan_node_servers():
+    server = WorkflowServer(id='s', url='https://example.com/mcp/')
+    workflow = Workflow(
+        id='test', servers=[server],
+        nodes=[
+            WorkflowToolNode(id='a', tool_name='tool', url='https://example.org/mcp/', headers={'x': 'y'}),
+            WorkflowToolNode(id='b', tool_name='tool', server_id='s'),
+        ]
+    )
+    plan = CompiledWorkflow(workflow, handler=WorkflowHandler(engine=None))
+
+    assert plan.servers['s'] is server
+    assert str(plan.servers['a'].url) == 'https://example.org/mcp/'
+    assert plan.servers['a'].headers == {'x': 'y'}
+    assert 'b' not in plan.servers
+    assert workflow.servers == [server]
+
+
+def test_plan_missing_nodes():
+    workflow = Workflow(
+        id='test', start_node_id='a',
+        nodes=[
+            WorkflowLoopNode(id='a', name='a', expr='$.items', edges=['x'], end_node_id='y'),
+        ]
+    )
+    plan = CompiledWorkflow(workflow, handler=WorkflowHandler(engine=None))
+
+    with pytest.raises(JotsuException):
+        list(plan.start_node.targets())
+    with pytest.raises(JotsuException):
+        plan.start_node.end_target()
+    with pytest.raises(JotsuException):
+        plan.get_node('x')
+
+
+def test_plan_prepare_error(caplog):
+    workflow = Workflow(
+        id='test', nodes=[WorkflowSwitchNode(id='a', name='a', expr='$.', edges=[])]
+    )
+
+    with caplog.at_level(logging.WARNING):
+        plan = CompiledWorkflow(workflow, handler=WorkflowHandler(engine=None))
+    assert plan.start_node.artifacts == {}
+    assert 'Could not prepare node' in caplog.text
+
+
+async def test_plan_recompile():
+    workflow = Workflow(id='test', name='Test')
+
+    class Engine(WorkflowEngine):
+        async def get_workflow(self, name: str):
+            return workflow.model_copy()
+
+    engine = Engine([workflow])
+    trace = [x async for x in engine.run_workflow('Test')]
+    assert trace[-1]['action'] == 'workflow-end'
+    assert engine._plans['test'].workflow is not workflow
+
+
+def test_plan_prepare_expressions():
+    workflow = Workflow(
+        id='test', nodes=[
+            WorkflowPickNode(id='a', name='a', expressions={'x': '$.x'}, edges=['b']),
+            WorkflowTransformNode(
+                id='b', name='b', expr='$.y',
+                transforms=[WorkflowTransform(type='set', source='$.x', target='y')]
+            ),
+        ]
+    )
+    plan = CompiledWorkflow(workflow, handler=WorkflowHandler(engine=None))
+    assert list(plan.get_node('a').artifacts) == ['$.x']
+    assert sorted(plan.get_node('b').artifacts) == ['$.x', '$.y']
+
+
+async def test_plan_artifacts(mocker):
+    from anthropic.types.beta.beta_message import BetaMessage
+    from anthropic.types.beta.beta_text_block import BetaTextBlock
+    from anthropic.types.beta.beta_usage import BetaUsage
+
+    workflow = Workflow(
+        id='test', nodes=[
+            WorkflowPickNode(id='a', name='a', expressions={'name': '$.x'}, edges=['b']),
+            WorkflowAnthropicNode(id='b', name='b', model='m', prompt='Hello {{name}}', edges=['c']),
+            WorkflowNode(id='c', name='c', type='result'),
+        ]
+    )
+    engine = WorkflowEngine([workflow], precompile_templates=True)
+    assert list(engine._plans['test'].get_node('b').artifacts) == ['Hello {{name}}']
+
+    # The handlers use what was compiled with the plan, the caches aren't needed.
+    create = mocker.patch.object(
+        engine.handler.anthropic_client.beta.messages, 'create', new_callable=mocker.AsyncMock,
+        return_value=BetaMessage(
+            id='1', content=[BetaTextBlock(text='Hi', type='text')], model='m', role='assistant', type='message',
+            usage=BetaUsage(input_tokens=1, output_tokens=1)
+        )
+    )
+    jsonata_cache.clear()
+    utils.template_cache.clear()
+    trace = [x async for x in engine.run_workflow('test', {'x': 'x'})]
+    assert trace[-1]['action'] == 'workflow-end'
+    assert create.call_args.kwargs['messages'] == [{'role': 'user', 'content': 'Hello x'}]
+    assert len(jsonata_cache) == len(utils.template_cache) == 0
+    assert jsonata_cache.info().misses == utils.template_cache.info().misses == 0
+
+    # Called directly, a handler falls back to the cache.
+    handler = WorkflowHandler(engine=None)
+    assert await handler.handle_pick({'x': 2}, node=workflow.nodes[0]) == {'name': 2}
+    assert '$.x' in jsonata_cache
+    assert utils.pybars_render('Hello {{name}}', {'name': 'y'}) == 'Hello y'
+
+
+def test_plan_precompile_templates():
+    node = WorkflowAnthropicNode(id='a', name='a', model='m', prompt='Hello {{name}}', system='{{system}')
+    workflow = Workflow(id='test', nodes=[node, WorkflowNode(id='b', name='b', type='other')])
+
+    # Not compiled by default, the error is only raised when the node runs.
+    WorkflowEngine([workflow])
+
+    with pytest.raises(JotsuException, match="Invalid template in node 'a'"):
+        WorkflowEngine([workflow], precompile_templates=True)
+
+    node.system = 'You are {{role}}'
+    engine = WorkflowEngine([workflow], precompile_templates=True)
+    assert 'Hello {{name}}' in utils.template_cache
+    assert sorted(engine._plans['test'].get_node('a').artifacts) == ['Hello {{name}}', 'You are {{role}}']
+
+
+async def test_plan_unregistered():
+    workflow = Workflow(id='other', name='Other')
+
+    class Engine(WorkflowEngine):
+        async def get_workflow(self, name: str):
+            return workflow
+
+    engine = Engine(plan_cache_size=1)
+    trace = [x async for x in engine.run_workflow('Other')]
+    assert trace[-1]['action'] == 'workflow-end'
+    assert 'other' not in engine._plans
+    assert engine._plan(workflow) is engine._plan(workflow)
+
+
+async def test_plan_precompile_error():
+    node = WorkflowAnthropicNode(id='a', name='a', model='m', prompt='{{name}')
+    workflow = Workflow(id='test', nodes=[node])
+
+    class Engine(WorkflowEngine):
+        async def get_workflow(self, name: str):
+            return workflow
+
+    # Compiled on first use, the error is reported by the run.
+    for engine in (
+            Engine(precompile_templates=True),
+            WorkflowEngine(store=MemoryWorkflowStore([workflow]), precompile_templates=True)
+    ):
+        trace = [x async for x in engine.run_workflow('test')]
+        assert [x['action'] for x in trace] == ['workflow-start', 'workflow-error', 'workflow-failed']
+        assert trace[1]['message'].startswith("Invalid template in node 'a'")
+        assert trace[1]['exc_type'] == 'JotsuException'
+
+    trace = [x async for x in engine.run_workflow('test', trace='none')]
+    assert [x['action'] for x in trace] == ['workflow-error', 'workflow-failed']
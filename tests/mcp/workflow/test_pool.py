@@ -0,0 +1,244 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pydantic
+import pytest
+
+from jotsu.mcp.client import MCPClient
+from jotsu.mcp.types import Workflow, WorkflowServer, WorkflowNode
+from jotsu.mcp.workflow import WorkflowEngine, WorkflowSessionPool
+from jotsu.mcp.workflow.handler import WorkflowHandler
+
+
+class Session:
+    def __init__(self):
+        self.healthy = True
+
+    async def load(self):
+        return None
+
+    async def send_ping(self):
+        if not self.healthy:
+            raise RuntimeError('ping')
+
+
+class Client(MCPClient):
+    def __init__(self, *, fail: bool = False, delay: float = 0):
+        super().__init__()
+        self.fail = fail
+        self.delay = delay
+        self.opened = 0
+        self.closed = 0
+
+    @asynccontextmanager
+    async def session(self, server: WorkflowServer, *_args, **_kwargs):
+        if self.fail:
+            raise RuntimeError('connect')
+        await asyncio.sleep(self.delay)
+        self.opened += 1
+        task = asyncio.current_task()
+        try:
+            yield Session()
+        finally:
+            # Enter and exit must happen in the same task.
+            assert asyncio.current_task() is task
+            self.closed += 1
+
+
+def _server(**kwargs) -> WorkflowServer:
+    return WorkflowServer(id='server', url=pydantic.AnyHttpUrl('https://example.com/mcp/'), **kwargs)
+
+
+async def test_pool_reuse():
+    client = Client()
+    pool = WorkflowSessionPool(client)
+    assert pool.client is client
+
+    session = await pool.acquire(_server())
+    await pool.release(session)
+    assert await pool.acquire(_server()) is session
+    await pool.release(session)
+    await pool.release(session)  # not borrowed, ignored
+
+    other = await pool.acquire(_server(headers={'x-api-key': 'secret'}))
+    assert other is not session
+    assert client.opened == 2
+
+    await pool.aclose()
+    await pool.aclose()
+    assert client.closed == 2
+
+    with pytest.raises(RuntimeError):
+        await pool.acquire(_server())
+
+
+async def test_pool_max_sessions():
+    client = Client()
+    pool = WorkflowSessionPool(client, max_sessions=2)
+
+    first = await pool.acquire(_server())
+    second = await pool.acquire(_server())
+    assert first is not second
+
+    waiting = asyncio.create_task(pool.acquire(_server()))
+    await asyncio.sleep(0.01)
+    assert not waiting.done()
+
+    await pool.release(first)
+    assert await waiting is first
+    assert client.opened == 2
+    await pool.aclose()
+
+
+async def test_pool_concurrent_connect():
+    client = Client(delay=0.1)
+    pool = WorkflowSessionPool(client, max_sessions=3, health_check_interval=None)
+
+    idle = await pool.acquire(_server())
+
+    # Connecting doesn't hold up the other borrowers: both connect at the same time, and the idle
+    # session is handed out at once.
+    connecting = [asyncio.create_task(pool.acquire(_server())) for _ in range(2)]
+    await asyncio.sleep(0.01)
+    await asyncio.wait_for(pool.release(idle), timeout=0.05)
+    assert await asyncio.wait_for(pool.acquire(_server()), timeout=0.05) is idle
+    assert len(set(await asyncio.wait_for(asyncio.gather(*connecting), timeout=0.15))) == 2
+
+    # The sessions being connected count towards max_sessions.
+    await pool.release(idle)
+    client.delay = 0
+    assert await pool.acquire(_server()) is idle
+    waiting = asyncio.create_task(pool.acquire(_server()))
+    await asyncio.sleep(0.01)
+    assert not waiting.done()
+    await pool.release(idle)
+    assert await waiting is idle
+    assert client.opened == 3
+    await pool.aclose()
+
+
+async def test_pool_connect_error_slot():
+    client = Client(fail=True)
+    pool = WorkflowSessionPool(client, max_sessions=1)
+    with pytest.raises(RuntimeError):
+        await pool.acquire(_server())
+
+    # The reserved slot was given back.
+    client.fail = False
+    session = await pool.acquire(_server())
+    await pool.release(session)
+    await pool.aclose()
+
+
+async def test_pool_closed_while_connecting():
+    client = Client(delay=0.05)
+    pool = WorkflowSessionPool(client)
+    connecting = asyncio.create_task(pool.acquire(_server()))
+    await asyncio.sleep(0.01)
+    await pool.aclose()
+
+    with pytest.raises(RuntimeError, match='closed'):
+        await connecting
+    assert client.opened == client.closed == 1
+
+
+async def test_pool_idle_timeout():
+    client = Client()
+    pool = WorkflowSessionPool(client, idle_timeout=0.02)
+
+    session = await pool.acquire(_server())
+    await pool.release(session)
+    await asyncio.sleep(0.05)
+    assert client.closed == 1  # reaped
+
+    assert await pool.acquire(_server()) is not session
+    await pool.aclose()
+
+
+async def test_pool_health_check():
+    client = Client()
+    pool = WorkflowSessionPool(client, health_check_interval=0)
+
+    session = await pool.acquire(_server())
+    await pool.release(session)
+    assert await pool.acquire(_server()) is session
+    await pool.release(session)
+
+    session.healthy = False
+    assert await pool.acquire(_server()) is not session
+    assert client.closed == 1
+    await pool.aclose()
+
+
+async def test_pool_discard():
+    client = Client()
+    pool = WorkflowSessionPool(client, idle_timeout=None, health_check_interval=None)
+
+    session = await pool.acquire(_server())
+    await pool.release(session, discard=True)
+    assert client.closed == 1
+
+    other = await pool.acquire(_server())
+    assert other is not session
+    await pool.aclose()
+    await pool.release(other)
+
+
+async def test_pool_open_error():
+    pool = WorkflowSessionPool(Client(fail=True))
+    with pytest.raises(RuntimeError):
+        await pool.acquire(_server())
+    await pool.aclose()
+
+
+async def test_pool_session_failed():
+    client = Client()
+    pool = WorkflowSessionPool(client)
+
+    session = await pool.acquire(_server())
+    await pool.release(session)
+
+    # The session closes on its own, e.g. the connection dropped.
+    entry = pool._entries[pool.key(_server())][0]
+    entry.task.cancel()
+    await asyncio.sleep(0)
+    assert await pool.acquire(_server()) is not session
+    await pool.aclose()
+
+
+async def test_pool_session_error_logged(caplog):
+    class FailingClient(Client):
+        @asynccontextmanager
+        async def session(self, server: WorkflowServer, *_args, **_kwargs):
+            yield Session()
+            raise RuntimeError('lost connection')
+
+    pool = WorkflowSessionPool(FailingClient())
+    await pool.acquire(_server())
+    await pool.aclose()
+    assert 'lost connection' in caplog.text
+
+
+async def test_pool_engine():
+    class Handler(WorkflowHandler):
+        @staticmethod
+        async def handle_session(data: dict, *, sessions, **_kwargs) -> dict:
+            await sessions.get_session('server')
+            return data
+
+    client = Client()
+    pool = WorkflowSessionPool(client)
+    workflow = Workflow(
+        id='test', servers=[_server()],
+        nodes=[WorkflowNode(id='a', type='session', edges=['b']), WorkflowNode(id='b', type='result')]
+    )
+    engine = WorkflowEngine(workflow, client=client, handler_cls=Handler, session_pool=pool)
+
+    for _ in range(3):
+        trace = [x async for x in engine.run_workflow('test')]
+        assert trace[-1]['action'] == 'workflow-end'
+
+    assert client.opened == 1
+    assert client.closed == 0
+    await pool.aclose()
+    assert client.closed == 1
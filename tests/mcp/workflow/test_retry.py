@@ -0,0 +1,213 @@
+import asyncio
+
+import httpx
+import pytest
+from mcp.types import Tool
+
+from jotsu.mcp.types import (
+    JotsuException, Workflow, WorkflowServer, WorkflowToolNode, WorkflowRetry, WorkflowCircuitBreaker
+)
+from jotsu.mcp.workflow import WorkflowEngine
+from jotsu.mcp.workflow.retry import (
+    CircuitBreaker, CircuitBreakers, CircuitOpenError, backoff, call_with_retry, is_transient
+)
+
+
+class Flaky:
+    """ Fails with the given errors, then returns 'ok'. """
+
+    def __init__(self, *errors: BaseException):
+        self.errors = list(errors)
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return 'ok'
+
+
+def _retry(**kwargs) -> WorkflowRetry:
+    return WorkflowRetry(**{'backoff': 0, 'jitter': False, **kwargs})
+
+
+def test_retry_is_transient():
+    assert is_transient(TimeoutError())
+    assert is_transient(httpx.ConnectError('refused'))
+    assert is_transient(ExceptionGroup('group', [ConnectionResetError(), httpx.ReadTimeout('slow')]))
+    assert not is_transient(ExceptionGroup('group', [ConnectionResetError(), ValueError()]))
+    assert not is_transient(ValueError())
+    assert not is_transient(CircuitOpenError('open'))
+
+    assert is_transient(ValueError(), ['ValueError'])
+    assert is_transient(JotsuException(), ['jotsu.mcp.types.exceptions.JotsuException'])
+    assert not is_transient(TimeoutError(), [])
+
+
+def test_retry_backoff(mocker):
+    retry = WorkflowRetry(backoff=1, multiplier=3, max_backoff=5, jitter=False)
+    assert [backoff(retry, attempt) for attempt in (1, 2, 3)] == [1, 3, 5]
+
+    uniform = mocker.patch('jotsu.mcp.workflow.retry.random.uniform', return_value=0.5)
+    assert backoff(retry.model_copy(update={'jitter': True}), 2) == 0.5
+    uniform.assert_called_once_with(0, 3)
+
+
+async def test_retry_call():
+    func = Flaky(ConnectionError(), TimeoutError())
+    assert await call_with_retry(func, name='test', retry=_retry()) == 'ok'
+    assert func.calls == 3
+
+    # Attempts used up.
+    func = Flaky(ConnectionError(), ConnectionError())
+    with pytest.raises(ConnectionError):
+        await call_with_retry(func, name='test', retry=_retry(max_attempts=2))
+    assert func.calls == 2
+
+    # Not transient, or no policy.
+    func = Flaky(ValueError())
+    with pytest.raises(ValueError):
+        await call_with_retry(func, name='test', retry=_retry())
+    func = Flaky(ConnectionError())
+    with pytest.raises(ConnectionError):
+        await call_with_retry(func, name='test')
+    assert func.calls == 1
+
+    # e.g. output was already streamed.
+    func = Flaky(ConnectionError())
+    with pytest.raises(ConnectionError):
+        await call_with_retry(func, name='test', retry=_retry(), retryable=lambda: False)
+
+
+async def test_retry_deadline():
+    # The delay would pass the deadline, fail now instead.
+    func = Flaky(ConnectionError())
+    deadline = asyncio.get_running_loop().time() + 0.5
+    with pytest.raises(ConnectionError):
+        await call_with_retry(func, name='test', retry=_retry(backoff=1), deadline=deadline)
+    assert func.calls == 1
+
+    func = Flaky(ConnectionError())
+    assert await call_with_retry(func, name='test', retry=_retry(backoff=0.01), deadline=deadline) == 'ok'
+
+
+def test_circuit_breaker(mocker):
+    now = mocker.patch('jotsu.mcp.workflow.retry.monotonic', return_value=100.0)
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+    assert breaker.state == 'closed'
+
+    breaker.failure()
+    breaker.success()
+    breaker.failure()
+    assert breaker.state == 'closed'
+    breaker.failure()
+    assert breaker.state == 'open'
+    with pytest.raises(CircuitOpenError):
+        breaker.before('server')
+
+    # One trial call once the timeout passed, it opens the circuit again if it fails.
+    now.return_value = 110.0
+    assert breaker.state == 'half-open'
+    breaker.before('server')
+    with pytest.raises(CircuitOpenError):
+        breaker.before('server')
+    breaker.failure()
+    assert breaker.state == 'open'
+
+    now.return_value = 120.0
+    breaker.before('server')
+    breaker.success()
+    assert breaker.state == 'closed'
+    breaker.before('server')
+
+
+async def test_circuit_breaker_call(mocker):
+    now = mocker.patch('jotsu.mcp.workflow.retry.monotonic', return_value=100.0)
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+
+    func = Flaky(ConnectionError(), ConnectionError(), ConnectionError())
+    with pytest.raises(CircuitOpenError):
+        await call_with_retry(func, name='server', retry=_retry(max_attempts=5), breaker=breaker)
+    assert func.calls == 2
+
+    # An error which isn't transient means the server responded.
+    now.return_value = 110.0
+    func = Flaky(ValueError())
+    with pytest.raises(ValueError):
+        await call_with_retry(func, name='server', breaker=breaker)
+    assert breaker.state == 'closed'
+
+
+async def test_circuit_breaker_local_error(mocker):
+    now = mocker.patch('jotsu.mcp.workflow.retry.monotonic', return_value=100.0)
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+
+    # Raised before the server was called, e.g. validating the arguments, it doesn't reset the failures.
+    async def call(func):
+        return await call_with_retry(func, name='server', breaker=breaker, responded=lambda: False)
+
+    breaker.failure()
+    with pytest.raises(ValueError):
+        await call(Flaky(ValueError()))
+    breaker.failure()
+    assert breaker.state == 'open'
+
+    # Nor does it close a half-open circuit, the trial call may still be made.
+    now.return_value = 110.0
+    with pytest.raises(ValueError):
+        await call(Flaky(ValueError()))
+    assert breaker.state == 'half-open'
+    with pytest.raises(ConnectionError):
+        await call(Flaky(ConnectionError()))
+    assert breaker.state == 'open'
+
+
+async def test_circuit_breaker_cancelled(mocker):
+    mocker.patch('jotsu.mcp.workflow.retry.monotonic', return_value=100.0)
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    breaker.failure()
+
+    # The trial call is cancelled, another one may be made.
+    mocker.patch('jotsu.mcp.workflow.retry.monotonic', return_value=110.0)
+    with pytest.raises(asyncio.TimeoutError):
+        async with asyncio.timeout(0.01):
+            await call_with_retry(lambda: asyncio.sleep(1), name='server', breaker=breaker)
+    assert await call_with_retry(Flaky(), name='server', breaker=breaker) == 'ok'
+    assert breaker.state == 'closed'
+
+
+def test_circuit_breakers():
+    breakers = CircuitBreakers()
+    assert breakers.get('server') is None
+
+    settings = WorkflowCircuitBreaker(failure_threshold=1)
+    breaker = breakers.get('server', settings)
+    breaker.failure()
+    # The same breaker with the new settings, still open.
+    breaker = breakers.get('server', WorkflowCircuitBreaker(failure_threshold=3, reset_timeout=60))
+    assert breaker.failure_threshold == 3
+    assert breaker.state == 'open'
+
+    breakers = CircuitBreakers(default=settings)
+    assert breakers.get('other').failure_threshold == 1
+
+
+async def test_circuit_breaker_engine(mocker):
+    session = mocker.AsyncMock()
+    session.find_tool.return_value = Tool(name='tool', inputSchema={})
+    session.call_tool.side_effect = httpx.ConnectError('refused')
+    mocker.patch('jotsu.mcp.client.client.MCPClientSession.__aenter__', return_value=session)
+    mocker.patch('jotsu.mcp.client.client.MCPClientSession.__aexit__', new_callable=mocker.AsyncMock)
+
+    workflow = Workflow(
+        id='test', servers=[WorkflowServer(id='server', url='https://example.com/mcp/')],
+        nodes=[WorkflowToolNode(id='a', tool_name='tool', server_id='server', edges=['result'])]
+    )
+    engine = WorkflowEngine(workflow, circuit_breaker=WorkflowCircuitBreaker(failure_threshold=1))
+
+    # The first run opens the circuit, the next one fails without calling the server.
+    for exc_type in ('ConnectError', 'CircuitOpenError'):
+        trace = [x async for x in engine.run_workflow('test')]
+        assert trace[-1]['action'] == 'workflow-failed'
+        assert [x['exc_type'] for x in trace if x['action'] == 'node-error'] == [exc_type]
+    assert session.call_tool.call_count == 1
@@ -1,9 +1,14 @@
+import asyncio
+import contextlib
+import time
+
 import pydantic
 import pytest
 
 from jotsu.mcp.local import LocalMCPClient
 from jotsu.mcp.types import Workflow, WorkflowServer, WorkflowToolNode
-from jotsu.mcp.workflow.sessions import WorkflowSessionManager
+from jotsu.mcp.workflow import WorkflowSessionPool
+from jotsu.mcp.workflow.sessions import WorkflowSessionManager, WorkflowSessionRelay
 
 
 async def test_sessions(mocker):
@@ -70,13 +75,156 @@ async def test_sessions_node(mocker):
 
     assert sessions.workflow == workflow
     assert await sessions.get_session(node.id) == mocked_session
+    # The workflow is shared by all runs, its servers are left alone.
+    assert workflow.servers == []
 
     await sessions.aclose()
 
 
+async def test_sessions_node_servers(mocker):
+    mocker.patch(
+        'jotsu.mcp.client.client.MCPClientSession.__aenter__',
+        new_callable=mocker.AsyncMock, return_value=mocker.AsyncMock()
+    )
+
+    server = WorkflowServer(id='server', url=pydantic.AnyHttpUrl('https://example.com/mcp/'))
+    node = WorkflowToolNode.model_create(url=pydantic.AnyHttpUrl('https://example.org/mcp/'))
+    workflow = Workflow(id='test-workflow', name='Test', servers=[server], nodes=[node])
+
+    # Servers missing from the precomputed map are looked up in the workflow.
+    for _ in range(3):
+        sessions = WorkflowSessionManager(workflow=workflow, client=LocalMCPClient(), servers={})
+        assert await sessions.get_session('server')
+        assert await sessions.get_session(node.id)
+        await sessions.aclose()
+    assert workflow.servers == [server]
+
+
 async def test_sessions_not_found(mocker):
     workflow = Workflow(id='test-workflow', name='Test')
     sessions = WorkflowSessionManager(workflow=workflow, client=LocalMCPClient())
 
     with pytest.raises(RuntimeError):
         await sessions.get_session('123')
+
+
+def _prefetch_workflow() -> Workflow:
+    servers = [
+        WorkflowServer(id=f'server{i}', url=pydantic.AnyHttpUrl(f'https://example{i}.com/mcp/')) for i in range(2)
+    ]
+    node = WorkflowToolNode(id='node', url=pydantic.AnyHttpUrl('https://example.com/mcp/'))
+    return Workflow(id='test-workflow', name='Test', servers=servers, nodes=[node])
+
+
+def _mock_client_session(mocker, *, delay: float = 0, fail: int = 0, fail_exit: bool = False):
+    # The tasks which entered and exited each session.
+    tasks = []
+
+    @contextlib.asynccontextmanager
+    async def session(_self, _server):
+        entry = [asyncio.current_task()]
+        tasks.append(entry)
+        await asyncio.sleep(delay)
+        if len(tasks) <= fail:
+            raise ConnectionError('connect')
+        yield mocker.AsyncMock()
+        entry.append(asyncio.current_task())
+        if fail_exit:
+            raise ConnectionError('close')
+
+    mocker.patch('jotsu.mcp.client.client.MCPClient.session', new=session)
+    return tasks
+
+
+async def test_sessions_prefetch(mocker):
+    tasks = _mock_client_session(mocker, delay=0.1)
+
+    workflow = _prefetch_workflow()
+    sessions = WorkflowSessionManager(workflow=workflow, client=LocalMCPClient())
+    assert sessions.session_ids() == ['server0', 'server1', 'node']
+
+    start = time.time()
+    sessions.prefetch()
+    sessions.prefetch()
+    for session_id in sessions.session_ids():
+        assert await sessions.get_session(session_id)
+    # Concurrently, each in its own task.
+    assert time.time() - start < 0.2
+    assert len(tasks) == 3
+    assert len({entered for entered, in tasks}) == 3
+    assert asyncio.current_task() not in [entered for entered, in tasks]
+
+    await sessions.aclose()
+    # Exited by the task that entered it.
+    assert all(entered is exited for entered, exited in tasks)
+    with pytest.raises(RuntimeError):
+        sessions.prefetch()
+
+
+async def test_sessions_prefetch_error(mocker):
+    tasks = _mock_client_session(mocker, fail=1)
+
+    workflow = _prefetch_workflow()
+    sessions = WorkflowSessionManager(workflow=workflow, client=LocalMCPClient())
+    sessions.prefetch(['server0'])
+
+    # Connects again, in the owning task.
+    assert await sessions.get_session('server0')
+    assert tasks[-1][0] is asyncio.current_task()
+    await sessions.aclose()
+
+
+async def test_sessions_prefetch_pool(mocker):
+    _mock_client_session(mocker)
+
+    pool = WorkflowSessionPool(LocalMCPClient(), idle_timeout=None)
+    workflow = _prefetch_workflow()
+    sessions = WorkflowSessionManager(workflow=workflow, client=LocalMCPClient(), pool=pool)
+    sessions.prefetch()
+    session = await sessions.get_session('server0')
+    # The others were never used.
+    await sessions.aclose()
+
+    # All of them went back to the pool.
+    sessions = WorkflowSessionManager(workflow=workflow, client=LocalMCPClient(), pool=pool)
+    assert await sessions.get_session('server0') is session
+    await sessions.aclose()
+    assert sum(len(entries) for entries in pool._entries.values()) == 3
+    await pool.aclose()
+
+
+async def test_sessions_discard(mocker):
+    tasks = _mock_client_session(mocker)
+
+    pool = WorkflowSessionPool(LocalMCPClient(), idle_timeout=None)
+    workflow = _prefetch_workflow()
+    sessions = WorkflowSessionManager(workflow=workflow, client=LocalMCPClient(), pool=pool)
+    session = await sessions.get_session('server0')
+
+    # The pool closes the session, the next request connects again.
+    await WorkflowSessionRelay(sessions, request=lambda *_: None).discard('server0')
+    assert len(tasks[0]) == 2
+    assert await sessions.get_session('server0') is not session
+    await sessions.discard('server1')
+    await sessions.aclose()
+    assert len(pool._entries[pool.key(workflow.servers[0])]) == 1
+    await pool.aclose()
+
+    # Without a pool, the session is still exited when the manager closes.
+    sessions = WorkflowSessionManager(workflow=workflow, client=LocalMCPClient())
+    session = await sessions.get_session('server0')
+    await sessions.discard('server0')
+    assert await sessions.get_session('server0') is not session
+    await sessions.aclose()
+    assert all(len(entry) == 2 for entry in tasks)
+
+
+async def test_sessions_prefetch_close_error(mocker):
+    _mock_client_session(mocker, fail_exit=True)
+    logger_warning = mocker.patch('jotsu.mcp.workflow.sessions.logger.warning')
+
+    sessions = WorkflowSessionManager(workflow=_prefetch_workflow(), client=LocalMCPClient())
+    sessions.prefetch(['server0'])
+    assert await sessions.get_session('server0')
+    await sessions.aclose()
+    logger_warning.assert_called_once()
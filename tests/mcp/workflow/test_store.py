@@ -0,0 +1,96 @@
+import json
+import os
+
+import pytest
+
+from jotsu.mcp.types import Workflow
+from jotsu.mcp.workflow.store import (
+    WorkflowInfo, MemoryWorkflowStore, DirectoryWorkflowStore, SQLiteWorkflowStore
+)
+
+
+@pytest.fixture(params=['memory', 'directory', 'sqlite'])
+def store(request, tmp_path):
+    match request.param:
+        case 'memory':
+            yield MemoryWorkflowStore()
+        case 'directory':
+            yield DirectoryWorkflowStore(tmp_path / 'workflows')
+        case _:
+            store = SQLiteWorkflowStore(tmp_path / 'workflows.db')
+            yield store
+            store.close()
+
+
+async def test_store(store):
+    assert await store.get('first') is None
+    assert await store.list() == []
+
+    await store.put(Workflow(id='first', name='Shared', description='First'))
+    await store.put(Workflow(id='second', name='Shared'))
+    await store.put(Workflow(id='third'))
+
+    assert (await store.get('first')).description == 'First'
+    assert (await store.get('Shared')).id == 'first'
+    assert (await store.get('third')).id == 'third'
+    assert await store.get('missing') is None
+    assert await store.list() == [
+        WorkflowInfo(id='first', name='Shared', description='First'),
+        WorkflowInfo(id='second', name='Shared', description=None),
+        WorkflowInfo(id='third', name='third', description=None),
+    ]
+
+    await store.put(Workflow(id='first', name='Replaced'))
+    assert (await store.get('Shared')).id == 'second'
+    assert (await store.get('first')).name == 'Replaced'
+
+    await store.delete('first')
+    await store.delete('first')
+    assert await store.get('first') is None
+    assert [x.id for x in await store.list()] == ['second', 'third']
+
+
+async def test_store_directory(tmp_path):
+    store = DirectoryWorkflowStore(tmp_path)
+    # Files which aren't named after the workflow, or aren't workflows.
+    with open(tmp_path / 'workflow.json', 'w') as fp:
+        json.dump({'id': 'test', 'name': 'Test'}, fp)
+    with open(tmp_path / 'other.json', 'w') as fp:
+        json.dump({'name': 'Other'}, fp)
+    with open(tmp_path / 'notes.txt', 'w') as fp:
+        fp.write('notes')
+
+    assert (await store.get('test')).name == 'Test'
+    assert (await store.get('Test')).id == 'test'
+    assert await store.get('../test') is None
+    assert await store.list() == [WorkflowInfo(id='test', name='Test', description=None)]
+
+    # Changed files are indexed again.
+    with open(tmp_path / 'workflow.json', 'w') as fp:
+        json.dump({'id': 'test', 'name': 'Changed'}, fp)
+    os.utime(tmp_path / 'workflow.json', ns=(0, 0))
+    assert (await store.get('Changed')).id == 'test'
+
+    await store.delete('test')
+    assert not os.path.exists(tmp_path / 'workflow.json')
+    assert await store.list() == []
+
+
+async def test_store_directory_quoted(tmp_path):
+    store = DirectoryWorkflowStore(tmp_path / 'workflows')
+    with open(tmp_path / 'outside.json', 'w') as fp:
+        json.dump({'id': '../outside'}, fp)
+    assert await store.get('../outside') is None
+
+    await store.delete('../outside')
+    assert os.path.exists(tmp_path / 'outside.json')
+
+    await store.put(Workflow(id='a:b'))
+    assert os.listdir(tmp_path / 'workflows') == ['a%3Ab.json']
+    assert (await store.get('a:b')).id == 'a:b'
+
+
+def test_store_sqlite_close():
+    store = SQLiteWorkflowStore()
+    store.close()
+    store.close()
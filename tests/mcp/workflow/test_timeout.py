@@ -0,0 +1,156 @@
+import asyncio
+import time
+
+import pydantic
+import pytest
+
+from jotsu.mcp.types import Workflow, WorkflowNode, WorkflowConcurrency
+from jotsu.mcp.workflow import WorkflowEngine
+from jotsu.mcp.workflow.handler import WorkflowHandler, WorkflowHandlerResult
+
+
+class Handler(WorkflowHandler):
+    deadlines = []
+
+    @classmethod
+    async def handle_sleep(cls, data: dict, *, node: WorkflowNode, deadline: float | None = None, **_kwargs) -> dict:
+        cls.deadlines.append(deadline)
+        await asyncio.sleep(node.metadata.get('delay', 0))
+        return {**data, node.id: True}
+
+    @staticmethod
+    async def handle_items(_data: dict, *, node: WorkflowNode, **_kwargs):
+        for i in range(3):
+            await asyncio.sleep(node.metadata['delay'])
+            yield WorkflowHandlerResult(edge=node.edges[0], data={'item': i})
+
+    @staticmethod
+    async def handle_raise(_data: dict, **_kwargs) -> dict:
+        raise TimeoutError('own timeout')
+
+
+@pytest.fixture(autouse=True)
+def reset():
+    Handler.deadlines.clear()
+
+
+def _node(node_id: str, node_type: str = 'sleep', delay: float = 0.0, **kwargs) -> WorkflowNode:
+    return WorkflowNode(id=node_id, type=node_type, metadata={'delay': delay}, **kwargs)
+
+
+async def _run(workflow: Workflow) -> list:
+    engine = WorkflowEngine([workflow], handler_cls=Handler)
+    return [x async for x in engine.run_workflow(workflow.id, {})]
+
+
+def _errors(trace: list) -> list:
+    return [(x['node']['id'], x['exc_type'], x['message']) for x in trace if x['action'] == 'node-error']
+
+
+async def test_timeout_node():
+    workflow = Workflow(id='test', nodes=[
+        _node('a', delay=1, timeout=0.05, edges=['result']),
+        WorkflowNode(id='result', type='result'),
+    ])
+
+    start = time.time()
+    trace = await _run(workflow)
+    assert time.time() - start < 0.5
+    assert _errors(trace) == [('a', 'TimeoutError', "Node 'a' timed out after 0.05 seconds.")]
+    assert trace[-1]['action'] == 'workflow-failed'
+
+
+async def test_timeout_node_excludes_edges():
+    # The time 'b' and 'c' take doesn't count against 'a'.
+    workflow = Workflow(id='test', nodes=[
+        _node('a', timeout=0.05, edges=['b', 'c']),
+        _node('b', delay=0.04, edges=['result']),
+        _node('c', delay=0.04, edges=['result']),
+        WorkflowNode(id='result', type='result'),
+    ])
+
+    trace = await _run(workflow)
+    assert trace[-1]['action'] == 'workflow-end'
+    # 'a' is called once for each edge, with the time it has left.
+    a1, b, a2, c = Handler.deadlines
+    assert a1 < a2
+    assert b is None and c is None
+
+
+async def test_timeout_node_generator():
+    workflow = Workflow(id='test', nodes=[
+        _node('a', node_type='items', delay=0.04, timeout=0.1, edges=['b']),
+        _node('b', delay=0.1, edges=['result']),
+        WorkflowNode(id='result', type='result'),
+    ])
+
+    trace = await _run(workflow)
+    assert _errors(trace)[0] == ('a', 'TimeoutError', "Node 'a' timed out after 0.1 seconds.")
+    # Only the time spent producing results counts, the third one is late.
+    assert [x['data'] for x in trace if x['action'] == 'node' and x['node']['id'] == 'b'] == [
+        {'item': 0, 'b': True}, {'item': 1, 'b': True}
+    ]
+
+
+async def test_timeout_node_stream():
+    workflow = Workflow(id='test', nodes=[
+        _node('a', delay=1, timeout=0.05, stream=True, edges=['result']),
+        WorkflowNode(id='result', type='result'),
+    ])
+
+    start = time.time()
+    trace = await _run(workflow)
+    assert time.time() - start < 0.5
+    assert _errors(trace) == [('a', 'TimeoutError', "Node 'a' timed out after 0.05 seconds.")]
+    assert Handler.deadlines[0] is not None
+
+
+async def test_timeout_workflow():
+    workflow = Workflow(id='test', timeout=0.1, nodes=[
+        _node('a', delay=0.06, edges=['b']),
+        _node('b', delay=0.06, edges=['result']),
+        WorkflowNode(id='result', type='result'),
+    ])
+
+    start = time.time()
+    trace = await _run(workflow)
+    assert time.time() - start < 0.5
+    assert _errors(trace) == [
+        ('b', 'TimeoutError', 'The workflow timed out.'), ('a', 'TimeoutError', 'The workflow timed out.')
+    ]
+    assert trace[-1]['action'] == 'workflow-failed'
+    # Every handler gets the deadline of the run.
+    assert Handler.deadlines[0] == Handler.deadlines[1] is not None
+
+
+async def test_timeout_workflow_concurrency():
+    workflow = Workflow(id='test', timeout=0.1, nodes=[
+        _node('start', edges=['a', 'b'], concurrency=WorkflowConcurrency()),
+        _node('a', delay=0.01, edges=['result']),
+        _node('b', delay=1, edges=['result']),
+        WorkflowNode(id='result', type='result'),
+    ])
+
+    start = time.time()
+    trace = await _run(workflow)
+    assert time.time() - start < 0.5
+    assert ('b', 'TimeoutError', 'The workflow timed out.') in _errors(trace)
+    assert trace[-1]['action'] == 'workflow-failed'
+
+
+async def test_timeout_handler_error():
+    # A TimeoutError of the handler itself isn't reported as the node timing out.
+    workflow = Workflow(id='test', nodes=[
+        _node('a', node_type='raise', timeout=1, edges=['result']),
+        WorkflowNode(id='result', type='result'),
+    ])
+
+    trace = await _run(workflow)
+    assert _errors(trace) == [('a', 'TimeoutError', 'own timeout')]
+
+
+def test_timeout_validation():
+    with pytest.raises(pydantic.ValidationError):
+        Workflow(id='test', timeout=0)
+    with pytest.raises(pydantic.ValidationError):
+        WorkflowNode(id='a', type='sleep', timeout=-1)
@@ -1,7 +1,13 @@
+import copy
+
+import jsonschema
 import pytest
 
 from jotsu.mcp.types import JotsuException
-from jotsu.mcp.workflow.utils import asteval, path_delete, transform_cast
+from jotsu.mcp.workflow.utils import (
+    asteval, path_delete, transform_cast, json_schema_validator, json_schema_validate, FunctionInterpreterPool,
+    pybars_render, template_cache
+)
 
 
 def test_asteval():
@@ -17,6 +23,64 @@ def test_asteval_error():
         asteval(data, expr, node=None)
 
 
+def test_function_pool():
+    pool = FunctionInterpreterPool(size=1, time_limit=0.1)
+
+    pool.compile('data["x"] += 1\nreturn data')
+    assert pool.call('data["x"] += 1\nreturn data', {'x': 1}, node=None) == {'x': 2}
+    assert pool._functions.info().hits == 1
+    assert len(pool._idle) == 1
+
+    # Nothing leaks between calls, including overwritten builtins.
+    assert pool.call('y = 1\nlen = None\nreturn node', {}, node='n') == 'n'
+    assert pool.call('return [len([1]), "y" in dir()]', {}, node=None) == [1, False]
+    assert 'data' not in pool._idle[0].symtable
+    assert pool.call('return datetime.timedelta(seconds=1).seconds', {}, node=None) == 1
+
+    with pytest.raises(JotsuException, match='Time limit'):
+        pool.call('while True:\n    pass', {}, node=None)
+    assert len(pool._idle) == 0
+
+    with pytest.raises(JotsuException):
+        pool.compile('return (')
+    with pytest.raises(JotsuException):
+        pool.call('print("x")', {}, node=None)
+
+    pool.clear()
+    assert len(pool._idle) == 0
+    assert len(pool._functions) == 0
+
+
+def test_function_pool_builtins_isolated():
+    pool = FunctionInterpreterPool(size=1)
+    pool.call('return 1', {}, node=None)
+    interpreter = pool._idle[0]
+
+    for name in interpreter.base_symtable:
+        # Each write either fails (read-only) or only changes the symbol table of that one call.
+        try:
+            pool.call(f'{name}.leak = data', {'secret': 1}, node=None)
+        except JotsuException:
+            pass
+        try:
+            pool.call(f'{name}.zoneinfo.leak = data', {'secret': 1}, node=None)
+        except JotsuException:
+            pass
+        expr = f'try:\n    return {name}.leak\nexcept AttributeError:\n    return None'
+        assert pool.call(expr, {}, node=None) is None, name
+
+    assert pool.call('return datetime.zoneinfo.ZoneInfo("UTC").key', {}, node=None) == 'UTC'
+    with pytest.raises(JotsuException, match='read-only'):
+        pool.call('datetime.timedelta = None', {}, node=None)
+    with pytest.raises(JotsuException):
+        pool.call('del datetime.zoneinfo.ZoneInfo', {}, node=None)
+    assert pool.call('return datetime.zoneinfo.ZoneInfo("UTC").key', {}, node=None) == 'UTC'
+    assert pool.call('return type(1)', {}, node=None) == 'int'
+    with pytest.raises(AttributeError):
+        delattr(pool._idle[0].symtable['datetime'], 'zoneinfo')
+    assert repr(pool._idle[0].symtable['datetime']).startswith('namespace(')
+
+
 def test_path_delete():
     data = {'a': {'b': 1}}
     path_delete(data, path='a.b')
@@ -38,3 +102,54 @@ def test_transform_cast():
     assert transform_cast('123.5', datatype='number') == 123.5
     assert transform_cast('a', datatype='boolean') is True
     assert transform_cast(0, datatype='boolean') is False
+
+
+def test_json_schema_validator():
+    schema = {'type': 'object', 'properties': {'a': {'type': 'integer'}}, 'required': ['a']}
+
+    validator = json_schema_validator(schema)
+    assert json_schema_validator(schema) is validator
+    assert json_schema_validator(copy.deepcopy(schema)) is validator
+
+    json_schema_validate({'a': 1}, schema)
+    with pytest.raises(jsonschema.ValidationError):
+        json_schema_validate({'a': 'x'}, schema)
+
+
+def test_json_schema_validator_changed():
+    # A schema changed in place gets a validator for what it says now.
+    schema = {'type': 'object', 'properties': {'a': {'type': 'integer'}}}
+    json_schema_validate({'a': 1}, schema)
+
+    schema['properties']['a']['type'] = 'string'
+    json_schema_validate({'a': 'x'}, schema)
+    with pytest.raises(jsonschema.ValidationError):
+        json_schema_validate({'a': 1}, schema)
+
+    # Nor does that change the validator of the original schema.
+    json_schema_validate({'a': 1}, {'type': 'object', 'properties': {'a': {'type': 'integer'}}})
+
+
+def test_json_schema_validator_prepare():
+    def prepare(s: dict) -> dict:
+        s['required'] = []
+        return s
+
+    schema = {'type': 'object', 'required': ['a']}
+    json_schema_validate({}, schema, prepare=prepare)
+    assert schema['required'] == ['a']
+
+    with pytest.raises(jsonschema.ValidationError):
+        json_schema_validate({}, schema)
+
+
+def test_json_schema_validator_invalid():
+    with pytest.raises(jsonschema.SchemaError):
+        json_schema_validator({'type': 'nope'})
+
+
+def test_pybars_render():
+    template_cache.clear()
+    assert pybars_render('Hello {{name}}', {'name': 'a'}) == 'Hello a'
+    assert pybars_render('Hello {{name}}', {'name': 'b'}) == 'Hello b'
+    assert template_cache.info().hits == 1
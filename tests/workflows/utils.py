@@ -1,3 +1,4 @@
+import copy
 import json
 import os
 
@@ -7,3 +8,27 @@ def load_workflow(name: str) -> dict:
     path = path + '.json' if not path.endswith('.json') else path
     with open(path) as f:
         return json.load(f)
+
+
+def apply_patch(doc, patch: list):
+    """ Minimal RFC 6902 add/remove/replace to check the patches. """
+    doc = copy.deepcopy(doc)
+    for op in patch:
+        keys = [x.replace('~1', '/').replace('~0', '~') for x in op['path'].split('/')[1:]]
+        if not keys:
+            doc = copy.deepcopy(op['value'])
+            continue
+        parent = doc
+        for key in keys[:-1]:
+            parent = parent[int(key)] if isinstance(parent, list) else parent[key]
+        key = keys[-1]
+        if isinstance(parent, list):
+            if op['op'] == 'add':
+                parent.append(copy.deepcopy(op['value']))
+            else:
+                parent[int(key)] = copy.deepcopy(op['value'])
+        elif op['op'] == 'remove':
+            del parent[key]
+        else:
+            parent[key] = copy.deepcopy(op['value'])
+    return doc